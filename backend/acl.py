@@ -0,0 +1,90 @@
+"""Page access checks answered straight from the page_view_permissions table."""
+from sqlalchemy import delete, exists, insert, or_, select
+from sqlalchemy.orm import Session
+
+import models
+
+perms = models.page_view_permissions
+
+
+def is_allowed(db: Session, page_id: int, user_id: int) -> bool:
+    """Single indexed EXISTS on the (user_id, page_id) primary key."""
+    return db.query(
+        exists().where(perms.c.page_id == page_id, perms.c.user_id == user_id)
+    ).scalar()
+
+
+def allowed_users(db: Session, page_id: int):
+    """(id, username) rows for a page's ACL, without loading User objects."""
+    return (
+        db.query(models.User.id, models.User.username)
+        .join(perms, perms.c.user_id == models.User.id)
+        .filter(perms.c.page_id == page_id)
+        .order_by(models.User.username)
+        .all()
+    )
+
+
+def visible_clause(current_user):
+    """SQL filter for pages visible to `current_user`, for listing queries."""
+    if not current_user:
+        return models.Page.visibility == "public"
+    shared = select(perms.c.page_id).where(perms.c.user_id == current_user.id)
+    return or_(
+        models.Page.visibility == "public",
+        models.Page.created_by == current_user.id,
+        models.Page.id.in_(shared),
+    )
+
+
+def _insert_ignoring_duplicates(db: Session):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's dialect, or None if unsupported."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(perms).on_conflict_do_nothing()
+
+
+def existing_grants(db: Session, page_ids, user_ids) -> set:
+    """(page_id, user_id) pairs already granted among the given pages and users."""
+    if not page_ids or not user_ids:
+        return set()
+    rows = db.query(perms.c.page_id, perms.c.user_id).filter(
+        perms.c.page_id.in_(list(page_ids)), perms.c.user_id.in_(list(user_ids))
+    )
+    return {(row.page_id, row.user_id) for row in rows}
+
+
+def grant_many(db: Session, pairs) -> set:
+    """
+    Grant (page_id, user_id) pairs in a single INSERT ... ON CONFLICT DO
+    NOTHING and return the pairs that were new; existing grants are left alone.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    stmt = _insert_ignoring_duplicates(db)
+    if stmt is None:
+        pairs -= existing_grants(db, {p for p, _ in pairs}, {u for _, u in pairs})
+        if pairs:
+            db.execute(insert(perms), [{"page_id": p, "user_id": u} for p, u in sorted(pairs)])
+        return pairs
+    rows = db.execute(
+        stmt.values([{"page_id": p, "user_id": u} for p, u in sorted(pairs)])
+        .returning(perms.c.page_id, perms.c.user_id)
+    )
+    return {(row.page_id, row.user_id) for row in rows}
+
+
+def revoke_many(db: Session, page_ids, user_ids) -> int:
+    """Remove every grant of `user_ids` on `page_ids` in one DELETE; returns how many went."""
+    if not page_ids or not user_ids:
+        return 0
+    result = db.execute(
+        delete(perms).where(perms.c.page_id.in_(list(page_ids)), perms.c.user_id.in_(list(user_ids)))
+    )
+    return result.rowcount
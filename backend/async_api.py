@@ -0,0 +1,128 @@
+"""
+Async versions of the hot endpoints, served from an AsyncSession.
+
+Swapped in for their sync twins in main.py when Config.DB_ASYNC is set,
+so the two paths can be compared under the same load. Both build their
+SQL from queries.py.
+"""
+from typing import Optional, List
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import broadcast, fast_json, http_cache, journal_order, queries, querycount, schemas
+from auth import (
+    Principal,
+    get_current_user_async,
+    get_current_user_optional_async,
+    get_optional_user_async,
+)
+from database import get_async_db
+from models import Journal, JournalEntry
+from page_cache import page_cache, build_cached_page, respond
+
+router = APIRouter()
+
+
+# --- Pages ---
+async def load_cached_page(db: AsyncSession, slug: str):
+    """Return the CachedPage for `slug`, building and caching it on a miss."""
+    cached = page_cache.get(slug)
+    if cached is not None:
+        return cached
+
+    page = (await db.execute(queries.page_by_slug(slug))).scalar()
+    if not page:
+        return None
+
+    acl_ids = (await db.execute(queries.page_acl_ids(page.id))).scalars().all()
+
+    cached = build_cached_page(page, acl_ids)
+    page_cache.put(slug, cached)
+    return cached
+
+
+@router.get("/pages/summary", response_model=List[schemas.PageSummary])
+@querycount.budget(4)
+async def list_pages_summary(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_optional_user_async),
+):
+    visible = queries.visible_summary(current_user)
+
+    count, id_sum, version_sum = (await db.execute(queries.summary_validator(visible))).one()
+    etag = http_cache.make_etag("summary", current_user.id if current_user else None, count, id_sum, version_sum)
+    shared = current_user is None
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag, shared=shared)
+
+    pages = (await db.execute(queries.summary_rows(visible))).all()
+
+    response.headers.update(http_cache.cache_headers(etag, shared=shared))
+    return fast_json.respond([{"id": p.id, "slug": p.slug, "title": p.title} for p in pages], response)
+
+
+@router.get("/pages/{slug}", response_model=schemas.Page)
+@querycount.budget(3)
+async def get_page(
+    slug: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_optional_user_async),
+):
+    return respond(request, response, await load_cached_page(db, slug), current_user)
+
+
+# --- Journals ---
+@router.get("/journals/{journal_id}")
+@querycount.budget(3)
+async def get_journal(
+    journal_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional_async),
+):
+    journal = await db.get(Journal, journal_id)
+    if not journal:
+        raise HTTPException(status_code=404, detail="Journal not found")
+
+    # Taken before reading so a socket resuming from here misses nothing
+    seq = await broadcast.latest_seq_async()
+
+    rows = await db.execute(queries.visible_entries(journal_id, current_user).order_by(JournalEntry.order_index))
+    return fast_json.respond(
+        {"journal": fast_json.columns(journal), "entries": [queries.entry_dict(r) for r in rows], "seq": seq}
+    )
+
+
+@router.post("/journals/{journal_id}/entries")
+@querycount.budget(4)
+async def add_entry(
+    journal_id: int,
+    entry: schemas.JournalEntryCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user_async),
+):
+    order_index = (await db.execute(journal_order.claim_entry_index(journal_id))).scalar()
+    if order_index is None:
+        raise HTTPException(status_code=404, detail="Journal not found")
+
+    new_entry = JournalEntry(
+        journal_id=journal_id,
+        content=entry.content,
+        order_index=order_index,
+        created_by=current_user.id,
+        is_private=bool(entry.is_private),
+    )
+    db.add(new_entry)
+    await db.flush()  # INSERT ... RETURNING fills in id and created_at
+
+    entry_data = queries.new_entry_dict(new_entry, current_user.username)
+    await db.commit()
+
+    if not entry_data["is_private"]:
+        await broadcast.publish_async(journal_id, "new_entry", entry_data)
+
+    return entry_data
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Security
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
@@ -6,11 +7,17 @@ from fastapi.security import (
     HTTPBearer,
 )
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
 from typing import Optional
-from database import SessionLocal
+from collections import OrderedDict
+import threading, time
+from config import Config
+from database import get_db, get_async_db
+from passwords import hasher
 import models, schemas
 from models import User
 
@@ -21,32 +28,9 @@ SECRET_KEY = "21c4e179bf3ad9a195361d1d807fb80e992d599c10eaa1187102b472162ca037"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 day
 
-# --- Password hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # --- OAuth2 setup ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
-# --- DB Dependency ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-# --- Password utils ---
-def verify_password(plain_password, password_hash):
-    return pwd_context.verify(plain_password, password_hash)
-
-
-def get_password_hash(password):
-    if len(password) > 72:  # bcrypt limit
-        password = password[:72]
-    return pwd_context.hash(password)
-
-
 # --- JWT utils ---
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -54,48 +38,156 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user_optional(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Optional[models.User]:
-    if not token:
-        return None
+# --- Authenticated principal cache ---
+class Principal:
+    """The identity fields endpoints read from the current user."""
+
+    __slots__ = ("id", "username", "role", "email")
+
+    def __init__(self, id, username, role, email):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.email = email
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(user.id, user.username, user.role, user.email)
+
+
+class TokenCache:
+    """
+    Maps a bearer token to its Principal until the earlier of the token's
+    `exp` and a short TTL, so identity costs no query on the hot path.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token, principal, exp):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            stale = [t for t, (p, _) in self._entries.items() if p.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(Config.AUTH_CACHE_TTL_SECONDS, Config.AUTH_CACHE_MAX_ENTRIES)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_identity_change(mapper, connection, target):
+    """Drop cached principals when a user's role (or identity) changes."""
+    for attr in ("role", "username", "email"):
+        if get_history(target, attr).has_changes():
+            token_cache.invalidate_user(target.id)
+            return
+
+
+def _decode(token: str):
+    """Claims of a valid token naming a user, or None."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        user = db.query(User).filter(User.username == username).first()
-        return user
     except JWTError:
         return None
+    if not payload.get("sub"):
+        return None
+    return payload
 
 
-# --- REQUIRED authentication ---
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _user_query(payload):
+    query = select(models.User).where(models.User.username == payload["sub"])
+    if payload.get("uid"):
+        query = query.where(models.User.id == payload["uid"])
+    return query
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: Optional[int] = payload.get("uid")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+
+def _remember(token, payload, user) -> Optional[Principal]:
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+
+def resolve_principal(token: Optional[str], db: Session) -> Optional[Principal]:
+    """Decode `token` and return its Principal, or None if it isn't valid."""
+    if not token:
+        return None
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = _decode(token)
+    if payload is None:
+        return None
 
     # Fetch full user record
-    query = db.query(models.User).filter(models.User.username == username)
-    if user_id:
-        query = query.filter(models.User.id == user_id)
-    user = query.first()
+    user = db.execute(_user_query(payload)).scalars().first()
+    return _remember(token, payload, user)
+
+
+async def resolve_principal_async(token: Optional[str], db: AsyncSession) -> Optional[Principal]:
+    """resolve_principal on an AsyncSession."""
+    if not token:
+        return None
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = _decode(token)
+    if payload is None:
+        return None
+
+    user = (await db.execute(_user_query(payload))).scalars().first()
+    return _remember(token, payload, user)
+
+
+def get_current_user_optional(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Principal]:
+    return resolve_principal(token, db)
+
 
+# --- REQUIRED authentication ---
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    user = resolve_principal(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -105,65 +197,102 @@ bearer_scheme = HTTPBearer(auto_error=False)
 def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Security(bearer_scheme),
     db: Session = Depends(get_db),
-) -> Optional[models.User]:
+) -> Optional[Principal]:
     """Returns the current user if logged in, otherwise None."""
     if credentials is None:
         return None
+    return resolve_principal(credentials.credentials, db)
 
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: Optional[int] = payload.get("uid")
-        if not username:
-            return None
-    except JWTError:
-        return None
 
-    query = db.query(models.User).filter(models.User.username == username)
-    if user_id:
-        query = query.filter(models.User.id == user_id)
-    return query.first()
+# --- Async variants, for endpoints on an AsyncSession ---
+async def get_current_user_optional_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Optional[Principal]:
+    return await resolve_principal_async(token, db)
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    user = await resolve_principal_async(token, db)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+async def get_optional_user_async(
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(bearer_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Optional[Principal]:
+    if credentials is None:
+        return None
+    return await resolve_principal_async(credentials.credentials, db)
 
 
 # --- REGISTER ---
+# These handlers are async so bcrypt can wait on its own pool (see passwords.py);
+# their sync Session work goes through the threadpool to keep the event loop free.
+def _name_or_email_taken(db: Session, username: str, email: str) -> bool:
+    return db.query(models.User.id).filter(
+        (models.User.username == username) | (models.User.email == email)
+    ).first() is not None
+
+
+def _create_user(db: Session, username: str, email: str, password_hash: str):
+    new_user = models.User(username=username, email=email, password_hash=password_hash)
+    db.add(new_user)
+    db.commit()
+    return new_user.username
+
+
 @router.post("/register")
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing_user = (
-        db.query(models.User)
-        .filter(
-            (models.User.username == user.username) |
-            (models.User.email == user.email)
-        )
-        .first()
-    )
-    if existing_user:
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(_name_or_email_taken, db, user.username, user.email):
         raise HTTPException(
             status_code=400,
             detail="Username or email already exists"
         )
 
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = await hasher.hash(user.password)
+    username = await run_in_threadpool(_create_user, db, user.username, user.email, hashed_pw)
+
+    return {"message": "User created successfully", "username": username}
+
+
+# --- LOGIN ---
+def _login_row(db: Session, username: str):
+    return db.query(models.User.id, models.User.username, models.User.password_hash).filter(
+        models.User.username == username
+    ).first()
+
 
-    new_user = models.User(
-        username=user.username,
-        email=user.email,
-        password_hash=hashed_pw,
+def _store_rehash(db: Session, user_id: int, password_hash: str):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {"password_hash": password_hash}, synchronize_session=False
     )
-    db.add(new_user)
     db.commit()
-    db.refresh(new_user)
 
-    return {"message": "User created successfully", "username": new_user.username}
 
-
-# --- LOGIN ---
 @router.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_login_row, db, form_data.username)
+    if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
+    ok, new_hash = await hasher.verify_and_update(form_data.password, user.password_hash)
+    if not ok:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+
+    # Cost setting changed since this hash was made: upgrade it transparently
+    if new_hash:
+        await run_in_threadpool(_store_rehash, db, user.id, new_hash)
+
     # ✅ include both username + user_id in token
     access_token = create_access_token(data={"sub": user.username, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -177,3 +306,11 @@ def read_users_me(current_user: models.User = Depends(get_current_user)):
         "username": current_user.username,
         "email": current_user.email,
     }
+
+
+# --- HASHING STATS ---
+@router.get("/auth/stats")
+def read_auth_stats(current_user: models.User = Depends(get_current_user)):
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {"password_hashing": hasher.stats(), "token_cache": token_cache.stats()}
@@ -0,0 +1,243 @@
+"""
+Latency, throughput and SQL query counts of the hot API endpoints.
+
+    python -m benchmarks.api [--users 50] [--pages 2000] [--journals 3] [--entries 3000]
+                             [--requests 200] [--concurrency 1] [-o run.json]
+                             [--baseline previous.json] [--tolerance 0.25]
+
+Generates a synthetic campaign (benchmarks.synthetic) into a temporary
+SQLite database, then drives the real app in-process through TestClient,
+startup hooks and middlewares included. Each scenario reports p50/p95/p99
+latency, requests per second and the statements it ran (X-Query-Count).
+The same options and seed give the same dataset and request mix, so two
+JSON reports can be diffed; with --baseline, scenarios whose p95 grew by
+more than --tolerance, or whose query count grew at all, are listed under
+"regressions" and the exit status is 1.
+
+Everything else comes from the usual environment variables (SQLITE_PROFILE,
+DB_ASYNC, BCRYPT_ROUNDS, ...), so configurations can be compared too.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks import synthetic
+
+PASSWORD = "benchmark-password"
+SESSIONS = 10  # signed-in users the scenarios rotate through
+SCENARIOS = ("list_pages", "list_pages_summary", "get_page", "get_journal", "add_entry", "login")
+
+
+def _configure(workdir):
+    """Point the app at `workdir`; must run before anything imports config."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'wiki.db')}"
+    os.environ["IMAGES_DIR"] = os.path.join(workdir, "images")
+    os.environ["BROADCAST_SQLITE_PATH"] = os.path.join(workdir, "broadcast.db")
+    os.environ["MAIL_DISPATCHER"] = "false"
+    if os.environ.get("QUERY_BUDGET_MODE") != "raise":
+        os.environ["QUERY_BUDGET_MODE"] = "log"  # the X-Query-Count header is the query count
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+
+# --- Dataset ---
+def seed(db, args):
+    """Users sharing one password hash, then the campaign through the bulk importer."""
+    import models
+    import transfer
+    from passwords import hasher
+
+    names = synthetic.usernames(args.users)
+    password_hash = hasher.context.hash(PASSWORD)
+    db.add_all(
+        models.User(username=name, email=f"{name}@example.com", password_hash=password_hash,
+                    role="admin" if i == 0 else "user")
+        for i, name in enumerate(names)
+    )
+    db.commit()
+    owner_id = db.query(models.User.id).filter(models.User.username == names[0]).scalar()
+    importer = transfer.Importer(db, owner_id)
+    importer.add_many(synthetic.campaign(
+        names, pages=args.pages, journals=args.journals, entries=args.entries, seed=args.seed
+    ))
+    return importer.finish()
+
+
+class Workload:
+    """What the scenarios pick from: signed-in sessions, public slugs, journals."""
+
+    def __init__(self, db, seed_value):
+        import models
+        from auth import create_access_token
+
+        users = db.query(models.User.id, models.User.username).order_by(models.User.id).limit(SESSIONS).all()
+        self.usernames = [u.username for u in users]
+        self.headers = [
+            {"Authorization": f"Bearer {create_access_token(data={'sub': u.username, 'uid': u.id})}"}
+            for u in users
+        ]
+        self.slugs = [s for (s,) in db.query(models.Page.slug).filter(models.Page.visibility == "public")]
+        self.journal_ids = [j for (j,) in db.query(models.Journal.id).order_by(models.Journal.id)]
+        self.seed = seed_value
+
+    def requests(self, scenario, count):
+        """`count` (method, url, kwargs) tuples, fixed for a given seed."""
+        rng = random.Random(f"{self.seed}:{scenario}")
+        for n in range(count):
+            headers = rng.choice(self.headers)
+            if scenario == "list_pages":
+                yield "GET", "/api/pages", {"headers": headers}
+            elif scenario == "list_pages_summary":
+                yield "GET", "/api/pages/summary", {"headers": headers}
+            elif scenario == "get_page":
+                yield "GET", f"/api/pages/{rng.choice(self.slugs)}", {"headers": headers}
+            elif scenario == "get_journal":
+                yield "GET", f"/api/journals/{rng.choice(self.journal_ids)}", {"headers": headers}
+            elif scenario == "add_entry":
+                content = f"<p>{synthetic.sentence(rng, rng.randint(6, 30))}</p>"
+                yield "POST", f"/api/journals/{rng.choice(self.journal_ids)}/entries", {
+                    "headers": headers, "json": {"content": content, "is_private": n % 20 == 0},
+                }
+            elif scenario == "login":
+                yield "POST", "/api/token", {"data": {"username": rng.choice(self.usernames), "password": PASSWORD}}
+
+
+# --- Measurement ---
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def run_scenario(client, plan, concurrency):
+    def call(request):
+        method, url, kwargs = request
+        started = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code, int(response.headers.get("x-query-count", 0))
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(call, plan))
+    else:
+        results = [call(request) for request in plan]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    queries = [r[2] for r in results]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for r in results if r[1] >= 400),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "throughput_rps": round(len(results) / wall, 1),
+        "queries": {"mean": round(statistics.fmean(queries), 2), "max": max(queries)},
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Scenarios that got slower at p95 by more than `tolerance`, or ran more queries."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append({"scenario": name, "metric": "p95_ms",
+                                "baseline": before["p95_ms"], "current": current["p95_ms"]})
+        if current["queries"]["max"] > before["queries"]["max"]:
+            regressions.append({"scenario": name, "metric": "queries.max",
+                                "baseline": before["queries"]["max"], "current": current["queries"]["max"]})
+    return regressions
+
+
+def run(args, workdir):
+    _configure(workdir)
+    from fastapi.testclient import TestClient
+
+    import main
+    from database import SessionLocal
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        dataset = seed(db, args)
+        workload = Workload(db, args.seed)
+    dataset["seconds"] = round(time.perf_counter() - started, 2)
+
+    scenarios = {}
+    with TestClient(main.app) as client:
+        for name in args.scenarios:
+            count = args.login_requests if name == "login" else args.requests
+            warmup = min(args.warmup, count)
+            run_scenario(client, list(workload.requests(name, warmup)), 1)
+            scenarios[name] = run_scenario(client, list(workload.requests(name, count)), args.concurrency)
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "options": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+            "env": {k: os.environ[k] for k in ("SQLITE_PROFILE", "DB_ASYNC", "BCRYPT_ROUNDS") if k in os.environ},
+        },
+        "dataset": dataset,
+        "scenarios": scenarios,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--journals", type=int, default=3)
+    parser.add_argument("--entries", type=int, default=3000, help="entries per journal")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=20, help="bcrypt makes logins slow by design")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--scenarios", type=lambda s: [n for n in s.split(",") if n], default=list(SCENARIOS))
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="an earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth, as a fraction")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if min(args.requests, args.login_requests) < 1:
+        parser.error("--requests and --login-requests must be at least 1")
+    if args.users < 2:
+        parser.error("--users must be at least 2, private pages are shared between users")
+
+    with tempfile.TemporaryDirectory(prefix="dndwiki-bench-") as workdir:
+        report = run(args, workdir)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("options") != report["meta"]["options"]:
+            print("warning: the baseline was run with different options", file=sys.stderr)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(1 if report.get("regressions") else 0)
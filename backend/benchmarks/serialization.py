@@ -0,0 +1,67 @@
+"""
+JSON serialization and compression of a large page listing.
+
+    python -m benchmarks.serialization [--pages 5000] [--repeat 5]
+
+"before" is FastAPI's default path (jsonable_encoder + JSONResponse),
+"after" is fast_json.respond (orjson). Payload sizes are for the body as
+sent with no encoding, gzip and brotli at the configured levels.
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import fast_json
+from benchmarks import synthetic
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return result, statistics.median(samples)
+
+
+def run(page_count, repeat):
+    rows = list(synthetic.pages(page_count))
+    before, before_s = timed(lambda: JSONResponse(jsonable_encoder(rows)).body, repeat)
+    after, after_s = timed(lambda: fast_json.respond(rows).body, repeat)
+    assert json.loads(before) == json.loads(after), "orjson output differs"
+
+    report = {
+        "pages": page_count,
+        "serialize_ms": {"before": round(before_s * 1000, 2), "after": round(after_s * 1000, 2)},
+        "speedup": round(before_s / after_s, 2),
+        "bytes": {"identity": len(after)},
+        "compress_ms": {},
+    }
+    gz, gz_s = timed(lambda: gzip.compress(after, compresslevel=Config.GZIP_LEVEL, mtime=0), repeat)
+    report["bytes"]["gzip"] = len(gz)
+    report["compress_ms"]["gzip"] = round(gz_s * 1000, 2)
+    if brotli is not None:
+        br, br_s = timed(lambda: brotli.compress(after, quality=Config.BROTLI_QUALITY), repeat)
+        report["bytes"]["br"] = len(br)
+        report["compress_ms"]["br"] = round(br_s * 1000, 2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.pages, args.repeat), indent=2))
@@ -0,0 +1,125 @@
+"""
+Deterministic synthetic wiki content shaped like what the Quill editor produces.
+
+`pages()` yields listing rows for in-memory benchmarks; `campaign()` yields
+a whole campaign as `transfer` records (pages, private-page grants,
+journals and entries) to be written through the bulk importer.
+"""
+import random
+from datetime import datetime, timedelta
+
+WORDS = (
+    "dragon sword keep river tavern ranger wizard ancient ruin goblin merchant "
+    "guild arcane shrine northern pass storm giant crown oath rune forest "
+    "cavern bard healer siege relic tower harbor ember frost shadow council"
+).split()
+
+
+def sentence(rng, n=12):
+    words = [rng.choice(WORDS) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+
+def quill_html(rng, paragraphs=8):
+    """Headings, paragraphs with inline formatting, lists and wiki links."""
+    parts = []
+    for i in range(paragraphs):
+        if i % 3 == 0:
+            parts.append(f"<h2>{sentence(rng, 3)}</h2>")
+        text = " ".join(sentence(rng, rng.randint(8, 18)) for _ in range(rng.randint(2, 5)))
+        word = rng.choice(WORDS)
+        text = text.replace(word, f"<strong>{word}</strong>", 1)
+        parts.append(f'<p>{text} See <a href="/view/{rng.choice(WORDS)}-{rng.randint(1, 5000)}">more</a>.</p>')
+        if i % 4 == 1:
+            items = "".join(f"<li>{sentence(rng, 5)}</li>" for _ in range(rng.randint(2, 5)))
+            parts.append(f"<ul>{items}</ul>")
+    return "".join(parts)
+
+
+def info_sidebar(rng):
+    """An `info` sidebar like the editor's: a few labelled fields, some with markup."""
+    fields = {
+        "Type": rng.choice(("NPC", "Location", "Faction", "Item", "Deity", "Event")),
+        "Region": rng.choice(WORDS).capitalize(),
+    }
+    for key in rng.sample(("Alignment", "Status", "Leader", "Population", "First seen", "Allies"), rng.randint(1, 4)):
+        fields[key] = sentence(rng, rng.randint(1, 4))[:-1]
+    if rng.random() < 0.3:
+        fields["Notes"] = f"<em>{sentence(rng, 6)}</em>"
+    return fields
+
+
+def pages(count=5000, seed=7, users=50):
+    """Page dicts with the columns list endpoints return."""
+    rng = random.Random(seed)
+    epoch = datetime(2024, 1, 1)
+    for i in range(1, count + 1):
+        title = f"{sentence(rng, 2)[:-1]} {i}"
+        yield {
+            "id": i,
+            "slug": title.lower().replace(" ", "-"),
+            "title": title,
+            "content": quill_html(rng, rng.randint(4, 12)),
+            "visibility": "public" if rng.random() < 0.8 else "private",
+            "access_type": "all_users",
+            "main_image": None,
+            "info": {"Type": rng.choice(WORDS), "Region": rng.choice(WORDS)},
+            "created_by": rng.randint(1, users),
+            "updated_at": epoch + timedelta(minutes=i * 7),
+        }
+
+
+def usernames(count):
+    return [f"player{i}" for i in range(1, count + 1)]
+
+
+def campaign(users, pages=2000, private_share=0.2, shares=3, journals=3, entries=2000, seed=7):
+    """
+    `transfer` records for a campaign written by `users` (usernames):
+    `pages` pages (a `private_share` of them private, each shared with up
+    to `shares` other users) and `journals` journals of `entries` entries.
+    """
+    rng = random.Random(seed)
+    epoch = datetime(2024, 1, 1)
+    private = []
+    for i in range(1, pages + 1):
+        title = f"{sentence(rng, 2)[:-1]} {i}"
+        slug = title.lower().replace(" ", "-")
+        author = rng.choice(users)
+        is_private = rng.random() < private_share
+        if is_private:
+            private.append((slug, author))
+        when = epoch + timedelta(minutes=i * 7)
+        yield {
+            "type": "page",
+            "slug": slug,
+            "title": title,
+            "content": quill_html(rng, rng.randint(4, 12)),
+            "visibility": "private" if is_private else "public",
+            "access_type": "all_users",
+            "main_image": None,
+            "info": info_sidebar(rng),
+            "created_by": author,
+            "created_at": when.isoformat(),
+            "updated_at": when.isoformat(),
+        }
+    for slug, author in private:
+        others = [u for u in users if u != author]
+        for user in rng.sample(others, min(len(others), rng.randint(0, shares))):
+            yield {"type": "grant", "page": slug, "user": user}
+
+    for j in range(1, journals + 1):
+        started = epoch + timedelta(days=j)
+        yield {"type": "journal", "id": j, "title": f"Session log {j}", "created_by": users[0],
+               "created_at": started.isoformat()}
+        for n in range(entries):
+            yield {
+                "type": "entry",
+                "journal": j,
+                "order_index": n,
+                "content": f"<p>{sentence(rng, rng.randint(6, 30))}</p>",
+                "created_by": rng.choice(users),
+                "created_at": (started + timedelta(seconds=n * 45)).isoformat(),
+                "is_private": rng.random() < 0.05,
+            }
+
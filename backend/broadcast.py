@@ -0,0 +1,423 @@
+"""
+Journal realtime fan-out.
+
+Endpoints publish an event once through a broker; every worker process
+receives it from the broker and delivers it to the WebSockets it holds.
+The in-process broker only reaches the current worker; the SQLite relay
+shares events between workers through a small WAL-mode database.
+
+Every event carries a `seq`. Brokers keep a bounded log of recent events
+so a reconnecting client can pass `?resume=<seq>` and receive only what it
+missed, or a "resync" event when the gap is no longer in the log.
+
+Broker methods are synchronous so sync endpoints can call them from the
+threadpool; code on the event loop goes through `Broker.run` (or the
+`*_async` helpers), which keeps the relay's sqlite3 calls off the loop.
+"""
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from fastapi import WebSocket
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+# --- Local connections ---
+PING = json.dumps({"event": "ping"})
+RESYNC = json.dumps({"event": "resync"})
+
+
+def stamp(seq: int, payload: str) -> str:
+    """Add `seq` to a serialized event object without re-encoding it."""
+    return f'{payload[:-1]}, "seq": {seq}}}'
+
+
+class ClientConnection:
+    """
+    One WebSocket with its own bounded outbound queue, drained by a
+    dedicated writer task so a slow client never holds up the others.
+    """
+
+    def __init__(self, websocket: WebSocket, journal_id: int, max_queue: int, send_timeout: float):
+        self.websocket = websocket
+        self.journal_id = journal_id
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+        self.last_seq = 0
+        self._writer = None
+
+    def start(self, on_close, backlog=()):
+        """Start writing: `backlog` (replayed events) first, then the live queue."""
+        self._writer = asyncio.create_task(self._run(on_close, list(backlog)))
+
+    def enqueue(self, payload: str, seq=None) -> bool:
+        """Queue a message without waiting; False means the client is too far behind."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait((seq, payload))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self, code=1000):
+        """Abandon queued messages (and any send in flight) and close the socket."""
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer:
+            self._writer.cancel()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def _send(self, seq, payload):
+        # Live events queued while the backlog was loaded may repeat it
+        if seq is not None:
+            if seq <= self.last_seq:
+                return
+            self.last_seq = seq
+        await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+
+    async def _run(self, on_close, backlog):
+        try:
+            for seq, payload in backlog:
+                await self._send(seq, payload)
+            while True:
+                await self._send(*(await self.queue.get()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Dropping journal %s client: %s", self.journal_id, e)
+            self.closed = True
+            asyncio.create_task(self._close_socket(1011))
+        finally:
+            self.closed = True
+            on_close(self)
+
+    async def stop(self):
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+class ConnectionHub:
+    """Clients connected to this worker, per journal."""
+
+    def __init__(self, max_queue, send_timeout, heartbeat_interval):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.connections: Dict[int, List[ClientConnection]] = {}
+        self.evictions = 0
+        self._heartbeat = None
+
+    async def connect(self, journal_id: int, websocket: WebSocket, resume=None) -> ClientConnection:
+        """
+        Register a client, then replay what it missed since `resume`.
+        Registering first means nothing published meanwhile is lost;
+        duplicates are dropped by seq.
+        """
+        client = ClientConnection(websocket, journal_id, self.max_queue, self.send_timeout)
+        self.connections.setdefault(journal_id, []).append(client)
+        backlog = []
+        if resume is not None:
+            missed = await broker.run(broker.events_since, journal_id, resume)
+            backlog = [(None, RESYNC)] if missed is None else missed
+            client.last_seq = resume
+        client.start(self._forget, backlog)
+        return client
+
+    async def disconnect(self, client: ClientConnection):
+        self._forget(client)
+        await client.stop()
+
+    def _forget(self, client: ClientConnection):
+        clients = self.connections.get(client.journal_id)
+        if clients and client in clients:
+            clients.remove(client)
+            # Clean up empty list
+            if not clients:
+                del self.connections[client.journal_id]
+
+    async def fan_out(self, journal_id: int, payload: str, seq=None):
+        """O(enqueue) per client; clients whose queue is full are evicted."""
+        for client in list(self.connections.get(journal_id, [])):
+            if not client.enqueue(payload, seq):
+                self.evictions += 1
+                logger.warning("Evicting slow client on journal %s", journal_id)
+                self._forget(client)
+                client.close(code=1013)  # "try again later": client should reconnect
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            for journal_id in list(self.connections):
+                await self.fan_out(journal_id, PING)
+
+    def start(self):
+        if self.heartbeat_interval > 0:
+            self._heartbeat = asyncio.create_task(self._send_heartbeats())
+
+    async def stop(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for clients in list(self.connections.values()):
+            for client in list(clients):
+                await self.disconnect(client)
+
+
+# --- Brokers ---
+class Broker(abc.ABC):
+    """Carries published events to every worker's `deliver` callback."""
+
+    @abc.abstractmethod
+    async def start(self, deliver):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+    async def run(self, fn, *args):
+        """Call one of the sync methods below from the event loop without blocking it."""
+        return fn(*args)
+
+    @abc.abstractmethod
+    def publish(self, journal_id: int, message: dict):
+        """Thread-safe; may be called from sync endpoints running in the threadpool."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def latest_seq(self) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def events_since(self, journal_id: int, seq: int):
+        """
+        [(seq, payload), ...] for the journal's events after `seq`, or None
+        when some of them are no longer retained and the client must resync.
+        """
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    """Single-worker broker: hands events straight to this process's loop."""
+
+    def __init__(self, log_size):
+        self.log_size = log_size
+        self._loop = None
+        self._deliver = None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._log: Dict[int, deque] = {}
+        self._dropped_through: Dict[int, int] = {}  # newest seq that fell out of a journal's log
+
+    async def start(self, deliver):
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+
+    def publish(self, journal_id, message):
+        if self._loop is None or self._loop.is_closed():
+            logger.warning("Broker not started; dropping event for journal %s", journal_id)
+            return
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            payload = stamp(seq, json.dumps(message, default=str))
+            log = self._log.setdefault(journal_id, deque())
+            log.append((seq, payload))
+            if len(log) > self.log_size:
+                self._dropped_through[journal_id] = log.popleft()[0]
+        self._loop.call_soon_threadsafe(
+            lambda: self._loop.create_task(self._deliver(journal_id, payload, seq))
+        )
+
+    def latest_seq(self):
+        return self._seq
+
+    def events_since(self, journal_id, seq):
+        with self._lock:
+            # A seq from before a restart, or older than what we kept
+            if seq > self._seq or seq < self._dropped_through.get(journal_id, 0):
+                return None
+            return [e for e in self._log.get(journal_id, ()) if e[0] > seq]
+
+
+class SQLiteRelayBroker(Broker):
+    """
+    Multi-worker broker: publishers append to an events table, and each
+    worker polls for rows newer than the last one it delivered.
+    """
+
+    def __init__(self, path, poll_interval, retention_seconds, log_size):
+        self.path = path
+        self.log_size = log_size
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        # One thread for the event loop's calls: they queue up instead of
+        # blocking the loop for up to the sqlite3 busy timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broadcast-relay")
+        self._task = None
+        self._last_id = 0
+        self._last_prune = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS broadcast_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, journal_id INTEGER NOT NULL, "
+                "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_broadcast_events_journal "
+                "ON broadcast_events (journal_id, id)"
+            )
+            self._local.conn = conn
+        return conn
+
+    async def start(self, deliver):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Only deliver events published after this worker came up
+        self._last_id = await self.run(self.latest_seq)
+        self._task = asyncio.create_task(self._poll(deliver))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def publish(self, journal_id, message):
+        self._conn().execute(
+            "INSERT INTO broadcast_events (journal_id, payload, created_at) VALUES (?, ?, ?)",
+            (journal_id, json.dumps(message, default=str), time.time()),
+        )
+
+    async def _poll(self, deliver):
+        while True:
+            try:
+                rows = await self.run(self._fetch, self._last_id)
+                for event_id, journal_id, payload in rows:
+                    self._last_id = event_id
+                    await deliver(journal_id, stamp(event_id, payload), event_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Broadcast relay poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def _fetch(self, after_id):
+        rows = self._conn().execute(
+            "SELECT id, journal_id, payload FROM broadcast_events WHERE id > ? ORDER BY id",
+            (after_id,),
+        ).fetchall()
+        self._prune()
+        return rows
+
+    def latest_seq(self):
+        # sqlite_sequence survives pruning, unlike MAX(id)
+        row = self._conn().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'broadcast_events'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def events_since(self, journal_id, seq):
+        conn = self._conn()
+        oldest = conn.execute("SELECT MIN(id) FROM broadcast_events").fetchone()[0]
+        latest = self.latest_seq()
+        if seq > latest or (oldest is not None and seq < oldest - 1) or (oldest is None and seq < latest):
+            return None
+        rows = conn.execute(
+            "SELECT id, payload FROM broadcast_events WHERE journal_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (journal_id, seq, self.log_size + 1),
+        ).fetchall()
+        if len(rows) > self.log_size:
+            return None
+        return [(event_id, stamp(event_id, payload)) for event_id, payload in rows]
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < self.retention_seconds / 10:
+            return
+        self._last_prune = now
+        self._conn().execute(
+            "DELETE FROM broadcast_events WHERE created_at < ?", (now - self.retention_seconds,)
+        )
+
+
+def create_broker(backend: str) -> Broker:
+    if backend == "memory":
+        return InProcessBroker(log_size=Config.BROADCAST_EVENT_LOG_SIZE)
+    if backend == "sqlite":
+        return SQLiteRelayBroker(
+            Config.BROADCAST_SQLITE_PATH,
+            poll_interval=Config.BROADCAST_POLL_INTERVAL,
+            retention_seconds=Config.BROADCAST_RETENTION_SECONDS,
+            log_size=Config.BROADCAST_EVENT_LOG_SIZE,
+        )
+    raise ValueError(f"Unknown BROADCAST_BACKEND: {backend!r}")
+
+
+hub = ConnectionHub(
+    max_queue=Config.WS_SEND_QUEUE_SIZE,
+    send_timeout=Config.WS_SEND_TIMEOUT_SECONDS,
+    heartbeat_interval=Config.WS_HEARTBEAT_SECONDS,
+)
+broker = create_broker(Config.BROADCAST_BACKEND)
+
+
+async def start():
+    hub.start()
+    await broker.start(hub.fan_out)
+
+
+async def stop():
+    await broker.stop()
+    await hub.stop()
+
+
+def publish(journal_id: int, event: str, data: dict):
+    """Publish an event to every worker. Safe to call from sync endpoints."""
+    broker.publish(journal_id, {"event": event, "data": data})
+
+
+async def publish_async(journal_id: int, event: str, data: dict):
+    """`publish` for async endpoints."""
+    await broker.run(broker.publish, journal_id, {"event": event, "data": data})
+
+
+def latest_seq() -> int:
+    """Sequence number a client can later resume from."""
+    return broker.latest_seq()
+
+
+async def latest_seq_async() -> int:
+    """`latest_seq` for async endpoints."""
+    return await broker.run(broker.latest_seq)
@@ -0,0 +1,170 @@
+"""
+gzip / brotli response compression.
+
+Bodies smaller than COMPRESSION_MIN_BYTES, images and other already
+compressed types, ranged or pre-encoded responses pass through as-is.
+Brotli is used when the `brotli` package is installed and the client
+asks for it; otherwise gzip.
+"""
+import gzip
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+SKIP_TYPES = ("image/", "video/", "audio/", "font/woff", "application/zip", "application/gzip")
+
+
+def compressible(content_type: str) -> bool:
+    """False for types that are already compressed."""
+    return not content_type.startswith(SKIP_TYPES)
+
+
+def choose_encoding(accept_encoding: str):
+    """Best encoding we support from an Accept-Encoding header, or None."""
+    offered = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        offered[token.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if offered.get(encoding, offered.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Incremental compressor with a common interface for both encodings."""
+
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+            self._compress, self._flush = self._c.process, self._c.finish
+        else:
+            # wbits=31 -> gzip container
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._compress, self._flush = self._c.compress, self._c.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=500, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None  # set once we've committed to compressing a streamed body
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            kind = message["type"]
+            if passthrough:
+                return await send(message)
+
+            if kind == "http.response.start":
+                start = {**message, "headers": list(message["headers"])}
+                headers = Headers(raw=message["headers"])
+                if not self._compressible(message["status"], headers):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if kind != "http.response.body":
+                # pathsend / zerocopysend and friends: send untouched
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body:
+                    # Whole body in one message: compress only if it pays off
+                    if len(body) < self.minimum_size:
+                        passthrough = True
+                        await send(start)
+                        return await send(message)
+                    data = self._compress_all(encoding, body)
+                    headers = self._encoded_headers(start, encoding)
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    return await send({"type": "http.response.body", "body": data})
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = self._encoded_headers(start, encoding)
+                del headers["Content-Length"]
+                await send(start)
+
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, status, headers: Headers) -> bool:
+        if status < 200 or status in (204, 206, 304):
+            return False
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+        return compressible(headers.get("content-type", ""))
+
+    def _compress_all(self, encoding, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    @staticmethod
+    def _encoded_headers(start, encoding) -> MutableHeaders:
+        headers = MutableHeaders(scope=start)
+        headers["Content-Encoding"] = encoding
+        headers.add_vary_header("Accept-Encoding")
+        # Same resource, different bytes: a strong validator would be wrong.
+        # http_cache.make_etag tags are weak already, so 304s match.
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        return headers
+
+
+def install(app):
+    if Config.COMPRESSION_MIN_BYTES < 0:
+        return
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=Config.COMPRESSION_MIN_BYTES,
+        gzip_level=Config.GZIP_LEVEL,
+        brotli_quality=Config.BROTLI_QUALITY,
+    )
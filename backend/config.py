@@ -3,6 +3,21 @@ import os
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "super-secret")
 
+    # --- Database ---
+    DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:////app/data/wiki.db")
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    # Per-request query budgets: "off", "log" (warn when exceeded) or "raise" (500; for tests)
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "off")
+    # Serve the hot endpoints (page, summary, journal, new entry) from async sessions
+    DB_ASYNC = os.environ.get("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+    # "tuned" applies the pragmas below on every SQLite connection; "default" leaves SQLite as-is
+    SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "tuned")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
     # --- Email Settings ---
     MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
     MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
@@ -10,3 +25,72 @@ class Config:
     MAIL_USERNAME = os.environ.get("MAIL_USERNAME")  # your email (e.g. noreply@dndwiki.com)
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")  # app password or SMTP key
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", MAIL_USERNAME)
+    MAIL_FROM = os.environ.get("MAIL_FROM", "noreply@dndwiki.calebdee.io")
+    MAIL_TIMEOUT = float(os.environ.get("MAIL_TIMEOUT", 30))
+    SITE_URL = os.environ.get("SITE_URL", "https://dndwiki.calebdee.io")  # base for links in emails
+    # Outbox dispatcher
+    MAIL_DISPATCHER = os.environ.get("MAIL_DISPATCHER", "true").lower() in ("true", "1")
+    MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", 50))
+    MAIL_RATE_PER_SECOND = float(os.environ.get("MAIL_RATE_PER_SECOND", 5))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", 8))
+    MAIL_RETRY_BASE_SECONDS = float(os.environ.get("MAIL_RETRY_BASE_SECONDS", 30))
+    MAIL_RETRY_MAX_SECONDS = float(os.environ.get("MAIL_RETRY_MAX_SECONDS", 3600))
+    MAIL_POLL_SECONDS = float(os.environ.get("MAIL_POLL_SECONDS", 5))
+    MAIL_IDLE_SECONDS = float(os.environ.get("MAIL_IDLE_SECONDS", 60))  # close the SMTP connection after this
+    MAIL_LEASE_SECONDS = float(os.environ.get("MAIL_LEASE_SECONDS", 300))  # reclaim "sending" rows after a crash
+
+    # --- Page Cache ---
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 512))
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    PAGE_CACHE_TTL_SECONDS = float(os.environ.get("PAGE_CACHE_TTL_SECONDS", 300))
+
+    # --- Page revisions ---
+    REVISION_KEYFRAME_INTERVAL = int(os.environ.get("REVISION_KEYFRAME_INTERVAL", 16))  # max deltas per rebuild
+    REVISION_KEEP_ALL_DAYS = int(os.environ.get("REVISION_KEEP_ALL_DAYS", 30))  # compaction keeps every revision
+    REVISION_KEEP_DAILY_DAYS = int(os.environ.get("REVISION_KEEP_DAILY_DAYS", 365))  # then one a day; older, one a week
+
+    # --- Auth ---
+    AUTH_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_CACHE_TTL_SECONDS", 300))
+    AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+    # --- Password Hashing ---
+    BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 32))
+
+    # --- Journal Broadcast ---
+    BROADCAST_BACKEND = os.environ.get("BROADCAST_BACKEND", "memory")  # "memory" or "sqlite"
+    BROADCAST_SQLITE_PATH = os.environ.get("BROADCAST_SQLITE_PATH", "/app/data/broadcast.db")
+    BROADCAST_POLL_INTERVAL = float(os.environ.get("BROADCAST_POLL_INTERVAL", 0.1))
+    BROADCAST_RETENTION_SECONDS = float(os.environ.get("BROADCAST_RETENTION_SECONDS", 3600))
+    BROADCAST_EVENT_LOG_SIZE = int(os.environ.get("BROADCAST_EVENT_LOG_SIZE", 500))  # per journal
+    WS_SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", 256))
+    WS_SEND_TIMEOUT_SECONDS = float(os.environ.get("WS_SEND_TIMEOUT_SECONDS", 10))
+    WS_HEARTBEAT_SECONDS = float(os.environ.get("WS_HEARTBEAT_SECONDS", 25))
+
+    # --- Response compression ---
+    COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 1024))  # -1 disables
+    GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+    BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))  # 4-5 suits on-the-fly compression
+
+    # --- Images ---
+    IMAGES_DIR = os.environ.get("IMAGES_DIR", "/app/images")
+    IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 25 * 1024 * 1024))
+    IMAGE_VARIANT_WIDTHS = [int(w) for w in os.environ.get("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if w]
+    IMAGE_VARIANT_QUALITY = int(os.environ.get("IMAGE_VARIANT_QUALITY", 80))  # WebP
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+    # Internal nginx location aliased to IMAGES_DIR, e.g. "/_images"; empty serves files from Python
+    IMAGES_ACCEL_REDIRECT = os.environ.get("IMAGES_ACCEL_REDIRECT", "")
+
+    # --- Bulk import ---
+    IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", 1024 * 1024 * 1024))  # whole request body
+    IMPORT_MAX_LINE_BYTES = int(os.environ.get("IMPORT_MAX_LINE_BYTES", 32 * 1024 * 1024))  # one record
+
+    # --- Logging & metrics ---
+    DEBUG = os.environ.get("DEBUG", "false").lower() in ("1", "true", "yes")  # FastAPI debug tracebacks
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # "json" or "text"
+    LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))  # fraction of DEBUG/INFO records kept
+    LOG_SLOW_REQUEST_MS = float(os.environ.get("LOG_SLOW_REQUEST_MS", 1000))  # 0 disables
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")  # when set, /metrics wants "Authorization: Bearer <token>"
@@ -1,8 +1,131 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 
-DATABASE_URL = "sqlite:////app/data/wiki.db"
+from config import Config
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = Config.DATABASE_URL
+
+
+# --- SQLite tuning ---
+def sqlite_pragmas():
+    """Pragmas applied to each new SQLite connection for the configured profile."""
+    if Config.SQLITE_PROFILE == "default":
+        return {"foreign_keys": "ON"}
+    return {
+        "journal_mode": "WAL",  # readers no longer block on the writer
+        "synchronous": "NORMAL",  # durable at checkpoints; safe with WAL
+        "busy_timeout": Config.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -Config.SQLITE_CACHE_SIZE_KB,  # negative = KiB
+        "mmap_size": Config.SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_db_engine(url=DATABASE_URL):
+    """Engine for `url`: tuned pragmas and a sized pool for SQLite, pooled for servers."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+
+    connect_args = {
+        "check_same_thread": False,
+        "timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+    }
+    if url.database in (None, "", ":memory:"):
+        # One shared connection, or every checkout would see a fresh empty DB
+        sqlite_engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        sqlite_engine = create_engine(
+            url,
+            connect_args=connect_args,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+        )
+    event.listen(sqlite_engine, "connect", _apply_pragmas)
+    return sqlite_engine
+
+
+# --- Async engine ---
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url=DATABASE_URL):
+    """`url` with its driver swapped for the asyncio one (aiosqlite, asyncpg)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_db_engine(url=DATABASE_URL):
+    """Async counterpart of create_db_engine, with the same pool and pragmas."""
+    url = async_url(url)
+    if url.get_backend_name() != "sqlite":
+        return create_async_engine(
+            url,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+
+    connect_args = {"timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if url.database in (None, "", ":memory:"):
+        sqlite_engine = create_async_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        # aiosqlite defaults to NullPool; keep connections (and their pragmas) warm
+        sqlite_engine = create_async_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+        )
+    event.listen(sqlite_engine.sync_engine, "connect", _apply_pragmas)
+    return sqlite_engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+# Only built when the async path is switched on, so the sync default needs no async driver
+async_engine = create_async_db_engine() if Config.DB_ASYNC else None
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if async_engine is not None else None
+)
+
+
+# --- Database dependency ---
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,19 @@
+"""orjson-backed responses for the large list endpoints."""
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import inspect
+
+
+def respond(content, response: Response = None, status_code: int = 200) -> ORJSONResponse:
+    """
+    Serialize `content` (dicts, lists, rows of plain values, datetimes)
+    straight to bytes with orjson, skipping FastAPI's jsonable_encoder
+    pass. Headers set on the endpoint's injected `response` carry over.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def columns(obj) -> dict:
+    """An ORM object's column values, without touching its relationships."""
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
@@ -0,0 +1,67 @@
+"""Conditional GET helpers: ETag / Last-Modified validation and 304 responses."""
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts, weak=True):
+    """
+    ETag from the values that determine a response body. Weak unless
+    asked otherwise: compression.py may send the same body gzipped or
+    not, and a 304 has to repeat the tag its 200 carried.
+    """
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return ("W/" if weak else "") + '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def http_date(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # stored as naive UTC
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(request: Request, etag, last_modified=None):
+    """
+    RFC 9110 precedence: If-None-Match wins, compared weakly;
+    If-Modified-Since is only consulted when the client sent no entity tags.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def cache_headers(etag, last_modified=None, shared=False):
+    """
+    Headers for a revalidatable response. Anything that depends on the
+    caller's identity stays private to the browser cache.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": ("public" if shared else "private") + ", no-cache",
+        "Vary": "Authorization",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag, last_modified=None, shared=False):
+    return Response(status_code=304, headers=cache_headers(etag, last_modified, shared))
@@ -0,0 +1,178 @@
+"""
+Serving /images: long-lived caching, conditional GET, byte ranges and
+zero-copy sends.
+
+Content-addressed images (see images.py) never change under their name,
+so they are marked immutable for a year. Anything else in IMAGES_DIR
+(variant manifests, which are rewritten once variants are ready, and
+uploads from before hashing) is revalidated via ETag / Last-Modified.
+
+Bytes reach the client one of three ways:
+- With IMAGES_ACCEL_REDIRECT set, the response carries only headers and
+  an X-Accel-Redirect to that internal nginx location, and nginx sends
+  the file (ranges included) with sendfile.
+- When the ASGI server offers the zerocopysend or pathsend extension,
+  the kernel moves the bytes. uvicorn, which the Dockerfile runs,
+  supports neither.
+- Otherwise, which includes the stock deployment, the file is streamed
+  in chunks from a worker thread.
+"""
+import mimetypes
+import os
+import stat
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+import compression
+import http_cache
+from images import is_immutable
+
+CHUNK_SIZE = 256 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+ZEROCOPY = "http.response.zerocopysend"
+PATHSEND = "http.response.pathsend"
+
+
+def parse_range(header: str, size: int):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the
+    header (malformed, or several ranges: the full body is a valid answer),
+    or "unsatisfiable".
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            if not last:
+                return None
+            suffix = int(last)
+            if suffix == 0:
+                return "unsatisfiable"
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start > end:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+class ImageFiles:
+    """ASGI app for files directly under `directory`; mount it at /images."""
+
+    def __init__(self, directory: str, accel_redirect: str = ""):
+        self.directory = os.path.realpath(directory)
+        self.accel_redirect = accel_redirect.rstrip("/")  # internal proxy location aliased to `directory`
+
+    def _resolve(self, name: str):
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            return None, None
+        path = os.path.join(self.directory, name)
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None, None
+        if not stat.S_ISREG(st.st_mode):
+            return None, None
+        return path, st
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            return await PlainTextResponse("Method Not Allowed", 405, {"Allow": "GET, HEAD"})(scope, receive, send)
+
+        route_path, root = scope["path"], scope.get("root_path", "")
+        if root and route_path.startswith(root):
+            route_path = route_path[len(root):]
+        name = route_path.lstrip("/")
+        path, st = self._resolve(name)
+        if path is None:
+            return await PlainTextResponse("Not Found", 404)(scope, receive, send)
+
+        request = Request(scope)
+        size = st.st_size
+        last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if is_immutable(name):
+            etag = f'"{name}"'  # the name is the content hash
+            cache_control = IMMUTABLE
+        else:
+            # Strong for images, so If-Range works; weak for manifests, which may be compressed
+            etag = http_cache.make_etag(name, st.st_mtime_ns, size, weak=compression.compressible(content_type))
+            cache_control = REVALIDATE
+
+        headers = {
+            "ETag": etag,
+            "Last-Modified": http_cache.http_date(last_modified),
+            "Cache-Control": cache_control,
+            "Accept-Ranges": "bytes",
+            "X-Content-Type-Options": "nosniff",
+        }
+        if http_cache.is_not_modified(request, etag, last_modified):
+            return await Response(status_code=304, headers=headers)(scope, receive, send)
+
+        if self.accel_redirect:
+            # nginx keeps Content-Type and Cache-Control, then serves the file itself
+            headers["Content-Type"] = content_type
+            headers["X-Accel-Redirect"] = f"{self.accel_redirect}/{quote(name)}"
+            return await Response(headers=headers)(scope, receive, send)
+
+        start, end, status = 0, size - 1, 200
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        # A stale If-Range means "send me the whole new file"; a weak tag never matches
+        range_validators = {headers["Last-Modified"]} | ({etag} if not etag.startswith("W/") else set())
+        if range_header and (not if_range or if_range.strip() in range_validators):
+            byte_range = parse_range(range_header, size)
+            if byte_range == "unsatisfiable":
+                return await Response(
+                    status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"}
+                )(scope, receive, send)
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        count = end - start + 1 if size else 0
+        raw_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+        raw_headers += [(b"content-type", content_type.encode()), (b"content-length", str(count).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+
+        if scope["method"] == "HEAD" or count == 0:
+            return await send({"type": "http.response.body", "body": b""})
+        await self._send_file(scope, send, path, start, count, whole=status == 200)
+
+    async def _send_file(self, scope, send, path, offset, count, whole):
+        extensions = scope.get("extensions") or {}
+        if whole and PATHSEND in extensions:
+            return await send({"type": PATHSEND, "path": path})
+
+        async with await anyio.open_file(path, "rb") as f:
+            if ZEROCOPY in extensions:
+                return await send({
+                    "type": ZEROCOPY, "file": f.wrapped, "offset": offset, "count": count, "more_body": False,
+                })
+            await f.seek(offset)
+            remaining = count
+            while remaining:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                # File shrank under us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b""})
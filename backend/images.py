@@ -0,0 +1,245 @@
+"""
+Content-addressed image storage.
+
+Uploads are streamed to disk in chunks while being hashed and stored as
+`<sha256>.<ext>`, so an image uploaded twice is kept once. When Pillow is
+installed, WebP variants at IMAGE_VARIANT_WIDTHS are rendered on a worker
+pool after the upload returns; `<sha256>.json` is the manifest listing the
+original and its variants, from which pages build `srcset`.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from config import Config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # variants are optional; originals are stored either way
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+URL_PREFIX = "/images"
+CHUNK_SIZE = 1024 * 1024
+HASHED_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})(?:-(?P<width>\d+))?\.(?P<ext>[a-z]+)$")
+
+# Leading bytes -> (extension, content type); SVG is deliberately not accepted
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+    (b"GIF87a", "gif", "image/gif"),
+    (b"GIF89a", "gif", "image/gif"),
+]
+EXIF_ROTATED = (5, 6, 7, 8)  # orientations that swap width and height
+# Extensions of stored images and their variants; `<sha256>.json` manifests are rewritten in place
+IMAGE_EXTENSIONS = {ext for _, ext, _ in SIGNATURES} | {"webp"}
+
+
+def is_immutable(name: str) -> bool:
+    """A content-addressed image or variant, which never changes under its name."""
+    match = HASHED_NAME.match(name)
+    return bool(match) and match["ext"] in IMAGE_EXTENSIONS
+
+
+def sniff(head: bytes):
+    """(extension, content type) from an image's first bytes, or None."""
+    for magic, ext, content_type in SIGNATURES:
+        if head.startswith(magic):
+            return ext, content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return None
+
+
+def check_length(request: Request, max_bytes: int = Config.IMAGE_MAX_BYTES):
+    """Reject an upload up front when its declared size is already too big."""
+    length = request.headers.get("content-length")
+    # Multipart framing adds a little on top of the file itself
+    if length and length.isdigit() and int(length) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail="Image too large")
+
+
+async def iter_upload(upload):
+    """Chunks of an UploadFile; reads of spooled-to-disk parts run in the threadpool."""
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _publish(tmp, target):
+    """Move a finished temp file into place atomically, world-readable like any upload."""
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, target)
+
+
+class ImageStore:
+    def __init__(self, root, max_bytes, widths, quality, workers):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.widths = sorted(set(widths))
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-variants")
+        self._rendering = set()  # digests with variants in flight
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def url(self, name: str) -> str:
+        return f"{URL_PREFIX}/{name}"
+
+    async def save(self, chunks) -> dict:
+        """Stream `chunks` (async iterable of bytes) into the store and return the manifest."""
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise HTTPException(status_code=413, detail="Image too large")
+                    digest.update(chunk)
+                    await run_in_threadpool(out.write, chunk)
+
+            with open(tmp, "rb") as f:
+                kind = sniff(f.read(16))
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Empty upload")
+            if kind is None:
+                raise HTTPException(status_code=415, detail="Unsupported image type")
+
+            hex_digest = digest.hexdigest()
+            name = f"{hex_digest}.{kind[0]}"
+            if os.path.exists(self.path(name)):
+                os.remove(tmp)  # already stored: dedupe
+            else:
+                _publish(tmp, self.path(name))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        manifest = self.manifest(hex_digest)
+        if manifest is not None:
+            return manifest
+        return await run_in_threadpool(self._start_manifest, hex_digest, name, kind[1], size)
+
+    def manifest(self, digest: str) -> Optional[dict]:
+        try:
+            with open(self.path(f"{digest}.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def manifest_for(self, url: Optional[str]) -> Optional[dict]:
+        """The manifest of a stored image, from its URL."""
+        if not url or not url.startswith(URL_PREFIX + "/"):
+            return None
+        match = HASHED_NAME.match(url[len(URL_PREFIX) + 1:])
+        return self.manifest(match["digest"]) if match else None
+
+    def variants_pending(self, url: Optional[str]) -> bool:
+        """True while a stored image's variants are still being rendered."""
+        manifest = self.manifest_for(url)
+        return bool(manifest and manifest["variants"] and not manifest.get("variants_ready"))
+
+    def srcset(self, url: Optional[str]) -> Optional[str]:
+        """`srcset` for a stored image's URL, once its variants exist."""
+        manifest = self.manifest_for(url)
+        if not manifest or not manifest.get("variants_ready") or not manifest["variants"]:
+            return None
+        candidates = [f"{v['url']} {v['width']}w" for v in manifest["variants"]]
+        if manifest.get("width"):
+            candidates.append(f"{manifest['url']} {manifest['width']}w")
+        return ", ".join(candidates)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Internals (threadpool / worker pool) ---
+    def _start_manifest(self, digest, name, content_type, size):
+        manifest = {
+            "hash": digest,
+            "url": self.url(name),
+            "content_type": content_type,
+            "size": size,
+            "width": None,
+            "height": None,
+            "variants": [],
+            "variants_ready": True,
+        }
+        if Image is not None:
+            try:
+                width, height = self._probe(self.path(name))
+            except Exception as e:
+                logger.warning("Could not read image %s: %s", name, e)
+            else:
+                manifest["width"], manifest["height"] = width, height
+                widths = [w for w in self.widths if w < width]
+                manifest["variants"] = [{"width": w, "url": self.url(f"{digest}-{w}.webp")} for w in widths]
+                manifest["variants_ready"] = not widths
+        # Written before rendering starts, so the finished manifest always lands last
+        self._write_manifest(manifest)
+        if not manifest["variants_ready"] and digest not in self._rendering:
+            self._rendering.add(digest)
+            self._pool.submit(self._render, dict(manifest), name, [v["width"] for v in manifest["variants"]])
+        return manifest
+
+    @staticmethod
+    def _probe(path):
+        """Display (width, height) from the header alone, honouring EXIF rotation."""
+        with Image.open(path) as im:
+            width, height = im.size
+            if im.getexif().get(0x0112) in EXIF_ROTATED:
+                width, height = height, width
+        return width, height
+
+    def _render(self, manifest, name, widths):
+        digest = manifest["hash"]
+        try:
+            with Image.open(self.path(name)) as im:
+                im = ImageOps.exif_transpose(im)
+                if im.mode not in ("RGB", "RGBA"):
+                    im = im.convert("RGBA" if "A" in im.getbands() or im.mode == "P" else "RGB")
+                for w in widths:
+                    h = max(1, round(im.height * w / im.width))
+                    target = self.path(f"{digest}-{w}.webp")
+                    fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".variant-")
+                    with os.fdopen(fd, "wb") as out:
+                        im.resize((w, h), Image.LANCZOS).save(out, "WEBP", quality=self.quality, method=4)
+                    _publish(tmp, target)
+            manifest["variants_ready"] = True
+            self._write_manifest(manifest)
+        except Exception:
+            logger.exception("Rendering variants for %s failed", name)
+        finally:
+            self._rendering.discard(digest)
+
+    def _write_manifest(self, manifest):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".manifest-")
+        with os.fdopen(fd, "w") as out:
+            json.dump(manifest, out)
+        _publish(tmp, self.path(f"{manifest['hash']}.json"))
+
+
+IMAGES_DIR = Config.IMAGES_DIR
+
+store = ImageStore(
+    IMAGES_DIR,
+    max_bytes=Config.IMAGE_MAX_BYTES,
+    widths=Config.IMAGE_VARIANT_WIDTHS,
+    quality=Config.IMAGE_VARIANT_QUALITY,
+    workers=Config.IMAGE_WORKERS,
+)
@@ -0,0 +1,66 @@
+"""Journal entry ordering: per-journal sequence allocation and bulk reorder."""
+from fastapi import HTTPException
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+from models import Journal, JournalEntry
+
+
+def claim_entry_index(journal_id: int):
+    """
+    UPDATE ... RETURNING that claims the next order_index for a journal.
+    The row write serializes concurrent posts, so indexes never repeat.
+    """
+    return (
+        update(Journal)
+        .where(Journal.id == journal_id)
+        .values(next_entry_index=Journal.next_entry_index + 1)
+        .returning(Journal.next_entry_index - 1)
+    )
+
+
+def allocate_entry_index(db: Session, journal_id: int) -> int:
+    """
+    Claim the next order_index inside the caller's transaction. Returns
+    None if there is no such journal.
+    """
+    return db.execute(claim_entry_index(journal_id)).scalar()
+
+
+def reorder_entries(db: Session, journal_id: int, entry_ids, author_id=None):
+    """
+    Put `entry_ids` in the given order, reusing the slots they already
+    occupy, so entries not listed (e.g. other users' private notes) keep
+    their place. With `author_id`, every listed entry must be theirs.
+    One SELECT plus one UPDATE ... CASE, whatever the count.
+
+    Returns ({entry id: new order_index}, ids of the private entries moved).
+    """
+    if len(set(entry_ids)) != len(entry_ids):
+        raise HTTPException(status_code=400, detail="Duplicate entry ids")
+
+    rows = (
+        db.query(JournalEntry.id, JournalEntry.order_index, JournalEntry.created_by, JournalEntry.is_private)
+        .filter(JournalEntry.journal_id == journal_id, JournalEntry.id.in_(entry_ids))
+        .all()
+    )
+    current = {r.id: r.order_index for r in rows}
+    missing = [i for i in entry_ids if i not in current]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Entries not in this journal: {missing}")
+    if author_id is not None and any(r.created_by != author_id for r in rows):
+        raise HTTPException(status_code=403, detail="Not authorized to reorder other users' entries")
+    private_ids = {r.id for r in rows if r.is_private}
+
+    slots = sorted(current.values())
+    new_index = dict(zip(entry_ids, slots))
+    if not new_index:
+        return new_index, private_ids
+
+    db.execute(
+        update(JournalEntry)
+        .where(JournalEntry.journal_id == journal_id, JournalEntry.id.in_(entry_ids))
+        .values(order_index=case(new_index, value=JournalEntry.id))
+        .execution_options(synchronize_session=False)
+    )
+    return new_index, private_ids
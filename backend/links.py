@@ -0,0 +1,89 @@
+"""
+Wiki link graph.
+
+Internal links are the anchors the editors' `//` picker inserts:
+`<a href="/<slug>">`, in a page's content or in its sidebar info values.
+Each page's outgoing links are stored in page_links when the page is
+written, keyed by target slug, so backlinks are one indexed lookup and a
+link to a page that does not exist yet shows up as broken until someone
+creates it.
+"""
+import re
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.orm import Session, aliased
+
+import acl
+import models
+from models import Page, page_links
+
+HREF = re.compile(r"""<a\s[^>]*?\bhref\s*=\s*["']/([A-Za-z0-9_-]+)/?["']""", re.IGNORECASE)
+# Single-segment app routes that are not pages (see frontend/src/App.jsx)
+RESERVED = {"new-page", "search", "login", "settings"}
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _strings(v)
+
+
+def extract(content, info) -> set:
+    """Slugs linked from a page's HTML content and sidebar info."""
+    slugs = set()
+    for text in _strings([content or "", models.parse_info(info)]):
+        if "href" not in text:
+            continue
+        slugs.update(m.group(1).lower() for m in HREF.finditer(text))
+    return slugs - RESERVED
+
+
+def outgoing(page) -> set:
+    """`page` needs slug, content and info (ORM object or row). Self-links are dropped."""
+    return extract(page.content, page.info) - {page.slug}
+
+
+def index_page(db: Session, page):
+    """Bring page_links up to date for `page`, writing only what changed. Call inside its transaction."""
+    wanted = outgoing(page)
+    current = set(db.scalars(select(page_links.c.target_slug).where(page_links.c.source_id == page.id)))
+    stale, added = current - wanted, wanted - current
+    if stale:
+        db.execute(delete(page_links).where(page_links.c.source_id == page.id, page_links.c.target_slug.in_(stale)))
+    if added:
+        db.execute(insert(page_links), [{"source_id": page.id, "target_slug": s} for s in sorted(added)])
+
+
+# --- Queries ---
+def backlinks(slug: str, current_user):
+    """Pages visible to `current_user` that link to `slug`."""
+    return (
+        select(Page.slug, Page.title)
+        .join(page_links, page_links.c.source_id == Page.id)
+        .where(page_links.c.target_slug == slug, acl.visible_clause(current_user))
+        .order_by(Page.title)
+    )
+
+
+def broken_links(current_user):
+    """(source slug, source title, target slug) for visible pages linking to slugs with no page."""
+    target = aliased(Page)
+    return (
+        select(Page.slug, Page.title, page_links.c.target_slug)
+        .join(page_links, page_links.c.source_id == Page.id)
+        .where(
+            ~exists().where(target.slug == page_links.c.target_slug),
+            acl.visible_clause(current_user),
+        )
+        .order_by(page_links.c.target_slug, Page.slug)
+    )
+
+
+def title_map(visible):
+    """slug -> title rows over a queries.visible_summary() subquery."""
+    return select(visible.c.slug, visible.c.title).order_by(visible.c.slug)
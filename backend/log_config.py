@@ -0,0 +1,67 @@
+"""
+Leveled, sampled, structured logging.
+
+`configure()` replaces the old `basicConfig(level=DEBUG)`: the level comes
+from LOG_LEVEL, records are written one JSON object per line (LOG_FORMAT
+"json") or as plain text, and DEBUG/INFO records are kept at
+LOG_SAMPLE_RATE so hot paths can log per request without flooding
+stdout. Warnings and errors are never sampled. Fields passed through
+`extra={...}` become top-level keys of the JSON record.
+"""
+import json
+import logging
+import random
+import sys
+from datetime import datetime, timezone
+
+from config import Config
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _STANDARD)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _STANDARD)
+        return f"{line} {fields}" if fields else line
+
+
+class SampleFilter(logging.Filter):
+    """Keep a `rate` fraction of records below WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def configure(level=Config.LOG_LEVEL, fmt=Config.LOG_FORMAT, sample_rate=Config.LOG_SAMPLE_RATE):
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(SampleFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    # Per-request access lines duplicate the metrics; keep uvicorn's errors only
+    logging.getLogger("uvicorn.access").setLevel(max(root.level, logging.WARNING))
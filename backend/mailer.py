@@ -0,0 +1,345 @@
+"""
+Transactional email outbox.
+
+Endpoints call `enqueue()` inside their own transaction, so a message is
+stored exactly when the change it announces commits and survives
+restarts. The Dispatcher drains due rows in batches over one long-lived
+SMTP connection, rate limited, and retries failures with exponential
+backoff. Rows are claimed under a lease, so each worker can run its own
+dispatcher; a crash mid-batch means a resend once the lease expires. A
+slow server can't push a batch past its lease: sending stops short of
+it and the unsent rows go straight back to the queue.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+
+import aiosmtplib
+from sqlalchemy import func, select, update
+from starlette.concurrency import run_in_threadpool
+
+from config import Config
+from database import SessionLocal
+from models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+CLAIMABLE = ("pending", "sending")  # "sending" rows are claimable once their lease runs out
+# The server answered: the connection is still good for the next message
+REPLY_ERRORS = (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused)
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # stored as naive UTC
+
+
+def enqueue(db, recipient: str, subject: str, body: str):
+    """Add a message to the outbox; it is sent once the caller commits."""
+    db.add(EmailOutbox(recipient=recipient, subject=subject, body=body, next_attempt_at=utcnow()))
+
+
+def pages_shared(db, recipient: str, sharer: str, slugs):
+    """One notification per recipient, however many pages were shared at once."""
+    links = "\n".join(f"{Config.SITE_URL}/view/{slug}" for slug in slugs)
+    if len(slugs) == 1:
+        subject, intro = f"{sharer} shared a private DNDWiki page with you", "Visit your shared page:"
+    else:
+        subject, intro = f"{sharer} shared {len(slugs)} private DNDWiki pages with you", "Visit your shared pages:"
+    enqueue(db, recipient, subject=subject, body=f"{intro}\n\n{links}")
+
+
+def backoff(attempts: int, base: float, cap: float) -> float:
+    """Seconds before retry number `attempts`: doubling, capped, with jitter."""
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def is_permanent(error: Exception) -> bool:
+    """5xx replies (bad mailbox, rejected message) won't succeed on retry."""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(r.code >= 500 for r in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code >= 500
+    return False
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        *,
+        hostname,
+        port,
+        username,
+        password,
+        start_tls,
+        sender,
+        timeout,
+        batch_size,
+        rate,
+        max_attempts,
+        retry_base,
+        retry_max,
+        poll_interval,
+        idle_timeout,
+        lease,
+    ):
+        self.session_factory = session_factory
+        self.smtp_args = dict(
+            hostname=hostname,
+            port=port,
+            username=username or None,
+            password=password or None,
+            start_tls=start_tls,
+            timeout=timeout,
+        )
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.lease = lease
+        # Kept in hand at the end of a lease for recording the batch
+        self.lease_margin = min(timeout, lease / 10)
+        self._lease_ends = 0.0
+        self._limiter = RateLimiter(rate)
+        self._smtp = None
+        self._last_used = 0.0
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.connections = 0
+
+    # --- Lifecycle ---
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+    def wake(self):
+        """Check the outbox now rather than at the next poll. Thread-safe."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                batch = await run_in_threadpool(self._claim)
+                if batch:
+                    await self._send_batch(batch)
+                    continue  # keep draining while there's a backlog
+                if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                    await self._disconnect()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Mail dispatcher iteration failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Outbox rows (threadpool) ---
+    def _claim(self):
+        now = utcnow()
+        self._lease_ends = time.monotonic() + self.lease
+        due = (
+            select(EmailOutbox.id)
+            .where(EmailOutbox.status.in_(CLAIMABLE), EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(self.batch_size)
+            .scalar_subquery()
+        )
+        with self.session_factory() as db:
+            rows = db.execute(
+                update(EmailOutbox)
+                # Re-checked here so two dispatchers never claim the same row
+                .where(EmailOutbox.id.in_(due), EmailOutbox.status.in_(CLAIMABLE), EmailOutbox.next_attempt_at <= now)
+                .values(status="sending", next_attempt_at=now + timedelta(seconds=self.lease))
+                .returning(
+                    EmailOutbox.id, EmailOutbox.recipient, EmailOutbox.subject, EmailOutbox.body, EmailOutbox.attempts
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+        return rows
+
+    def _record(self, results, unsent=()):
+        now = utcnow()
+        with self.session_factory() as db:
+            if unsent:
+                # Never tried: due again at once, no attempt charged
+                db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id.in_([row.id for row in unsent]), EmailOutbox.status == "sending")
+                    .values(status="pending", next_attempt_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+            sent_ids = [row.id for row, error in results if error is None]
+            if sent_ids:
+                db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id.in_(sent_ids))
+                    .values(status="sent", sent_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            for row, error in results:
+                if error is None:
+                    continue
+                attempts = row.attempts + 1
+                values = {"attempts": attempts, "last_error": (str(error) or type(error).__name__)[:1000]}
+                if is_permanent(error) or attempts >= self.max_attempts:
+                    values["status"] = "failed"
+                    self.failed += 1
+                    logger.warning("Giving up on email %s to %s: %s", row.id, row.recipient, error)
+                else:
+                    values["status"] = "pending"
+                    values["next_attempt_at"] = now + timedelta(
+                        seconds=backoff(attempts, self.retry_base, self.retry_max)
+                    )
+                    self.retried += 1
+                db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id == row.id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        self.sent += len(sent_ids)
+
+    # --- SMTP ---
+    async def _send_batch(self, batch):
+        """Send what fits in the lease taken by the last _claim(); hand back the rest."""
+        deadline = self._lease_ends - self.lease_margin
+        results, unsent = [], []
+        for i, row in enumerate(batch):
+            await self._limiter.wait()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                unsent = batch[i:]
+                logger.info("Mail lease nearly up; returning %d unsent emails to the outbox", len(unsent))
+                break
+            try:
+                await asyncio.wait_for(self._send(row), remaining)
+                results.append((row, None))
+            except Exception as e:
+                logger.info("Email %s to %s failed: %s", row.id, row.recipient, e)
+                results.append((row, e))
+                if isinstance(e, asyncio.TimeoutError):
+                    await self._disconnect(polite=False)  # a QUIT would wait on the stalled reply
+                elif not isinstance(e, REPLY_ERRORS):
+                    await self._disconnect()  # connection trouble: start fresh
+        await run_in_threadpool(self._record, results, unsent)
+
+    async def _send(self, row):
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = row.recipient
+        message["Subject"] = row.subject
+        message.set_content(row.body)
+
+        smtp = await self._connection()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The server dropped an idle connection; one reconnect, then give up
+            await self._disconnect()
+            smtp = await self._connection()
+            await smtp.send_message(message)
+        self._last_used = time.monotonic()
+
+    async def _connection(self):
+        if self._smtp is None or not self._smtp.is_connected:
+            smtp = aiosmtplib.SMTP(**self.smtp_args)
+            await smtp.connect()  # logs in too when a username is configured
+            self._smtp = smtp
+            self.connections += 1
+        return self._smtp
+
+    async def _disconnect(self, polite=True):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            if not polite:
+                smtp.close()
+                return
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def stats(self):
+        with self.session_factory() as db:
+            counts = dict(db.execute(select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)).all())
+        return {
+            "outbox": counts,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "smtp_connections": self.connections,
+            "running": self._task is not None,
+        }
+
+
+dispatcher = Dispatcher(
+    hostname=Config.MAIL_SERVER,
+    port=Config.MAIL_PORT,
+    username=Config.MAIL_USERNAME,
+    password=Config.MAIL_PASSWORD,
+    start_tls=Config.MAIL_USE_TLS,
+    sender=Config.MAIL_FROM,
+    timeout=Config.MAIL_TIMEOUT,
+    batch_size=Config.MAIL_BATCH_SIZE,
+    rate=Config.MAIL_RATE_PER_SECOND,
+    max_attempts=Config.MAIL_MAX_ATTEMPTS,
+    retry_base=Config.MAIL_RETRY_BASE_SECONDS,
+    retry_max=Config.MAIL_RETRY_MAX_SECONDS,
+    poll_interval=Config.MAIL_POLL_SECONDS,
+    idle_timeout=Config.MAIL_IDLE_SECONDS,
+    lease=Config.MAIL_LEASE_SECONDS,
+)
+
+
+async def start():
+    if Config.MAIL_DISPATCHER:
+        await dispatcher.start()
+
+
+async def stop():
+    await dispatcher.stop()
+
+
+def notify():
+    """Call after committing enqueued mail so it goes out without waiting for a poll."""
+    dispatcher.wake()
@@ -1,20 +1,22 @@
-from fastapi import FastAPI, Depends, HTTPException, Form, UploadFile, Body, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi import WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-import json
+from fastapi.routing import APIRoute
+from fastapi import WebSocket, WebSocketDisconnect, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import or_, and_
 from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict
+from typing import Optional, List
 
-import os, shutil, logging, re
+import os, logging, re
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 
-from database import Base, engine, SessionLocal
-import models, schemas
+from database import engine, get_db, SessionLocal
+import models, schemas, search, pagination, http_cache, acl, broadcast, journal_order, queries, migrations, links
+import querycount, images, image_server, compression, fast_json, mailer, metrics, log_config, transfer, revisions
+from config import Config
+from page_cache import page_cache, build_cached_page, respond
 from schemas import JournalCreate, JournalEntryCreate
 from models import Journal, JournalEntry, User
 
@@ -25,23 +27,11 @@ from auth import (
     get_current_user_optional
 )
 
-# --- Email Config ---
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM=os.getenv("MAIL_FROM", "noreply@dndwiki.calebdee.io"),
-    MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
-    MAIL_SERVER=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-)
-fm = FastMail(conf)
-
 # --- Setup ---
-logging.basicConfig(level=logging.DEBUG)
-app = FastAPI(debug=True)
-Base.metadata.create_all(bind=engine)
+log_config.configure()
+logger = logging.getLogger(__name__)
+app = FastAPI(debug=Config.DEBUG)
+migrations.upgrade(engine)
 
 # --- CORS ---
 origins = [
@@ -56,89 +46,128 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, querycount.QUERY_COUNT_HEADER],
 )
+querycount.install(app)
+compression.install(app)
+metrics.install(app)  # outermost: its timings include compression
 
 # --- Static images ---
-IMAGES_DIR = "/app/images"
+IMAGES_DIR = images.IMAGES_DIR
 os.makedirs(IMAGES_DIR, exist_ok=True)
-app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
+app.mount("/images", image_server.ImageFiles(IMAGES_DIR, Config.IMAGES_ACCEL_REDIRECT), name="images")
 
 # --- Include Auth ---
 app.include_router(auth_router, prefix="/api")
 
-# Keep track of active websocket connections per journal
-active_connections: Dict[int, List[WebSocket]] = {}
+# Keep track of active websocket connections per journal (this worker only)
+active_connections = broadcast.hub.connections
+
+
+@app.on_event("startup")
+async def start_broadcast():
+    await broadcast.start()
+
+
+@app.on_event("shutdown")
+async def stop_broadcast():
+    await broadcast.stop()
+
+
+@app.on_event("shutdown")
+def stop_image_workers():
+    images.store.close()
+
+
+@app.on_event("startup")
+async def start_mailer():
+    await mailer.start()
+
+
+@app.on_event("shutdown")
+async def stop_mailer():
+    await mailer.stop()
+
 
 @app.websocket("/ws/journals/{journal_id}")
-async def websocket_endpoint(websocket: WebSocket, journal_id: int):
+async def websocket_endpoint(websocket: WebSocket, journal_id: int, resume: Optional[int] = None):
+    """`resume` is the last seq the client saw; missed events are replayed first."""
     await websocket.accept()
-
-    # Ensure list exists
-    if journal_id not in active_connections:
-        active_connections[journal_id] = []
-    active_connections[journal_id].append(websocket)
+    client = await broadcast.hub.connect(journal_id, websocket, resume=resume)
 
     try:
         while True:
             await websocket.receive_text()  # just keep alive
     except WebSocketDisconnect:
-        # Only remove if it's still in the list
-        if journal_id in active_connections and websocket in active_connections[journal_id]:
-            active_connections[journal_id].remove(websocket)
-
-            # Clean up empty list
-            if not active_connections[journal_id]:
-                del active_connections[journal_id]
+        pass
+    finally:
+        await broadcast.hub.disconnect(client)
 
 
-# --- Database dependency ---
-def get_db():
-    db = SessionLocal()
+# --- Upload Image ---
+@app.post("/api/upload-image")
+async def upload_image(request: Request):
+    """
+    Multipart upload (field "file"). Stored under its content hash, so the
+    legacy "filename" field is ignored. Returns the image's manifest; its
+    `url` is the original and `variants` the resized WebP copies.
+    """
+    images.check_length(request)
+    form = await request.form(max_files=1)
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        raise HTTPException(status_code=400, detail="Missing file")
     try:
-        yield db
+        return await images.store.save(images.iter_upload(upload))
     finally:
-        db.close()
-
-# --- Permission Helper ---
-def can_view_page(page, current_user):
-    """Determine if a given user can view the specified page."""
-    if page.visibility == "public":
-        return True
-    if not current_user:
-        return False
-    if current_user.id == page.created_by:
-        return True
-    # Fix: compare by user.id, not object reference
-    if any(u.id == current_user.id for u in page.allowed_users):
-        return True
-    return False
+        await upload.close()
 
 
-# --- Upload Image ---
-@app.post("/api/upload-image")
-def upload_image(file: UploadFile, filename: str = Form(...)):
-    filepath = os.path.join(IMAGES_DIR, filename)
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return {"url": f"/images/{filename}"}
+@app.put("/api/images")
+async def put_image(request: Request):
+    """Raw-body upload (e.g. Content-Type: image/png), streamed straight to disk."""
+    images.check_length(request)
+    return await images.store.save(request.stream())
+
+
+@app.get("/api/images/{digest}")
+def get_image_manifest(digest: str):
+    manifest = images.store.manifest(digest) if images.HASHED_NAME.match(f"{digest}.json") else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return manifest
 
 
 # --- List Public Pages ---
 @app.get("/api/pages")
-def list_pages(db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(get_optional_user)):
-    if not current_user:
-        return db.query(models.Page).filter(models.Page.visibility == "public").all()
-
-    return db.query(models.Page).filter(
-        or_(
-            models.Page.visibility == "public",
-            models.Page.created_by == current_user.id,
-            models.Page.allowed_users.any(models.User.id == current_user.id)
-        )
-    ).all()
+@querycount.budget(2)
+def list_pages(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    """
+    Pages visible to the caller, newest first. Pass `fields=slug,title` to
+    project columns and `limit`/`cursor` to page through results; the next
+    cursor is returned in the X-Next-Cursor header.
+    """
+    query = db.query(models.Page).filter(acl.visible_clause(current_user))
+
+    rows, next_cursor = pagination.fetch_projected(
+        query, pagination.parse_fields(fields), limit=limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return fast_json.respond(rows, response)
 
 @app.get("/api/pages/summary", response_model=List[schemas.PageSummary])
+@querycount.budget(4)
 def list_pages_summary(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_optional_user)
 ):
@@ -148,54 +177,107 @@ def list_pages_summary(
     - All pages created by the current user (if logged in)
     - All private pages the user is allowed to view (if logged in)
     """
-    # Always include public pages
-    base_query = db.query(models.Page).filter(models.Page.visibility == "public")
-
-    if current_user:
-        # Include own pages
-        own_pages = db.query(models.Page).filter(models.Page.created_by == current_user.id)
-
-        # Include pages where user is allowed
-        allowed_pages = (
-            db.query(models.Page)
-            .join(models.page_view_permissions, models.Page.id == models.page_view_permissions.c.page_id)
-            .filter(models.page_view_permissions.c.user_id == current_user.id)
-        )
-
-        # Combine all three sets
-        base_query = base_query.union(own_pages).union(allowed_pages)
-
-    # Only return minimal fields for performance
-    pages = (
-        base_query.with_entities(models.Page.id, models.Page.slug, models.Page.title)
-        .distinct()
-        .order_by(models.Page.updated_at.desc())
-        .all()
-    )
+    visible = queries.visible_summary(current_user)
+
+    # Validator for the visible set: changes on any edit, share or unshare
+    count, id_sum, version_sum = db.execute(queries.summary_validator(visible)).one()
+    etag = http_cache.make_etag("summary", current_user.id if current_user else None, count, id_sum, version_sum)
+    shared = current_user is None
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag, shared=shared)
+
+    pages = db.execute(queries.summary_rows(visible)).all()
+
+    response.headers.update(http_cache.cache_headers(etag, shared=shared))
+    return fast_json.respond([{"id": p.id, "slug": p.slug, "title": p.title} for p in pages], response)
+
+# --- Link graph ---
+@app.get("/api/pages/titles")
+@querycount.budget(3)
+def get_page_titles(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    """{slug: title} for every visible page: what the link picker and link rendering need."""
+    visible = queries.visible_summary(current_user)
+    count, id_sum, version_sum = db.execute(queries.summary_validator(visible)).one()
+    etag = http_cache.make_etag("titles", current_user.id if current_user else None, count, id_sum, version_sum)
+    shared = current_user is None
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag, shared=shared)
+
+    rows = db.execute(links.title_map(visible)).all()
+    response.headers.update(http_cache.cache_headers(etag, shared=shared))
+    return fast_json.respond({r.slug: r.title for r in rows}, response)
+
+@app.get("/api/pages/{slug}/backlinks")
+@querycount.budget(2)
+def get_backlinks(
+    slug: str,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    rows = db.execute(links.backlinks(slug, current_user)).all()
+    return fast_json.respond([{"slug": r.slug, "title": r.title} for r in rows])
 
-    return [{"id": p.id, "slug": p.slug, "title": p.title} for p in pages]
+@app.get("/api/links/broken")
+@querycount.budget(2)
+def get_broken_links(
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    """Links from visible pages to slugs that have no page, grouped by missing slug."""
+    report = {}
+    for r in db.execute(links.broken_links(current_user).limit(limit)):
+        report.setdefault(r.target_slug, []).append({"slug": r.slug, "title": r.title})
+    return fast_json.respond([{"missing": target, "linked_from": sources} for target, sources in report.items()])
+
+# --- Full-text Search ---
+@app.get("/api/search")
+@querycount.budget(2)
+def search_pages(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    results, next_offset = search.search_pages(db, q, current_user, limit=limit, offset=offset)
+    return fast_json.respond({"query": q, "results": results, "next_offset": next_offset})
 
 @app.get("/api/pages/all")
+@querycount.budget(2)
 def get_all_pages(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    pages = db.query(models.Page).all()
-    return [
-        {
-            "slug": p.slug,
-            "title": p.title,
-            "visibility": p.visibility,
-            "created_by": p.created_by,
-        }
-        for p in pages
-    ]
+    rows, next_cursor = pagination.fetch_projected(
+        db.query(models.Page),
+        pagination.parse_fields(fields, default=["slug", "title", "visibility", "created_by"]),
+        limit=limit,
+        cursor=cursor,
+    )
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return fast_json.respond(rows, response)
 
 
 # --- List Pages by User ---
 @app.get("/api/user-pages/{username}")
+@querycount.budget(3)
 def list_user_pages(
     username: str,
+    response: Response,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_LIMIT),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_optional_user),
 ):
@@ -209,93 +291,201 @@ def list_user_pages(
     if not current_user or current_user.id != user_obj.id:
         query = query.filter(models.Page.visibility == "public")
 
-    return query.order_by(models.Page.title.asc()).all()
+    # Unpaginated callers keep the alphabetical listing
+    paginated = bool(limit or cursor)
+    if not paginated:
+        query = query.order_by(models.Page.title.asc())
 
+    rows, next_cursor = pagination.fetch_projected(
+        query, pagination.parse_fields(fields), limit=limit, cursor=cursor, keyset=paginated
+    )
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return fast_json.respond(rows, response)
+
+
+
+def load_cached_page(db: Session, slug: str):
+    """Return the CachedPage for `slug`, building and caching it on a miss."""
+    cached = page_cache.get(slug)
+    if cached is not None:
+        return cached
+
+    page = db.execute(queries.page_by_slug(slug)).scalar()
+    if not page:
+        return None
+
+    acl_ids = db.execute(queries.page_acl_ids(page.id)).scalars().all()
+
+    cached = build_cached_page(page, acl_ids)
+    page_cache.put(slug, cached)
+    return cached
 
 
 @app.get("/api/pages/{slug}", response_model=schemas.Page)
+@querycount.budget(3)
 def get_page(
     slug: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_optional_user),
 ):
-    page = db.query(models.Page).filter(models.Page.slug == slug).first()
-    if not page:
-        raise HTTPException(status_code=404, detail="Page not found")
+    return respond(request, response, load_cached_page(db, slug), current_user)
 
-    if not can_view_page(page, current_user):
-        raise HTTPException(status_code=403, detail="You are not authorized to view this page")
 
-    creator = db.query(models.User).filter(models.User.id == page.created_by).first()
-    creator_username = creator.username if creator else "Unknown"
+@app.get("/api/cache/stats")
+def get_cache_stats(current_user: models.User = Depends(get_current_user)):
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {"pages": page_cache.stats()}
 
-    # --- Normalize info safely ---
-    info_parsed = None
-    if page.info:
-        try:
-            # handle double-encoded JSON (JSON string inside quotes)
-            if isinstance(page.info, str):
-                info_parsed = json.loads(page.info)
-                if isinstance(info_parsed, str):
-                    info_parsed = json.loads(info_parsed)
-            else:
-                info_parsed = page.info
-        except Exception:
-            info_parsed = page.info  # fallback to raw string if unparsable
-
-    return schemas.Page(
-        id=page.id,
-        title=page.title,
-        slug=page.slug,
-        content=page.content or "",
-        visibility=page.visibility,
-        access_type=page.access_type,
-        main_image=page.main_image,
-        info=info_parsed,
-        created_by=page.created_by,
-        created_by_username=creator_username,
-        updated_at=page.updated_at.isoformat() if page.updated_at else None,
+
+MAX_SHARE_USERS = 100
+MAX_SHARE_PAGES = 50
+
+
+class ShareRequest(BaseModel):
+    usernames: List[str]
+
+
+class AclChange(BaseModel):
+    slugs: List[str]
+    usernames: List[str]
+
+
+def _distinct_names(values, limit, what):
+    names = list(dict.fromkeys(v.strip() for v in values if v.strip()))
+    if len(names) > limit:
+        raise HTTPException(status_code=400, detail=f"At most {limit} {what} per request")
+    return names
+
+
+def _acl_targets(db: Session, slugs, usernames, current_user):
+    """
+    Pages and users named in an ACL change, two IN queries in total.
+    Every page found must belong to the caller; unknown names are returned
+    for the response rather than failing the whole request.
+    """
+    slugs = _distinct_names(slugs, MAX_SHARE_PAGES, "pages")
+    usernames = _distinct_names(usernames, MAX_SHARE_USERS, "users")
+    pages = (
+        db.query(models.Page.id, models.Page.slug, models.Page.title, models.Page.created_by)
+        .filter(models.Page.slug.in_(slugs)).all()
+        if slugs else []
     )
+    if any(p.created_by != current_user.id for p in pages):
+        raise HTTPException(status_code=403, detail="Only the page owner can manage access")
+    users = db.query(User.id, User.username, User.email).filter(User.username.in_(usernames)).all() if usernames else []
+    found_pages, found_users = {p.slug for p in pages}, {u.username for u in users}
+    not_found = {
+        "pages": [s for s in slugs if s not in found_pages],
+        "users": [u for u in usernames if u not in found_users],
+    }
+    return pages, users, not_found
+
+
+def grant_access(db: Session, slugs, usernames, current_user):
+    """
+    Grant every user on every page in one transaction and queue one
+    notification per newly allowed user. Returns (pages, result).
+    """
+    pages, users, not_found = _acl_targets(db, slugs, usernames, current_user)
+    granted = acl.grant_many(db, [(p.id, u.id) for p in pages for u in users])
+
+    new_slugs = {}
+    for p in pages:
+        for u in users:
+            if (p.id, u.id) in granted:
+                new_slugs.setdefault(u.id, []).append(p.slug)
+    for u in users:
+        if u.email and u.id in new_slugs:
+            mailer.pages_shared(db, u.email, current_user.username, new_slugs[u.id])
+    db.commit()
+
+    if granted:
+        for p in pages:
+            page_cache.invalidate(p.slug)
+        mailer.notify()
+    pairs = [(p, u) for p in pages for u in users]
+    return pages, {
+        "granted": [{"slug": p.slug, "username": u.username} for p, u in pairs if (p.id, u.id) in granted],
+        "already_allowed": [{"slug": p.slug, "username": u.username} for p, u in pairs if (p.id, u.id) not in granted],
+        "not_found": not_found,
+    }
+
+
+def revoke_access(db: Session, slugs, usernames, current_user) -> dict:
+    pages, users, not_found = _acl_targets(db, slugs, usernames, current_user)
+    revoked = acl.revoke_many(db, [p.id for p in pages], [u.id for u in users])
+    db.commit()
+    if revoked:
+        for p in pages:
+            page_cache.invalidate(p.slug)
+    return {"revoked": revoked, "not_found": not_found}
 
 
 @app.post("/api/pages/{slug}/allow/{username}")
-async def allow_user_to_view_page(
+def allow_user_to_view_page(
     slug: str,
     username: str,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    page = db.query(models.Page).filter(models.Page.slug == slug).first()
-    if not page:
+    pages, result = grant_access(db, [slug], [username], current_user)
+    if not pages:
         raise HTTPException(status_code=404, detail="Page not found")
+    if result["not_found"]["users"]:
+        raise HTTPException(status_code=404, detail="User not found")
+    if result["already_allowed"]:
+        raise HTTPException(status_code=400, detail="User already allowed")
+    return {"message": f"{username} can now view '{pages[0].title}' and was notified if possible."}
 
-    if page.created_by != current_user.id:
-        raise HTTPException(status_code=403, detail="Only the page owner can manage access")
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@app.post("/api/pages/{slug}/allow")
+def allow_users_to_view_page(
+    slug: str,
+    share: ShareRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Share with several users at once; unknown and already-allowed names are reported, not fatal."""
+    pages, result = grant_access(db, [slug], share.usernames, current_user)
+    if not pages:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return {
+        "title": pages[0].title,
+        "allowed": [g["username"] for g in result["granted"]],
+        "already_allowed": [g["username"] for g in result["already_allowed"]],
+        "not_found": result["not_found"]["users"],
+    }
 
-    if user in page.allowed_users:
-        raise HTTPException(status_code=400, detail="User already allowed")
 
-    page.allowed_users.append(user)
-    db.commit()
+# --- Bulk ACL changes: every username on every slug, in one transaction ---
+@app.post("/api/acl/grant")
+def grant_acl(
+    change: AclChange,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    _, result = grant_access(db, change.slugs, change.usernames, current_user)
+    return result
+
+
+@app.post("/api/acl/revoke")
+def revoke_acl(
+    change: AclChange,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return revoke_access(db, change.slugs, change.usernames, current_user)
 
-    if fm and user.email:
-        subject = f"{current_user.username} shared a private DNDWiki page with you"
-        page_link = f"https://dndwiki.calebdee.io/view/{slug}"
-        message = MessageSchema(
-            subject=subject,
-            recipients=[user.email],  # ✅ no EmailStr() here
-            body=f"Visit your shared page:\n\n{page_link}",
-            subtype="plain"
-        )
-        background_tasks.add_task(fm.send_message, message)
-        logging.info(f"📧 Queued email to {user.email}")
 
-    return {"message": f"{username} can now view '{page.title}' and was notified if possible."}
+@app.get("/api/mail/stats")
+def get_mail_stats(current_user: models.User = Depends(get_current_user)):
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return mailer.dispatcher.stats()
 
 
 # --- Create Page ---
@@ -317,7 +507,12 @@ def create_page(
         created_by=user.id,
     )
     db.add(db_page)
+    db.flush()
+    search.index_page(db, db_page)
+    links.index_page(db, db_page)
+    revisions.record(db, db_page, user.id)
     db.commit()
+    page_cache.invalidate(db_page.slug)
     db.refresh(db_page)
     return db_page
 
@@ -335,10 +530,11 @@ def update_page(
         raise HTTPException(status_code=404, detail="Page not found")
 
     # ✅ Compare user.id to created_by (numeric foreign key)
-    print(f"[DEBUG update_page] user.id={user.id}, user.username={user.username}, db_page.created_by={db_page.created_by}")
+    logger.debug("update_page ownership check", extra={"user_id": user.id, "page_creator": db_page.created_by, "slug": slug})
     if db_page.created_by != user.id and getattr(user, "role", None) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to edit this page")
 
+    before = revisions.snapshot(db_page)
     db_page.title = page.title
     db_page.content = page.content
     db_page.main_image = page.main_image
@@ -348,7 +544,11 @@ def update_page(
     if hasattr(page, "access_type") and page.access_type:
         db_page.access_type = page.access_type
 
+    revisions.record(db, db_page, user.id, before)  # first: its diff runs before the write lock is taken
+    search.index_page(db, db_page)
+    links.index_page(db, db_page)
     db.commit()
+    page_cache.invalidate(db_page.slug)
     db.refresh(db_page)
     return db_page
 
@@ -377,10 +577,61 @@ def update_page_visibility(
 
     page.visibility = update.visibility
     db.commit()
+    page_cache.invalidate(slug)
     db.refresh(page)
     return {"visibility": page.visibility}
 
 
+# --- Page Revisions ---
+def _viewable_page_id(db: Session, slug: str, current_user) -> int:
+    cached = load_cached_page(db, slug)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+    if cached.access(current_user) is None:
+        raise HTTPException(status_code=403, detail="You are not authorized to view this page")
+    return cached.page_id
+
+@app.get("/api/pages/{slug}/revisions")
+@querycount.budget(4)
+def list_page_revisions(
+    slug: str,
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    """
+    Revision metadata, newest first. Pass the returned `next_cursor` as
+    `before` to continue.
+    """
+    page_id = _viewable_page_id(db, slug, current_user)
+    rows = db.execute(revisions.history(page_id, before, limit + 1)).all()
+    next_cursor = rows[limit - 1].number if len(rows) > limit else None
+    return fast_json.respond({"revisions": [r._asdict() for r in rows[:limit]], "next_cursor": next_cursor})
+
+@app.get("/api/pages/{slug}/revisions/{number}")
+@querycount.budget(4)
+def get_page_revision(
+    slug: str,
+    number: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user),
+):
+    page_id = _viewable_page_id(db, slug, current_user)
+    revision = revisions.load(db, page_id, number)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    revision["info"] = models.parse_info(revision["info"])
+    return fast_json.respond(revision)
+
+@app.post("/api/revisions/compact")
+def compact_revisions(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Thin old page history now; `python -m revisions compact` does the same from cron."""
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return revisions.compact_all(db)
+
+
 # --- User Settings ---
 @app.get("/api/user/settings", response_model=schemas.UserSettingsResponse)
 def get_user_settings(
@@ -404,14 +655,28 @@ def get_user_settings(
         db.add(settings)
         db.commit()
         db.refresh(settings)
-        print(f"Created new settings for user {current_user.username}")
+        logger.info("Created default settings", extra={"user_id": current_user.id})
 
     return settings
 
 # List all users (for admins / page owners)
 @app.get("/api/users")
 def list_users(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.User).all()
+    # Only what the sharing picker needs; never password hashes or emails
+    users = db.query(models.User.id, models.User.username, models.User.role).all()
+    return fast_json.respond([{"id": u.id, "username": u.username, "role": u.role} for u in users])
+
+# Typeahead for the sharing picker: a prefix range on the username index
+@app.get("/api/users/search")
+@querycount.budget(2)
+def search_users(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=25),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    rows = db.execute(queries.users_by_prefix(q, limit)).all()
+    return fast_json.respond([{"id": r.id, "username": r.username} for r in rows])
 
 # List allowed users for a page
 @app.get("/api/pages/{slug}/allowed")
@@ -426,11 +691,60 @@ def list_allowed_users(
 
     if not (
         current_user.id == page.created_by
-        or any(u.id == current_user.id for u in page.allowed_users)
+        or acl.is_allowed(db, page.id, current_user.id)
     ):
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    return [{"id": u.id, "username": u.username} for u in page.allowed_users]
+    return [{"id": u.id, "username": u.username} for u in acl.allowed_users(db, page.id)]
+
+# --- Bulk export / import (NDJSON, admins only; see transfer.py) ---
+@app.get("/api/export")
+def export_wiki(
+    include: str = ",".join(transfer.KINDS),
+    current_user: models.User = Depends(get_current_user),
+):
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    kinds = [k for k in include.split(",") if k in transfer.KINDS]
+    return StreamingResponse(
+        transfer.export_stream(SessionLocal, kinds),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="dndwiki-export.ndjson"'},
+    )
+
+@app.post("/api/import")
+async def import_wiki(request: Request, current_user: models.User = Depends(get_current_user)):
+    """
+    Stream an NDJSON export in; records are written in batches as the body
+    arrives. Over IMPORT_MAX_BYTES or IMPORT_MAX_LINE_BYTES the request
+    fails with 413, keeping the batches already committed.
+    """
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > Config.IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Import too large")
+    db = SessionLocal()
+    importer = transfer.Importer(db, current_user.id)
+    splitter = transfer.LineSplitter(Config.IMPORT_MAX_LINE_BYTES)
+    received = 0
+    try:
+        lines = []
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > Config.IMPORT_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Import too large")
+            lines.extend(splitter.feed(chunk))
+            if len(lines) >= transfer.BATCH:
+                await run_in_threadpool(transfer.parse_lines, lines, importer)
+                lines = []
+        lines.extend(splitter.close())
+        await run_in_threadpool(transfer.parse_lines, lines, importer)
+        return await run_in_threadpool(importer.finish)
+    except transfer.LineTooLong as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        await run_in_threadpool(db.close)
 
 # --- Get all journals ---
 @app.get("/api/journals")
@@ -439,106 +753,127 @@ def get_journals(db: Session = Depends(get_db)):
 
 # --- Get one journal with entries ---
 @app.get("/api/journals/{journal_id}")
+@querycount.budget(3)
 def get_journal(
     journal_id: int,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
-    journal = db.query(Journal).filter(Journal.id == journal_id).first()
+    journal = db.get(Journal, journal_id)
     if not journal:
         raise HTTPException(status_code=404, detail="Journal not found")
 
-    q = db.query(JournalEntry, User.username).join(User, User.id == JournalEntry.created_by, isouter=True)
-    q = q.filter(JournalEntry.journal_id == journal_id)
+    # Taken before reading so a socket resuming from here misses nothing
+    seq = broadcast.latest_seq()
 
-    # 👇 Filter out private messages not created by current user
-    if not current_user:
-        q = q.filter(JournalEntry.is_private == False)
-    else:
-        q = q.filter(
+    entries = db.execute(queries.visible_entries(journal_id, current_user).order_by(JournalEntry.order_index)).all()
+    entries_with_user = [queries.entry_dict(e) for e in entries]
+
+    return fast_json.respond({"journal": fast_json.columns(journal), "entries": entries_with_user, "seq": seq})
+
+
+# --- Page through journal entries ---
+@app.get("/api/journals/{journal_id}/entries")
+@querycount.budget(3)
+def list_journal_entries(
+    journal_id: int,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_current_user_optional)
+):
+    """
+    Entries in order, `limit` at a time. Pass the returned `next_cursor`
+    as `after` to continue; `seq` is where a WebSocket should resume from.
+    """
+    if not db.query(Journal.id).filter(Journal.id == journal_id).first():
+        raise HTTPException(status_code=404, detail="Journal not found")
+
+    seq = broadcast.latest_seq()
+
+    q = queries.visible_entries(journal_id, current_user)
+    if after:
+        try:
+            last_index, last_id = (int(part) for part in after.split(":"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        q = q.where(
             or_(
-                JournalEntry.is_private == False,
-                JournalEntry.created_by == current_user.id
+                JournalEntry.order_index > last_index,
+                and_(JournalEntry.order_index == last_index, JournalEntry.id > last_id),
             )
         )
 
-    entries = q.order_by(JournalEntry.order_index).all()
-    entries_with_user = [
-        {
-            "id": e.JournalEntry.id,
-            "content": e.JournalEntry.content,
-            "created_at": e.JournalEntry.created_at,
-            "created_by_username": e.username,
-            "is_private": e.JournalEntry.is_private,
-        }
-        for e in entries
-    ]
-
-    return {"journal": journal, "entries": entries_with_user}
-
+    rows = db.execute(q.order_by(JournalEntry.order_index, JournalEntry.id).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1].JournalEntry
+        next_cursor = f"{last.order_index}:{last.id}"
 
-class EntryCreate(BaseModel):
-    content: str
-    is_private: Optional[bool] = False  # 👈 New field
+    return fast_json.respond({"entries": [queries.entry_dict(r) for r in rows], "next_cursor": next_cursor, "seq": seq})
 
-import asyncio
-import json
-from fastapi import BackgroundTasks
 
 @app.post("/api/journals/{journal_id}/entries")
+@querycount.budget(4)
 def add_entry(
     journal_id: int,
-    entry: EntryCreate,
+    entry: JournalEntryCreate,
     db: Session = Depends(get_db),
-    background_tasks: BackgroundTasks = None,
     current_user: models.User = Depends(get_current_user),
 ):
-    count = db.query(JournalEntry).filter(JournalEntry.journal_id == journal_id).count()
+    order_index = journal_order.allocate_entry_index(db, journal_id)
+    if order_index is None:
+        raise HTTPException(status_code=404, detail="Journal not found")
 
     new_entry = JournalEntry(
         journal_id=journal_id,
         content=entry.content,
-        order_index=count,
+        order_index=order_index,
         created_by=current_user.id,
         is_private=bool(entry.is_private),
     )
     db.add(new_entry)
-    db.commit()
-    db.refresh(new_entry)
+    db.flush()  # INSERT ... RETURNING fills in id and created_at
 
-    creator = db.query(models.User).filter(models.User.id == new_entry.created_by).first()
-    entry_data = {
-        "id": new_entry.id,
-        "content": new_entry.content,
-        "created_at": new_entry.created_at.isoformat() + "Z",
-        "created_by_username": creator.username if creator else "Unknown",
-        "is_private": new_entry.is_private,
-    }
+    entry_data = queries.new_entry_dict(new_entry, current_user.username)
+    db.commit()
 
     # ---- Broadcast only if public ----
-    if not new_entry.is_private and journal_id in active_connections:
-        payload = json.dumps({"event": "new_entry", "data": entry_data})
+    if not entry_data["is_private"]:
+        broadcast.publish(journal_id, "new_entry", entry_data)
+    else:
+        logger.debug("Broadcast skipped for private entry", extra={"journal_id": journal_id})
 
-        async def send_to_all():
-            print(f"[Broadcast] Journal {journal_id}: sending to {len(active_connections[journal_id])} clients")
-            for ws in list(active_connections[journal_id]):
-                try:
-                    await ws.send_text(payload)
-                except Exception as e:
-                    print(f"[Broadcast error] {e}")
+    return entry_data
 
-        try:
-            asyncio.create_task(send_to_all())
-        except RuntimeError:
-            # If we're in a threadpool (no event loop), use background_tasks
-            if background_tasks:
-                background_tasks.add_task(asyncio.run, send_to_all())
 
-    else:
-        print(f"[Broadcast skipped] Private={new_entry.is_private}")
+class EntryOrder(BaseModel):
+    entry_ids: List[int]
 
-    return entry_data
+@app.put("/api/journals/{journal_id}/order")
+def reorder_journal_entries(
+    journal_id: int,
+    order: EntryOrder,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    journal = db.query(Journal.id, Journal.created_by).filter(Journal.id == journal_id).first()
+    if not journal:
+        raise HTTPException(status_code=404, detail="Journal not found")
+
+    # The journal's owner and admins may reorder anything; others only their own entries
+    may_reorder_all = journal.created_by == current_user.id or getattr(current_user, "role", None) == "admin"
+    new_index, private_ids = journal_order.reorder_entries(
+        db, journal_id, order.entry_ids, author_id=None if may_reorder_all else current_user.id
+    )
+    db.commit()
 
+    # Sockets are anonymous, so they only ever hear about public entries
+    public_ids = [i for i in order.entry_ids if i not in private_ids]
+    if public_ids:
+        broadcast.publish(journal_id, "reorder_entries", {"entry_ids": public_ids})
+    return {"order": [{"id": i, "order_index": idx} for i, idx in new_index.items()]}
 
 
 # --- Update entry ---
@@ -546,29 +881,36 @@ class EntryUpdate(BaseModel):
     content: str
 
 @app.put("/api/journal-entries/{entry_id}")
+@querycount.budget(3)
 def update_entry(
     entry_id: int,
     entry: EntryUpdate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    db_entry = db.query(JournalEntry).filter(JournalEntry.id == entry_id).first()
+    db_entry = (
+        db.query(JournalEntry)
+        .options(joinedload(JournalEntry.user).load_only(User.username))
+        .filter(JournalEntry.id == entry_id)
+        .first()
+    )
     if not db_entry:
         raise HTTPException(status_code=404, detail="Entry not found")
 
     db_entry.content = entry.content
-    db.commit()
-    db.refresh(db_entry)
-
-    creator = db.query(models.User).filter(models.User.id == db_entry.created_by).first()
-    username = creator.username if creator else "Unknown"
-
-    return {
+    journal_id, is_private = db_entry.journal_id, db_entry.is_private
+    entry_data = {
         "id": db_entry.id,
         "content": db_entry.content,
         "created_at": db_entry.created_at,
-        "created_by_username": username
+        "created_by_username": db_entry.user.username if db_entry.user else "Unknown"
     }
+    db.commit()
+
+    if not is_private:
+        broadcast.publish(journal_id, "update_entry", entry_data)
+
+    return entry_data
 
 @app.get("/api/journals")
 def get_all_journals(db: Session = Depends(get_db)):
@@ -587,6 +929,7 @@ def create_journal(journal: JournalCreate, db: Session = Depends(get_db)):
     return {"id": new_journal.id, "title": new_journal.title}
 
 @app.delete("/api/journal-entries/{entry_id}")
+@querycount.budget(3)
 def delete_entry(
     entry_id: int,
     db: Session = Depends(get_db),
@@ -600,17 +943,12 @@ def delete_entry(
     if db_entry.created_by != current_user.id and getattr(current_user, "role", None) != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to delete this entry")
 
+    journal_id = db_entry.journal_id
     db.delete(db_entry)
     db.commit()
 
     # --- Broadcast deletion over WebSocket ---
-    if db_entry.journal_id in active_connections:
-        payload = json.dumps({"event": "delete_entry", "data": {"id": entry_id}})
-        for ws in active_connections[db_entry.journal_id]:
-            try:
-                asyncio.create_task(ws.send_text(payload))
-            except Exception:
-                pass
+    broadcast.publish(journal_id, "delete_entry", {"id": entry_id})
 
     return {"message": "Entry deleted successfully"}
 
@@ -628,4 +966,15 @@ def update_entry_privacy(entry_id: int, db: Session = Depends(get_db), current_u
     return entry
 
 
+# --- Async hot paths ---
+if Config.DB_ASYNC:
+    import async_api
 
+    # Swap each sync route for its async twin (same path and method), keeping the
+    # others' registration order so /api/pages/all still wins over /api/pages/{slug}
+    replaced = {("/api" + r.path, m) for r in async_api.router.routes for m in r.methods}
+    app.router.routes = [
+        r for r in app.router.routes
+        if not (isinstance(r, APIRoute) and any((r.path, m) in replaced for m in r.methods))
+    ]
+    app.include_router(async_api.router, prefix="/api")
@@ -0,0 +1,255 @@
+"""
+Request metrics in the Prometheus text format, served at /metrics.
+
+A pure-ASGI middleware times every HTTP request into per-route latency
+histograms (labelled by route template, never the raw path) and, through
+engine events, counts the SQL statements each request runs and the time
+they take. WebSocket connections per journal and the page / token cache
+hit counters are read at scrape time, so they cost nothing per request.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import auth
+import broadcast
+from config import Config
+from page_cache import page_cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32, 64)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (float(bound),))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+def _samples(name, kind, help_text, label_names, samples):
+    yield f"# HELP {name} {help_text}"
+    yield f"# TYPE {name} {kind}"
+    for labels, value in samples:
+        yield f"{name}{_labels(label_names, labels)} {_number(value)}"
+
+
+REQUEST_LATENCY = Histogram(
+    "dndwiki_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"), LATENCY_BUCKETS
+)
+REQUESTS = Counter("dndwiki_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_QUERIES = Histogram(
+    "dndwiki_http_request_db_queries", "SQL statements run per HTTP request.", ("method", "route"), QUERY_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    "dndwiki_http_request_db_seconds", "Time spent in SQL per HTTP request.", ("method", "route"), LATENCY_BUCKETS
+)
+DB_QUERIES = Counter("dndwiki_db_queries_total", "SQL statements executed, in or out of requests.", ())
+DB_TIME = Counter("dndwiki_db_query_seconds_total", "Time spent executing SQL statements.", ())
+
+
+# --- DB instrumentation ---
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    DB_QUERIES.inc(())
+    DB_TIME.inc((), elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engines():
+    if not event.contains(Engine, "before_cursor_execute", _before_execute):
+        event.listen(Engine, "before_cursor_execute", _before_execute)
+        event.listen(Engine, "after_cursor_execute", _after_execute)
+
+
+# --- Middleware ---
+class MetricsMiddleware:
+    """Pure ASGI, so the per-request stats reach threadpool endpoints too."""
+
+    def __init__(self, app, slow_request_ms: float = 0):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        root_path = scope.get("root_path", "")
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            labels = (scope["method"], route_label(scope, root_path))
+            REQUEST_LATENCY.observe(labels, elapsed)
+            REQUEST_QUERIES.observe(labels, stats.queries)
+            REQUEST_DB_TIME.observe(labels, stats.db_seconds)
+            REQUESTS.inc(labels + (str(status),))
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                logger.warning(
+                    "Slow request",
+                    extra={
+                        "method": labels[0], "route": labels[1], "status": status,
+                        "duration_ms": round(elapsed * 1000, 1), "queries": stats.queries,
+                        "db_ms": round(stats.db_seconds * 1000, 1),
+                    },
+                )
+
+
+def route_label(scope, root_path="") -> str:
+    """The matched route's template (or mount prefix); never the raw path."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if scope.get("root_path", "") != root_path:
+        return scope["root_path"]  # a Mount, e.g. /images
+    return "unmatched"
+
+
+# --- Exposition ---
+def render() -> str:
+    lines = []
+    for metric in (REQUEST_LATENCY, REQUESTS, REQUEST_QUERIES, REQUEST_DB_TIME, DB_QUERIES, DB_TIME):
+        lines.extend(metric.render())
+
+    sockets = [((journal_id,), len(clients)) for journal_id, clients in sorted(broadcast.hub.connections.items())]
+    lines.extend(_samples(
+        "dndwiki_websocket_connections", "gauge", "Open journal WebSockets on this worker.", ("journal_id",), sockets
+    ))
+
+    caches = {"page": page_cache.stats(), "token": auth.token_cache.stats()}
+    for name, kind, help_text, key in (
+        ("dndwiki_cache_hits_total", "counter", "Cache hits.", "hits"),
+        ("dndwiki_cache_misses_total", "counter", "Cache misses.", "misses"),
+        ("dndwiki_cache_entries", "gauge", "Entries currently cached.", "entries"),
+    ):
+        lines.extend(_samples(name, kind, help_text, ("cache",), [((c,), s[key]) for c, s in caches.items()]))
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if Config.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {Config.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Metrics token required")
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+
+
+def install(app):
+    if not Config.METRICS_ENABLED:
+        return
+    instrument_engines()
+    app.add_middleware(MetricsMiddleware, slow_request_ms=Config.LOG_SLOW_REQUEST_MS)
+    app.include_router(router)
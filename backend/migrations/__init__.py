@@ -0,0 +1,111 @@
+"""
+Versioned schema migrations.
+
+Each `vNNNN_<name>.py` module in this package defines `upgrade(conn)`,
+which runs inside its own transaction. `upgrade(engine)` applies, in
+order, every version newer than the one recorded in `schema_version`.
+Scripts use IF NOT EXISTS / column checks so that a database created
+before this table existed is safe to upgrade. Scripts describe their DDL
+explicitly rather than reading the live models, so fresh and upgraded
+databases don't drift apart.
+
+Two workers starting at once are serialized: on SQLite each version runs
+under BEGIN IMMEDIATE, and a worker that finds the database locked waits
+and retries, then skips versions the other one recorded meanwhile.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_version"
+_SCRIPT = re.compile(r"^v(\d{4})_\w+$")
+LOCK_WAIT_SECONDS = 300  # how long a worker waits for another's migration to finish
+
+
+def scripts():
+    """[(version, module), ...] for every migration script, oldest first."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _SCRIPT.match(info.name)
+        if match:
+            found.append((int(match.group(1)), importlib.import_module(f"{__name__}.{info.name}")))
+    return sorted(found, key=lambda s: s[0])
+
+
+def _is_locked(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "locked" in message or "busy" in message
+
+
+def _write_transaction(engine, work):
+    """
+    Run `work(conn)` in a transaction that holds the write lock from its
+    first statement, retrying while another worker holds it.
+    """
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while True:
+        try:
+            with engine.begin() as conn:
+                if conn.dialect.name == "sqlite":
+                    # Lock before reading schema_version; a deferred transaction could
+                    # read, then fail to upgrade to a writer (SQLITE_BUSY_SNAPSHOT)
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                return work(conn)
+        except OperationalError as e:
+            if not _is_locked(e) or time.monotonic() > deadline:
+                raise
+            logger.info("Schema is locked by another worker, waiting")
+            time.sleep(0.2)
+
+
+def _ensure_version_table(engine):
+    def create(conn):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+
+    _write_transaction(engine, create)
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE}"))}
+
+
+def current_version(engine) -> int:
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return max(applied_versions(conn), default=0)
+
+
+def upgrade(engine):
+    """Apply every pending migration; returns the versions applied."""
+    _ensure_version_table(engine)
+    applied = []
+    for version, module in scripts():
+        def apply(conn):
+            if version in applied_versions(conn):
+                return False
+            logger.info("Applying migration %04d (%s)", version, module.__name__)
+            module.upgrade(conn)
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, name) VALUES (:v, :n)"),
+                {"v": version, "n": module.__name__.rsplit(".", 1)[-1]},
+            )
+            return True
+
+        try:
+            if _write_transaction(engine, apply):
+                applied.append(version)
+        except IntegrityError:
+            # Another worker recorded it first (servers without the up-front lock)
+            continue
+    return applied
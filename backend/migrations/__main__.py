@@ -0,0 +1,9 @@
+"""`python -m migrations`: apply pending migrations and print the schema version."""
+from database import engine
+
+from . import current_version, upgrade
+
+if __name__ == "__main__":
+    applied = upgrade(engine)
+    print(f"Applied: {', '.join(f'{v:04d}' for v in applied) or 'nothing'}")
+    print(f"Schema version: {current_version(engine):04d}")
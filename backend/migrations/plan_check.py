@@ -0,0 +1,85 @@
+"""
+EXPLAIN QUERY PLAN regression check for the hot read paths (SQLite).
+
+    python -m migrations.plan_check
+
+Builds the same statements the endpoints run, asks SQLite for their
+plans against the migrated schema, and exits non-zero if any of them
+falls back to a full table scan (or to a sort the index should avoid).
+tests/test_migrations.py runs the same checks under pytest.
+"""
+import sys
+from types import SimpleNamespace
+
+from sqlalchemy import select, text
+
+import links
+import queries
+import revisions
+from database import engine
+from models import JournalEntry, Page, User
+
+from . import upgrade
+
+USER = SimpleNamespace(id=1)
+
+# (name, statement, tables that must not be scanned, whether an ORDER BY sort is acceptable)
+CHECKS = [
+    ("summary (anonymous)", lambda: queries.summary_rows(queries.visible_summary(None)), {"pages"}, True),
+    ("summary (signed in)", lambda: queries.summary_rows(queries.visible_summary(USER)),
+     {"pages", "page_view_permissions"}, True),
+    ("user pages (public)", lambda: select(Page.id, Page.slug, Page.title)
+     .where(Page.created_by == 1, Page.visibility == "public")
+     .order_by(Page.updated_at.desc()), {"pages"}, False),
+    ("user pages (own)", lambda: select(Page.id, Page.slug, Page.title)
+     .where(Page.created_by == 1).order_by(Page.title), {"pages"}, True),
+    ("page acl", lambda: queries.page_acl_ids(1), {"page_view_permissions"}, True),
+    ("user by name", lambda: select(User).where(User.username == "alice"), {"users"}, True),
+    ("backlinks", lambda: links.backlinks("tavern", USER), {"page_links"}, True),
+    ("user search", lambda: queries.users_by_prefix("al", 10), {"users"}, False),
+    ("page revisions", lambda: revisions.history(1, before=40), {"page_revisions"}, False),
+    ("journal (anonymous)", lambda: queries.visible_entries(1, None).order_by(JournalEntry.order_index),
+     {"journal_entries"}, False),
+    ("journal (signed in)", lambda: queries.visible_entries(1, USER).order_by(JournalEntry.order_index),
+     {"journal_entries"}, False),
+]
+
+
+def plan(conn, stmt):
+    sql = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def problems(steps, tables, sort_ok):
+    found = []
+    for step in steps:
+        words = step.split()
+        # "SCAN pages" is a table scan; "SCAN pages USING INDEX ..." walks an index
+        if words[:1] == ["SCAN"] and len(words) == 2 and words[1] in tables:
+            found.append(step)
+        if not sort_ok and step.startswith("USE TEMP B-TREE FOR ORDER BY"):
+            found.append(step)
+    return found
+
+
+def check(bind=engine):
+    """[(name, offending steps, full plan), ...] for every failing check."""
+    failures = []
+    with bind.connect() as conn:
+        for name, build, tables, sort_ok in CHECKS:
+            steps = plan(conn, build())
+            bad = problems(steps, tables, sort_ok)
+            if bad:
+                failures.append((name, bad, steps))
+    return failures
+
+
+if __name__ == "__main__":
+    if engine.dialect.name != "sqlite":
+        sys.exit("plan_check only understands SQLite plans")
+    upgrade(engine)
+    failures = check()
+    for name, bad, steps in failures:
+        print(f"FAIL {name}: {bad}\n    plan: {steps}")
+    print(f"{len(CHECKS) - len(failures)}/{len(CHECKS)} query plans use indexes")
+    sys.exit(1 if failures else 0)
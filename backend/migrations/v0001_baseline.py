@@ -0,0 +1,76 @@
+"""
+The schema as it stood before versioned migrations, frozen here so a
+fresh database is built the same way as one upgraded from then on.
+Later columns and indexes come from their own versions, never from the
+live models. A no-op on databases that already have these tables.
+"""
+from sqlalchemy import (
+    JSON, TIMESTAMP, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, func,
+)
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True),
+    Column("password_hash", String),
+    Column("role", String),
+    Column("created_at", TIMESTAMP, server_default=func.now()),
+    Column("email", String, unique=True, nullable=False),
+)
+
+Table(
+    "journals", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, nullable=False),
+    Column("created_by", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+Table(
+    "pages", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, nullable=False),
+    Column("slug", String, unique=True, index=True),
+    Column("content", Text, nullable=False),
+    Column("visibility", String),
+    Column("access_type", String),
+    Column("main_image", String),
+    Column("info", JSON),
+    Column("created_by", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "user_settings", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), unique=True, nullable=False),
+    Column("theme", String),
+    Column("default_visibility", String),
+    Column("default_edit", String),
+    Column("display_name", String),
+)
+
+Table(
+    "journal_entries", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("journal_id", Integer, ForeignKey("journals.id"), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("order_index", Integer),
+    Column("created_by", Integer, ForeignKey("users.id"), nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True)),
+    Column("is_private", Boolean),
+)
+
+Table(
+    "page_view_permissions", metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("page_id", Integer, ForeignKey("pages.id"), primary_key=True),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(bind=conn, checkfirst=True)
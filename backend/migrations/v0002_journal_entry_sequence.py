@@ -0,0 +1,13 @@
+"""journals.next_entry_index, seeded from existing entries."""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("journals")}
+    if "next_entry_index" in columns:
+        return
+    conn.execute(text("ALTER TABLE journals ADD COLUMN next_entry_index INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "UPDATE journals SET next_entry_index = COALESCE("
+        "(SELECT MAX(order_index) + 1 FROM journal_entries WHERE journal_id = journals.id), 0)"
+    ))
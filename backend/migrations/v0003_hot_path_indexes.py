@@ -0,0 +1,26 @@
+"""
+Indexes for the hot read paths:
+- list_pages_summary: public pages, own pages (by updated_at)
+- list_user_pages: one author's pages, optionally public only
+- list_pages keyset: updated_at, id
+- get_page ACL lookup: permissions by page
+- get_journal: a journal's entries in order; entries by author
+"""
+from sqlalchemy import text
+
+INDEXES = {
+    "ix_pages_visibility_updated_at": "pages (visibility, updated_at)",
+    "ix_pages_created_by_visibility_updated_at": "pages (created_by, visibility, updated_at)",
+    "ix_pages_updated_at_id": "pages (updated_at, id)",
+    "ix_page_view_permissions_page_id": "page_view_permissions (page_id)",
+    "ix_journal_entries_journal_order": "journal_entries (journal_id, order_index, id)",
+    "ix_journal_entries_created_by": "journal_entries (created_by)",
+}
+
+
+def upgrade(conn):
+    for name, columns in INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}"))
+    if conn.dialect.name == "sqlite":
+        # Give the planner statistics for the new indexes
+        conn.execute(text("ANALYZE"))
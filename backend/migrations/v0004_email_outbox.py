@@ -0,0 +1,23 @@
+"""email_outbox, the durable queue behind mailer.Dispatcher."""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text, func
+
+metadata = MetaData()
+
+email_outbox = Table(
+    "email_outbox", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("recipient", String, nullable=False),
+    Column("subject", String, nullable=False),
+    Column("body", Text, nullable=False),
+    Column("status", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("next_attempt_at", DateTime, nullable=False),
+    Column("last_error", Text),
+    Column("created_at", DateTime, default=func.now()),
+    Column("sent_at", DateTime),
+    Index("ix_email_outbox_due", "status", "next_attempt_at"),
+)
+
+
+def upgrade(conn):
+    email_outbox.create(bind=conn, checkfirst=True)
@@ -0,0 +1,77 @@
+"""
+page_links, backfilled from every existing page's content and info.
+
+The link extraction below is a frozen copy of links.extract as of this
+migration, so the backfill keeps its meaning when links.py changes.
+"""
+import json
+import re
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, Text, insert, select
+
+BATCH = 500
+HREF = re.compile(r"""<a\s[^>]*?\bhref\s*=\s*["']/([A-Za-z0-9_-]+)/?["']""", re.IGNORECASE)
+RESERVED = {"new-page", "search", "login", "settings"}
+
+metadata = MetaData()
+pages = Table(
+    "pages", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("slug", String),
+    Column("content", Text),
+    Column("info", Text),  # JSON, read raw
+)
+
+page_links = Table(
+    "page_links", metadata,
+    Column("source_id", Integer, ForeignKey("pages.id", ondelete="CASCADE"), primary_key=True),
+    Column("target_slug", String, primary_key=True),
+    Index("ix_page_links_target_slug", "target_slug"),
+)
+
+
+def _info(raw):
+    """Sidebar info as the app reads it: the JSON column, then models.parse_info."""
+    info = json.loads(raw) if raw else None
+    if not info:
+        return None
+    try:
+        if isinstance(info, str):  # double-encoded JSON
+            parsed = json.loads(info)
+            if isinstance(parsed, str):
+                parsed = json.loads(parsed)
+            return parsed
+        return info
+    except Exception:
+        return info
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _strings(v)
+
+
+def _outgoing(page):
+    slugs = set()
+    for text in _strings([page.content or "", _info(page.info)]):
+        if "href" in text:
+            slugs.update(m.group(1).lower() for m in HREF.finditer(text))
+    return slugs - RESERVED - {page.slug}
+
+
+def upgrade(conn):
+    page_links.create(bind=conn, checkfirst=True)
+    rows = []
+    for page in conn.execution_options(yield_per=BATCH).execute(select(pages.c.id, pages.c.slug, pages.c.content, pages.c.info)):
+        rows.extend({"source_id": page.id, "target_slug": slug} for slug in sorted(_outgoing(page)))
+        if len(rows) >= BATCH:
+            conn.execute(insert(page_links), rows)
+            rows = []
+    if rows:
+        conn.execute(insert(page_links), rows)
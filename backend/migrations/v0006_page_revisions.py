@@ -0,0 +1,27 @@
+"""page_revisions, the delta-compressed page history (see revisions.py)."""
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table
+
+metadata = MetaData()
+# Only for the foreign keys
+Table("pages", metadata, Column("id", Integer, primary_key=True))
+Table("users", metadata, Column("id", Integer, primary_key=True))
+
+page_revisions = Table(
+    "page_revisions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("page_id", Integer, ForeignKey("pages.id", ondelete="CASCADE"), nullable=False),
+    Column("number", Integer, nullable=False),
+    Column("title", String, nullable=False),
+    Column("keyframe", Boolean, nullable=False),
+    Column("chain", Integer, nullable=False),
+    Column("data", LargeBinary, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("created_by", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime),
+    Index("ux_page_revisions_page_number", "page_id", "number", unique=True),
+)
+
+
+def upgrade(conn):
+    # No backfill: a page's state before this version is recorded on its first edit
+    page_revisions.create(bind=conn, checkfirst=True)
@@ -0,0 +1,8 @@
+"""pages.version, the edit counter behind page and listing ETags."""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    columns = {c["name"] for c in inspect(conn).get_columns("pages")}
+    if "version" not in columns:
+        conn.execute(text("ALTER TABLE pages ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
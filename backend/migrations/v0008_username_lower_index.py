@@ -0,0 +1,6 @@
+"""Expression index for the case-insensitive username typeahead."""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username))"))
@@ -0,0 +1,77 @@
+"""
+pages_fts, the SQLite FTS5 index behind search.py, backfilled from pages.
+
+Before this migration search.py created the table itself at startup, so
+an existing index is kept unless its row count disagrees with pages.
+The text preparation is a frozen copy of search.strip_html/flatten_info.
+"""
+import html
+import json
+import re
+
+from sqlalchemy import text
+
+BATCH = 500
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _strip_html(value):
+    return html.unescape(_TAG_RE.sub(" ", value)) if value else ""
+
+
+def _info(raw):
+    """Sidebar info as the app reads it: the JSON column, then models.parse_info."""
+    info = json.loads(raw) if raw else None
+    if not info:
+        return None
+    try:
+        if isinstance(info, str):  # double-encoded JSON
+            parsed = json.loads(info)
+            if isinstance(parsed, str):
+                parsed = json.loads(parsed)
+            return parsed
+        return info
+    except Exception:
+        return info
+
+
+def _flatten_info(raw):
+    value = _info(raw)
+    if isinstance(value, dict):
+        return " ".join(f"{k} {_strip_html(str(v))}" for k, v in value.items())
+    if isinstance(value, list):
+        return " ".join(_strip_html(str(v)) for v in value)
+    return _strip_html(str(value)) if value else ""
+
+
+def upgrade(conn):
+    if conn.dialect.name != "sqlite":
+        return  # search falls back to substring matching elsewhere
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5("
+        "slug, title, info, content, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    indexed = conn.execute(text("SELECT count(*) FROM pages_fts")).scalar()
+    total = conn.execute(text("SELECT count(*) FROM pages")).scalar()
+    if indexed == total:
+        return
+    conn.execute(text("DELETE FROM pages_fts"))
+    insert = text(
+        "INSERT INTO pages_fts (rowid, slug, title, info, content) VALUES (:id, :slug, :title, :info, :content)"
+    )
+    rows = []
+    pages = conn.execution_options(yield_per=BATCH).execute(text("SELECT id, slug, title, info, content FROM pages"))
+    for page in pages:
+        rows.append({
+            "id": page.id,
+            "slug": page.slug or "",
+            "title": page.title or "",
+            "info": _flatten_info(page.info),
+            "content": _strip_html(page.content),
+        })
+        if len(rows) >= BATCH:
+            conn.execute(insert, rows)
+            rows = []
+    if rows:
+        conn.execute(insert, rows)
@@ -9,10 +9,14 @@ from sqlalchemy import (
     JSON,
     DateTime,
     Table,
+    literal_column,
+    Index,
+    LargeBinary,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
+import json
 
 
 # --- Association Table for Private Page Whitelist ---
@@ -21,6 +25,21 @@ page_view_permissions = Table(
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
     Column("page_id", Integer, ForeignKey("pages.id"), primary_key=True),
+    # "Which pages may this user see?" is served by the primary key, which
+    # leads with user_id; "who may see this page?" needs its own index
+    Index("ix_page_view_permissions_page_id", "page_id"),
+)
+
+
+# --- Wiki Link Graph (see links.py) ---
+page_links = Table(
+    "page_links",
+    Base.metadata,
+    Column("source_id", Integer, ForeignKey("pages.id", ondelete="CASCADE"), primary_key=True),
+    # A slug rather than a page id, so links to pages not created yet are kept
+    Column("target_slug", String, primary_key=True),
+    # Backlinks and the broken-link report look up by target
+    Index("ix_page_links_target_slug", "target_slug"),
 )
 
 
@@ -35,6 +54,9 @@ class User(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     email = Column(String, unique=True, nullable=False, default="")
 
+    # Case-insensitive username typeahead (queries.users_by_prefix)
+    __table_args__ = (Index("ix_users_username_lower", func.lower(username)),)
+
     # Relationships
     settings = relationship("UserSettings", back_populates="user", uselist=False)
 
@@ -61,14 +83,60 @@ class Page(Base):
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    # Bumped by every UPDATE; ETags use it since updated_at only has one-second resolution
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1)
+
+    # Hot-path indexes; see migrations/v0003_hot_path_indexes.py
+    __table_args__ = (
+        Index("ix_pages_visibility_updated_at", "visibility", "updated_at"),
+        Index("ix_pages_created_by_visibility_updated_at", "created_by", "visibility", "updated_at"),
+        Index("ix_pages_updated_at_id", "updated_at", "id"),
+    )
 
     # --- Relationships ---
+    creator = relationship("User", foreign_keys=[created_by], viewonly=True)
     allowed_users = relationship(
         "User",
         secondary="page_view_permissions",
         back_populates="permitted_pages",
     )
 
+
+# --- Page history, stored as keyframes plus deltas (see revisions.py) ---
+class PageRevision(Base):
+    __tablename__ = "page_revisions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    page_id = Column(Integer, ForeignKey("pages.id", ondelete="CASCADE"), nullable=False)
+    number = Column(Integer, nullable=False)  # 1, 2, ... per page; compaction leaves gaps
+    title = Column(String, nullable=False)
+    keyframe = Column(Boolean, nullable=False, default=False)
+    chain = Column(Integer, nullable=False, default=0)  # deltas since the last keyframe
+    data = Column(LargeBinary, nullable=False)  # zlib-compressed JSON
+    size = Column(Integer, nullable=False, default=0)  # uncompressed content length
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ux_page_revisions_page_number", "page_id", "number", unique=True),
+    )
+
+
+def parse_info(info):
+    """Normalize a page's sidebar info, which may be stored double-encoded."""
+    if not info:
+        return None
+    try:
+        # handle double-encoded JSON (JSON string inside quotes)
+        if isinstance(info, str):
+            parsed = json.loads(info)
+            if isinstance(parsed, str):
+                parsed = json.loads(parsed)
+            return parsed
+        return info
+    except Exception:
+        return info  # fallback to raw string if unparsable
+
 # --- User Settings Model ---
 class UserSettings(Base):
     __tablename__ = "user_settings"
@@ -90,6 +158,7 @@ class Journal(Base):
     title = Column(String, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    next_entry_index = Column(Integer, nullable=False, default=0, server_default="0")  # order_index sequence
 
     entries = relationship("JournalEntry", back_populates="journal", cascade="all, delete-orphan")
 
@@ -106,6 +175,32 @@ class JournalEntry(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     is_private = Column(Boolean, default=False)
 
+    __table_args__ = (
+        Index("ix_journal_entries_journal_order", "journal_id", "order_index", "id"),
+        Index("ix_journal_entries_created_by", "created_by"),
+    )
+    # Fetch created_at with the INSERT (RETURNING) instead of a refresh afterwards
+    __mapper_args__ = {"eager_defaults": True}
+
     journal = relationship("Journal", back_populates="entries")
     user = relationship("User")
 
+
+# --- Outgoing email, sent by mailer.Dispatcher ---
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)  # due time; a lease while "sending"
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_due", "status", "next_attempt_at"),
+    )
@@ -0,0 +1,195 @@
+"""In-process cache of rendered pages, bounded by entry count, bytes and TTL."""
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, Response
+
+import http_cache
+import images
+import models
+import schemas
+from config import Config
+
+
+class CachedPage:
+    """A fully built page payload plus what's needed to authorize it."""
+
+    __slots__ = (
+        "payload", "page_id", "visibility", "created_by", "updated_at", "version", "acl", "variants_pending",
+        "size", "expires_at",
+    )
+
+    def __init__(self, payload, page_id, visibility, created_by, updated_at, version, acl, variants_pending=False):
+        self.payload = payload
+        self.page_id = page_id
+        self.visibility = visibility
+        self.created_by = created_by
+        self.updated_at = updated_at
+        self.version = version
+        self.acl = frozenset(acl)  # ids of users the page is shared with
+        # main_image_srcset appears when rendering finishes, without updated_at changing
+        self.variants_pending = variants_pending
+        self.size = (
+            len(payload.content or "")
+            + len(str(payload.info or ""))
+            + len(payload.title or "")
+            + 8 * len(self.acl)
+        )
+        self.expires_at = None
+
+    def outdated(self):
+        """True once the main image's variants are ready, which the payload doesn't show yet."""
+        return self.variants_pending and not images.store.variants_pending(self.payload.main_image)
+
+    def access(self, current_user):
+        """
+        Classify how `current_user` may view this page ("public", "owner"
+        or "shared"), or None if they may not.
+        """
+        if self.visibility == "public":
+            return "public"
+        if not current_user:
+            return None
+        if current_user.id == self.created_by:
+            return "owner"
+        if current_user.id in self.acl:
+            return "shared"
+        return None
+
+
+def build_cached_page(page, acl):
+    """`page` must have `creator` loaded (see queries.page_by_slug)."""
+    payload = schemas.Page(
+        id=page.id,
+        title=page.title,
+        slug=page.slug,
+        content=page.content or "",
+        visibility=page.visibility,
+        access_type=page.access_type,
+        main_image=page.main_image,
+        main_image_srcset=images.store.srcset(page.main_image),
+        info=models.parse_info(page.info),
+        created_by=page.created_by,
+        created_by_username=page.creator.username if page.creator else "Unknown",
+        updated_at=page.updated_at.isoformat() if page.updated_at else None,
+    )
+    return CachedPage(
+        payload, page.id, page.visibility, page.created_by, page.updated_at, page.version, acl,
+        variants_pending=images.store.variants_pending(page.main_image),
+    )
+
+
+def respond(request: Request, response: Response, cached, current_user):
+    """Authorize a cached page and answer with its payload or a 304."""
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    access = cached.access(current_user)
+    if access is None:
+        raise HTTPException(status_code=403, detail="You are not authorized to view this page")
+
+    etag = http_cache.make_etag(cached.page_id, cached.version, access, cached.payload.main_image_srcset)
+    # updated_at alone can't tell the versions before and after the variants apart
+    last_modified = None if cached.variants_pending else cached.updated_at
+    shared = access == "public" and current_user is None
+    if http_cache.is_not_modified(request, etag, last_modified):
+        return http_cache.not_modified(etag, last_modified, shared)
+
+    response.headers.update(http_cache.cache_headers(etag, last_modified, shared))
+    return cached.payload
+
+
+class PageCache:
+    """
+    LRU keyed by slug. Entries are dropped on write (see the page
+    endpoints) and once their main image's variants are ready; the TTL
+    bounds staleness across worker processes, which don't see each
+    other's invalidations.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, slug):
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(slug)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if entry.outdated():
+                self._remove(slug)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(slug)
+            self.hits += 1
+            return entry
+
+    def put(self, slug, entry):
+        if self.max_entries <= 0 or entry.size > self.max_bytes:
+            return
+        entry.expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if slug in self._entries:
+                self._remove(slug)
+            self._entries[slug] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, slug):
+        with self._lock:
+            if slug in self._entries:
+                self._remove(slug)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, slug):
+        entry = self._entries.pop(slug)
+        self._bytes -= entry.size
+
+
+page_cache = PageCache(
+    max_entries=Config.PAGE_CACHE_MAX_ENTRIES,
+    max_bytes=Config.PAGE_CACHE_MAX_BYTES,
+    ttl=Config.PAGE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,108 @@
+"""Keyset pagination and field projection for page listings."""
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, or_, type_coerce
+
+import models
+
+# Columns callers may request through `fields=`
+PAGE_FIELDS = {
+    "id": models.Page.id,
+    "slug": models.Page.slug,
+    "title": models.Page.title,
+    "content": models.Page.content,
+    "visibility": models.Page.visibility,
+    "access_type": models.Page.access_type,
+    "main_image": models.Page.main_image,
+    "info": models.Page.info,
+    "created_by": models.Page.created_by,
+    "created_at": models.Page.created_at,
+    "updated_at": models.Page.updated_at,
+}
+
+MAX_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def parse_fields(fields, default=None):
+    """Turn `fields=slug,title` into a list of column names (400 on unknown names)."""
+    if not fields:
+        return list(default or PAGE_FIELDS)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in PAGE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+# --- Cursor encoding ---
+def encode_cursor(updated_at, page_id):
+    raw = f"{updated_at.isoformat() if updated_at else ''}|{page_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, page_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return (datetime.fromisoformat(ts) if ts else None), int(page_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _timestamp_param(query, ts):
+    """
+    SQLite keeps timestamps as text, and CURRENT_TIMESTAMP omits the
+    microseconds SQLAlchemy would add to a bound datetime, so compare
+    against the stored text form to keep equality (and the index) working.
+    """
+    if query.session.get_bind().dialect.name != "sqlite":
+        return ts
+    timespec = "microseconds" if ts.microsecond else "seconds"
+    return type_coerce(ts.isoformat(sep=" ", timespec=timespec), String)
+
+
+def apply_keyset(query, cursor=None):
+    """Order newest-first on (updated_at, id) and skip past `cursor`."""
+    updated_at, page_id = models.Page.updated_at, models.Page.id
+    if cursor:
+        last_ts, last_id = decode_cursor(cursor)
+        if last_ts is not None:
+            last_ts = _timestamp_param(query, last_ts)
+        if last_ts is None:
+            query = query.filter(updated_at.is_(None), page_id < last_id)
+        else:
+            query = query.filter(
+                or_(
+                    updated_at < last_ts,
+                    and_(updated_at == last_ts, page_id < last_id),
+                    updated_at.is_(None),
+                )
+            )
+    return query.order_by(updated_at.desc().nulls_last(), page_id.desc())
+
+
+def fetch_projected(query, fields, limit=None, cursor=None, keyset=True):
+    """
+    Run a page query selecting only `fields` and return (rows, next_cursor).
+    Only the projected columns (plus the keyset columns) are loaded, so
+    `content` never reaches Python unless it was asked for.
+    """
+    columns = [PAGE_FIELDS[f].label(f) for f in fields]
+    columns += [models.Page.id.label("keyset_id"), models.Page.updated_at.label("keyset_updated_at")]
+    query = query.with_entities(*columns)
+
+    if keyset:
+        query = apply_keyset(query, cursor)
+    if limit:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].keyset_updated_at, rows[-1].keyset_id)
+
+    return [{f: getattr(r, f) for f in fields} for r in rows], next_cursor
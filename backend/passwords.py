@@ -0,0 +1,100 @@
+"""bcrypt hashing on a dedicated, bounded worker pool."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from config import Config
+
+BCRYPT_MAX_LENGTH = 72
+
+
+class LatencyStats:
+    """Running count / total / max for one operation, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_seconds": round(self.total, 6),
+                "avg_seconds": round(self.total / self.count, 6) if self.count else None,
+                "max_seconds": round(self.max, 6),
+            }
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the request threadpool. At most `max_pending` calls may
+    be queued or running; beyond that callers get a 503 instead of piling
+    up behind a login burst.
+    """
+
+    def __init__(self, rounds, workers, max_pending):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.rejected = 0
+        self.latency = {"hash": LatencyStats(), "verify": LatencyStats()}
+        self.wait = LatencyStats()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password[:BCRYPT_MAX_LENGTH])
+
+    async def verify_and_update(self, password: str, password_hash: str):
+        """Return (ok, new_hash); new_hash is set when the stored cost is outdated."""
+        return await self._run("verify", self.context.verify_and_update, password, password_hash)
+
+    async def _run(self, op, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many sign-ins in progress, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        queued_at = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            self.wait.record(started - queued_at)
+            try:
+                return fn(*args)
+            finally:
+                self.latency[op].record(time.perf_counter() - started)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "rounds": self.context.to_dict().get("bcrypt__rounds"),
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "queue_wait": self.wait.snapshot(),
+            **{op: stats.snapshot() for op, stats in self.latency.items()},
+        }
+
+
+hasher = PasswordHasher(
+    rounds=Config.BCRYPT_ROUNDS,
+    workers=Config.PASSWORD_HASH_WORKERS,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,145 @@
+"""
+Statements shared by the sync endpoints in main.py and their async
+counterparts in async_api.py. Each builder returns a 2.0-style select()
+that runs unchanged on a Session or an AsyncSession.
+"""
+import sys
+
+from sqlalchemy import func, or_, select, union
+from sqlalchemy.orm import joinedload
+
+import models
+from models import JournalEntry, User
+
+perms = models.page_view_permissions
+
+
+# --- Pages ---
+def page_by_slug(slug: str):
+    """The page with its creator's username joined in (one round trip)."""
+    return (
+        select(models.Page)
+        .options(joinedload(models.Page.creator).load_only(User.username))
+        .where(models.Page.slug == slug)
+    )
+
+
+def page_acl_ids(page_id: int):
+    return select(perms.c.user_id).where(perms.c.page_id == page_id)
+
+
+def visible_summary(current_user):
+    """
+    Subquery of (id, slug, title, updated_at, version) for:
+    - All public pages (for everyone)
+    - All pages created by the current user (if logged in)
+    - All private pages the user is allowed to view (if logged in)
+    """
+    columns = (
+        models.Page.id.label("id"),
+        models.Page.slug.label("slug"),
+        models.Page.title.label("title"),
+        models.Page.updated_at.label("updated_at"),
+        models.Page.version.label("version"),
+    )
+
+    # Always include public pages
+    public_pages = select(*columns).where(models.Page.visibility == "public")
+    if not current_user:
+        return public_pages.subquery()
+
+    # Include own pages
+    own_pages = select(*columns).where(models.Page.created_by == current_user.id)
+
+    # Include pages where user is allowed
+    allowed_pages = (
+        select(*columns)
+        .join(perms, models.Page.id == perms.c.page_id)
+        .where(perms.c.user_id == current_user.id)
+    )
+
+    # Combine all three sets
+    return union(public_pages, own_pages, allowed_pages).subquery()
+
+
+def summary_validator(visible):
+    """
+    (count, id sum, version sum): changes on any edit, share or unshare.
+    Versions only grow and pages are never deleted, so no two states match.
+    """
+    return select(func.count(visible.c.id), func.sum(visible.c.id), func.sum(visible.c.version))
+
+
+def summary_rows(visible):
+    # Only return minimal fields for performance
+    return select(visible.c.id, visible.c.slug, visible.c.title).order_by(visible.c.updated_at.desc())
+
+
+# --- Users ---
+def _ascii_lower(s: str) -> str:
+    """Lowercase like SQLite's built-in lower(), which only folds ASCII."""
+    return s.translate(_ASCII_LOWER)
+
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _prefix_upper_bound(prefix: str):
+    """Smallest string above every string starting with `prefix`, or None if there is none."""
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return None
+    return stripped[:-1] + chr(ord(stripped[-1]) + 1)
+
+
+def users_by_prefix(prefix: str, limit: int):
+    """
+    Usernames starting with `prefix`, ignoring case, as a range on the
+    lower(username) index (SQLite's LIKE can't use an expression index).
+    """
+    name = func.lower(User.username)
+    prefix = _ascii_lower(prefix)
+    q = select(User.id, User.username).where(name >= prefix)
+    upper = _prefix_upper_bound(prefix)
+    if upper is not None:
+        q = q.where(name < upper)
+    return q.order_by(name).limit(limit)
+
+
+# --- Journals ---
+def visible_entries(journal_id: int, current_user):
+    q = (
+        select(JournalEntry, User.username)
+        .join(User, User.id == JournalEntry.created_by, isouter=True)
+        .where(JournalEntry.journal_id == journal_id)
+    )
+
+    # 👇 Filter out private messages not created by current user
+    if not current_user:
+        return q.where(JournalEntry.is_private == False)
+    return q.where(
+        or_(
+            JournalEntry.is_private == False,
+            JournalEntry.created_by == current_user.id
+        )
+    )
+
+
+def new_entry_dict(entry, username):
+    return {
+        "id": entry.id,
+        "content": entry.content,
+        "created_at": entry.created_at.isoformat() + "Z",
+        "created_by_username": username or "Unknown",
+        "is_private": entry.is_private,
+    }
+
+
+def entry_dict(row):
+    return {
+        "id": row.JournalEntry.id,
+        "content": row.JournalEntry.content,
+        "created_at": row.JournalEntry.created_at,
+        "created_by_username": row.username,
+        "is_private": row.JournalEntry.is_private,
+    }
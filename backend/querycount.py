@@ -0,0 +1,110 @@
+"""
+Per-request SQL query counting with per-endpoint budgets (debug aid).
+
+With QUERY_BUDGET_MODE set to "log" or "raise", every HTTP request gets a
+counter that an engine event bumps on each statement. Responses carry an
+X-Query-Count header; when an endpoint decorated with @budget(n) runs more
+than n statements (its dependencies included), the request is logged, and
+in "raise" mode answered with a 500 so tests and load runs fail loudly.
+"""
+import json
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+MODES = ("off", "log", "raise")
+
+
+class QueryCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def budget(max_queries: int):
+    """Declare how many statements an endpoint may run per request."""
+    def decorate(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorate
+
+
+def _count(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.count += 1
+
+
+class QueryBudgetMiddleware:
+    """Pure ASGI, so the counter's context reaches threadpool endpoints too."""
+
+    def __init__(self, app, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"Unknown QUERY_BUDGET_MODE: {mode!r}")
+        self.app = app
+        self.mode = mode
+        if mode != "off" and not event.contains(Engine, "before_cursor_execute", _count):
+            event.listen(Engine, "before_cursor_execute", _count)
+
+    async def __call__(self, scope, receive, send):
+        if self.mode == "off" or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        counter = QueryCounter()
+        token = _current.set(counter)
+        suppress_body = False
+
+        async def send_with_count(message):
+            nonlocal suppress_body
+            if message["type"] == "http.response.start":
+                # The endpoint (routing set scope["endpoint"]) has finished by now
+                endpoint = scope.get("endpoint")
+                limit = getattr(endpoint, "query_budget", None)
+                if limit is not None and counter.count > limit:
+                    logger.warning(
+                        "%s %s ran %d queries (budget %d)",
+                        scope["method"], scope["path"], counter.count, limit,
+                    )
+                    if self.mode == "raise":
+                        suppress_body = True
+                        body = json.dumps({
+                            "detail": f"Query budget exceeded: {counter.count} > {limit}"
+                        }).encode()
+                        await send({
+                            "type": "http.response.start",
+                            "status": 500,
+                            "headers": [
+                                (b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (QUERY_COUNT_HEADER.lower().encode(), str(counter.count).encode()),
+                            ],
+                        })
+                        await send({"type": "http.response.body", "body": body})
+                        return
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode(), str(counter.count).encode()))
+                message = {**message, "headers": headers}
+            elif suppress_body:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _current.reset(token)
+
+
+def install(app, mode: str = Config.QUERY_BUDGET_MODE):
+    app.add_middleware(QueryBudgetMiddleware, mode=mode)
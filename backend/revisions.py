@@ -0,0 +1,337 @@
+"""
+Page history stored as compressed deltas between periodic keyframes.
+
+Every save records a revision. A keyframe holds the page's full content,
+and the revisions after it hold only an edit script against their
+predecessor. The script is a list of ops: an int > 0 copies that many
+characters, an int < 0 skips them, and a string inserts it. Scripts come
+from a word- and tag-level diff. A keyframe is forced every
+REVISION_KEYFRAME_INTERVAL revisions, so rebuilding any revision reads
+one keyframe and at most that many deltas. Title and info are small, so
+each revision stores them whole. Payloads are zlib-compressed JSON.
+
+Pages saved before history existed get their prior state recorded as a
+keyframe on their first edit. `compact()` thins old history: everything
+from the last REVISION_KEEP_ALL_DAYS is kept, then the last revision of
+each day up to REVISION_KEEP_DAILY_DAYS, then the last of each week.
+
+    python -m revisions compact
+"""
+import re
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+
+import orjson
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from config import Config
+from models import Page, PageRevision, User
+
+KEYFRAME_INTERVAL = max(1, Config.REVISION_KEYFRAME_INTERVAL)
+# SequenceMatcher is O(n*m) in the tokens of the changed region (more on
+# very repetitive markup); past this the revision is stored as a keyframe.
+# Local edits are trimmed to a tiny region first, so they never get near it.
+MAX_DIFF_WORK = 2_000_000
+COMPRESS_LEVEL = 6
+
+# Tags, words with their trailing whitespace, runs of whitespace, a stray "<"
+_TOKEN_RE = re.compile(r"<[^>]*>|[^<\s]+\s*|\s+|<")
+
+
+# --- Deltas ---
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    lo, hi = 0, n
+    while lo < hi:  # binary search with slice compares, far faster than a char loop
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def diff(old: str, new: str):
+    """Edit script turning `old` into `new`, or None when too costly to compute."""
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    a = _TOKEN_RE.findall(old[prefix:len(old) - suffix])
+    b = _TOKEN_RE.findall(new[prefix:len(new) - suffix])
+    if len(a) * len(b) > MAX_DIFF_WORK:
+        return None
+
+    ops = []
+
+    def emit(op):
+        if ops and type(ops[-1]) is type(op) and (isinstance(op, str) or (ops[-1] > 0) == (op > 0)):
+            ops[-1] += op
+        elif op:
+            ops.append(op)
+
+    emit(prefix)
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            emit(sum(map(len, a[i1:i2])))
+            continue
+        if i2 > i1:
+            emit(-sum(map(len, a[i1:i2])))
+        if j2 > j1:
+            emit("".join(b[j1:j2]))
+    emit(suffix)
+    return ops
+
+
+def patch(old: str, ops) -> str:
+    out, pos = [], 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.append(old[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def _pack(payload) -> bytes:
+    return zlib.compress(orjson.dumps(payload), COMPRESS_LEVEL)
+
+
+def _unpack(data: bytes):
+    return orjson.loads(zlib.decompress(data))
+
+
+def _encode(doc, previous, chain):
+    """(keyframe, chain, data) for `doc`, as a delta on `previous` when that pays off."""
+    keyframe = _pack({"info": doc["info"], "content": doc["content"]})
+    if previous is None or chain + 1 >= KEYFRAME_INTERVAL:
+        return True, 0, keyframe
+    ops = diff(previous["content"], doc["content"])
+    if ops is None:
+        return True, 0, keyframe
+    delta = _pack({"info": doc["info"], "ops": ops})
+    if len(delta) >= len(keyframe):
+        return True, 0, keyframe
+    return False, chain + 1, delta
+
+
+def _apply(row, previous):
+    """The document stored in `row`, given the one before it (None at a keyframe)."""
+    payload = _unpack(row.data)
+    content = payload["content"] if row.keyframe else patch(previous["content"], payload["ops"])
+    return {"title": row.title, "info": payload["info"], "content": content or ""}
+
+
+# --- Recording ---
+def snapshot(page):
+    """What a revision stores, read off a Page before it's modified."""
+    return {
+        "title": page.title or "",
+        "info": page.info,
+        "content": page.content or "",
+        "created_at": page.updated_at,
+    }
+
+
+def _same(a, b):
+    return a["title"] == b["title"] and a["content"] == b["content"] and a["info"] == b["info"]
+
+
+def _row(page_id, number, doc, previous, chain, author_id, created_at=None):
+    keyframe, chain, data = _encode(doc, previous, chain)
+    return {
+        "page_id": page_id, "number": number, "title": doc["title"], "keyframe": keyframe, "chain": chain,
+        "data": data, "size": len(doc["content"]), "created_by": author_id,
+        "created_at": created_at or datetime.now(timezone.utc).replace(tzinfo=None),
+    }
+
+
+def _latest(db: Session, page_id: int):
+    return db.execute(
+        select(PageRevision.number, PageRevision.chain)
+        .where(PageRevision.page_id == page_id)
+        .order_by(PageRevision.number.desc())
+        .limit(1)
+    ).first()
+
+
+def record(db: Session, page, author_id, before=None):
+    """
+    Record `page`'s current state as its next revision; `before` is
+    `snapshot(page)` taken before an edit, which is skipped if it changed
+    nothing. Call before the transaction's first write: the diff runs
+    before the page row is locked, so the write lock isn't held while it
+    computes. If another save landed in between, the diff's base is stale
+    and the revision is stored as a keyframe instead.
+    """
+    doc = snapshot(page)
+    if before is not None and _same(before, doc):
+        return None
+    last = _latest(db, page.id)
+    rows = []
+    if last is not None:
+        number, chain, previous = last.number, last.chain, before
+    elif before is not None:
+        # History starts now; keep what the page looked like until this edit
+        rows.append(_row(page.id, 1, before, None, 0, page.created_by, before["created_at"]))
+        number, chain, previous = 1, 0, before
+    else:
+        number, chain, previous = 0, 0, None
+    rows.append(_row(page.id, number + 1, doc, previous, chain, author_id))
+
+    # Lock the page row (a no-op write), then make sure nobody saved since we read
+    version = db.execute(
+        update(Page.__table__).where(Page.id == page.id).values(version=Page.version).returning(Page.version)
+    ).scalar()
+    latest = _latest(db, page.id)
+    if version != page.version or latest != last:
+        number = latest.number if latest else 0
+        rows = [_row(page.id, number + 1, doc, None, 0, author_id)]
+    db.execute(insert(PageRevision), rows)
+    return rows[-1]["number"]
+
+
+# --- Reading ---
+def history(page_id: int, before=None, limit: int = 50):
+    """Revision metadata, newest first; `before` is a revision number to page from."""
+    stmt = (
+        select(
+            PageRevision.number, PageRevision.title, PageRevision.size, PageRevision.keyframe,
+            PageRevision.created_at, User.username.label("created_by"),
+        )
+        .outerjoin(User, User.id == PageRevision.created_by)
+        .where(PageRevision.page_id == page_id)
+        .order_by(PageRevision.number.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(PageRevision.number < before)
+    return stmt
+
+
+def load(db: Session, page_id: int, number: int):
+    """Revision `number` of a page, rebuilt from its keyframe, or None."""
+    base = (
+        select(func.max(PageRevision.number))
+        .where(PageRevision.page_id == page_id, PageRevision.keyframe, PageRevision.number <= number)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(PageRevision, User.username)
+        .outerjoin(User, User.id == PageRevision.created_by)
+        .where(PageRevision.page_id == page_id, PageRevision.number.between(base, number))
+        .order_by(PageRevision.number)
+    ).all()
+    if not rows or rows[-1].PageRevision.number != number:
+        return None
+    doc = None
+    for row in rows:
+        doc = _apply(row.PageRevision, doc)
+    last = rows[-1]
+    return {
+        "number": number,
+        **doc,
+        "created_at": last.PageRevision.created_at,
+        "created_by": last.username,
+    }
+
+
+# --- Compaction ---
+def _bucket(created_at, now):
+    """Which revisions compete for one slot: None keeps it, otherwise a day or a week."""
+    age = now - created_at
+    if age < timedelta(days=Config.REVISION_KEEP_ALL_DAYS):
+        return None
+    if age < timedelta(days=Config.REVISION_KEEP_DAILY_DAYS):
+        return created_at.date()
+    return created_at.isocalendar()[:2]
+
+
+def compact(db: Session, page_id: int, now=None) -> int:
+    """Thin one page's history and re-encode the survivors; returns revisions removed."""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = db.execute(
+        select(PageRevision).where(PageRevision.page_id == page_id).order_by(PageRevision.number)
+    ).scalars().all()
+    if not rows:
+        return 0
+
+    # Newest revision per bucket wins; the latest revision always survives
+    last_in_bucket = {}
+    for row in rows:
+        bucket = _bucket(row.created_at, now)
+        if bucket is not None:
+            last_in_bucket[bucket] = row.number
+    keep = {row.number for row in rows if _bucket(row.created_at, now) is None}
+    keep |= set(last_in_bucket.values())
+    keep.add(rows[-1].number)
+    dropped = [row.number for row in rows if row.number not in keep]
+    if not dropped:
+        return 0
+
+    # Re-encode everything first, so no diff runs while holding the write lock
+    changed = []
+    doc, previous, chain = None, None, 0
+    for row in rows:
+        doc = _apply(row, doc)
+        if row.number not in keep:
+            continue
+        keyframe, chain, data = _encode(doc, previous, chain)
+        if (keyframe, chain, data) != (row.keyframe, row.chain, row.data):
+            changed.append({"rid": row.id, "keyframe": keyframe, "chain": chain, "data": data})
+        previous = doc
+    if changed:
+        db.execute(
+            update(PageRevision.__table__)
+            .where(PageRevision.id == bindparam("rid"))
+            .values(keyframe=bindparam("keyframe"), chain=bindparam("chain"), data=bindparam("data")),
+            changed,
+        )
+    db.execute(
+        delete(PageRevision)
+        .where(PageRevision.page_id == page_id, PageRevision.number.in_(dropped))
+        .execution_options(synchronize_session=False)
+    )
+    return len(dropped)
+
+
+def compact_all(db: Session, now=None) -> dict:
+    """Compact every page with revisions old enough to thin, one transaction per page."""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    cutoff = now - timedelta(days=Config.REVISION_KEEP_ALL_DAYS)
+    page_ids = db.execute(
+        select(PageRevision.page_id).where(PageRevision.created_at < cutoff).distinct()
+    ).scalars().all()
+    report = {"pages": 0, "removed": 0}
+    for page_id in page_ids:
+        removed = compact(db, page_id, now)
+        db.commit()
+        report["pages"] += bool(removed)
+        report["removed"] += removed
+    return report
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import SessionLocal, engine
+
+    if sys.argv[1:] != ["compact"]:
+        sys.exit("usage: python -m revisions compact")
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        print(compact_all(db))
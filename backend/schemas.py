@@ -35,6 +35,7 @@ class PageUpdate(BaseModel):
 class Page(PageBase):
     id: int
     slug: str
+    main_image_srcset: Optional[str] = None  # resized variants of main_image, when available
     created_by: Optional[int] = None  # ✅ numeric foreign key
     created_by_username: Optional[str] = None  # ✅ username of creator
     updated_at: Optional[str] = None
@@ -74,4 +75,5 @@ class JournalCreate(BaseModel):
     
 
 class JournalEntryCreate(BaseModel):
-    content: str
\ No newline at end of file
+    content: str
+    is_private: Optional[bool] = False
\ No newline at end of file
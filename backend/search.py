@@ -0,0 +1,184 @@
+"""
+Full-text search over wiki pages, backed by an SQLite FTS5 index.
+
+On other databases (see DATABASE_URL) search falls back to weighted
+substring matching until a native index is wired up there.
+"""
+import html
+import re
+
+from sqlalchemy import case, column, func, literal_column, or_, table, text
+from sqlalchemy.orm import Session
+
+import acl
+import models
+
+# Column weights for BM25, mirroring the old client-side scoring:
+# slug > title / info > content
+FTS_COLUMNS = ("slug", "title", "info", "content")
+FTS_WEIGHTS = (3.0, 2.0, 2.0, 1.0)
+
+SNIPPET_TOKENS = 16
+# Private-use markers so the snippet can be HTML-escaped before highlighting
+_MARK_OPEN, _MARK_CLOSE = "\u0002", "\u0003"
+
+pages_fts = table("pages_fts", column("rowid"))
+_fts = literal_column("pages_fts")
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_available(bind):
+    return bind.dialect.name == "sqlite"
+
+
+# --- Index maintenance ---
+# pages_fts itself is created by migrations/v0009_pages_fts.py
+def rebuild_index(db: Session):
+    db.execute(text("DELETE FROM pages_fts"))
+    for page in db.query(models.Page).yield_per(500):
+        index_page(db, page)
+
+
+def index_page(db: Session, page):
+    """(Re)index a single page. Call inside the transaction that writes it."""
+    if not fts_available(db.get_bind()):
+        return
+    db.execute(text("DELETE FROM pages_fts WHERE rowid = :id"), {"id": page.id})
+    db.execute(
+        text(
+            "INSERT INTO pages_fts (rowid, slug, title, info, content) "
+            "VALUES (:id, :slug, :title, :info, :content)"
+        ),
+        {
+            "id": page.id,
+            "slug": page.slug or "",
+            "title": page.title or "",
+            "info": flatten_info(page.info),
+            "content": strip_html(page.content),
+        },
+    )
+
+
+def index_new_pages(db: Session, pages):
+    """
+    Bulk-index pages that have no FTS row yet (fresh inserts), one
+    executemany. `pages` need id, slug, title, info and content.
+    """
+    if not fts_available(db.get_bind()) or not pages:
+        return
+    db.execute(
+        text(
+            "INSERT INTO pages_fts (rowid, slug, title, info, content) "
+            "VALUES (:id, :slug, :title, :info, :content)"
+        ),
+        [
+            {
+                "id": p.id,
+                "slug": p.slug or "",
+                "title": p.title or "",
+                "info": flatten_info(p.info),
+                "content": strip_html(p.content),
+            }
+            for p in pages
+        ],
+    )
+
+
+def optimize_index(db: Session):
+    """Merge the FTS segments a bulk load leaves behind."""
+    if fts_available(db.get_bind()):
+        db.execute(text("INSERT INTO pages_fts (pages_fts) VALUES ('optimize')"))
+
+
+def strip_html(value):
+    if not value:
+        return ""
+    return html.unescape(_TAG_RE.sub(" ", value))
+
+
+def flatten_info(info):
+    """Flatten sidebar info keys and values into plain indexable text."""
+    parsed = models.parse_info(info)
+    if isinstance(parsed, dict):
+        return " ".join(f"{k} {strip_html(str(v))}" for k, v in parsed.items())
+    if isinstance(parsed, list):
+        return " ".join(strip_html(str(v)) for v in parsed)
+    return strip_html(str(parsed)) if parsed else ""
+
+
+# --- Querying ---
+def build_match(q: str):
+    """Turn free text into a safe FTS5 query: every term, prefix-matched."""
+    terms = _TOKEN_RE.findall(q or "")
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def highlight(snippet):
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def search_pages(db: Session, q: str, current_user=None, limit: int = 20, offset: int = 0):
+    """Return a page of ranked hits visible to `current_user`, plus the next offset."""
+    match = build_match(q)
+    if not match:
+        return [], None
+    if not fts_available(db.get_bind()):
+        return _search_pages_like(db, q, current_user, limit, offset)
+
+    rank = func.bm25(_fts, *FTS_WEIGHTS)
+    snippet = func.snippet(
+        _fts, FTS_COLUMNS.index("content"), _MARK_OPEN, _MARK_CLOSE, "…", SNIPPET_TOKENS
+    )
+
+    query = (
+        db.query(models.Page.id, models.Page.slug, models.Page.title, snippet.label("snippet"))
+        .select_from(models.Page)
+        .join(pages_fts, pages_fts.c.rowid == models.Page.id)
+        .filter(_fts.op("MATCH")(match))
+    )
+
+    # Same visibility rules as list_pages
+    query = query.filter(acl.visible_clause(current_user))
+
+    rows = query.order_by(rank, models.Page.id).limit(limit + 1).offset(offset).all()
+    next_offset = offset + limit if len(rows) > limit else None
+
+    results = [
+        {"id": r.id, "slug": r.slug, "title": r.title, "snippet": highlight(r.snippet).strip()}
+        for r in rows[:limit]
+    ]
+    return results, next_offset
+
+
+def _search_pages_like(db: Session, q: str, current_user, limit: int, offset: int):
+    """Unindexed fallback with the same weights; content snippets are omitted."""
+    pattern = f"%{q.strip()}%"
+    score = sum(
+        case((col.ilike(pattern), weight), else_=0)
+        for col, weight in zip(
+            (models.Page.slug, models.Page.title, models.Page.content), (3, 2, 1)
+        )
+    )
+    rows = (
+        db.query(models.Page.id, models.Page.slug, models.Page.title)
+        .filter(
+            or_(
+                models.Page.slug.ilike(pattern),
+                models.Page.title.ilike(pattern),
+                models.Page.content.ilike(pattern),
+            )
+        )
+        .filter(acl.visible_clause(current_user))
+        .order_by(score.desc(), models.Page.id)
+        .limit(limit + 1)
+        .offset(offset)
+        .all()
+    )
+    next_offset = offset + limit if len(rows) > limit else None
+    results = [{"id": r.id, "slug": r.slug, "title": r.title, "snippet": ""} for r in rows[:limit]]
+    return results, next_offset
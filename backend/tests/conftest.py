@@ -0,0 +1,58 @@
+"""
+Shared fixtures. Config is read at import time, so the environment is
+pointed at a throwaway data directory before any app module is imported.
+
+    pip install -r requirements-dev.txt && python -m pytest
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="dndwiki-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_workdir, 'wiki.db')}",
+    "IMAGES_DIR": os.path.join(_workdir, "images"),
+    "BROADCAST_SQLITE_PATH": os.path.join(_workdir, "broadcast.db"),
+    "MAIL_DISPATCHER": "false",  # tests drive their own Dispatcher
+    "BCRYPT_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+    "QUERY_BUDGET_MODE": "raise",  # an endpoint over its @budget answers 500
+})
+
+import pytest  # noqa: E402
+
+import migrations  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def schema():
+    migrations.upgrade(engine)
+    return engine
+
+
+@pytest.fixture
+def db(schema):
+    with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def client(schema):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def register(client):
+    """register(name) -> auth headers for a new user with that name."""
+    def make(name, password="pw"):
+        response = client.post("/api/register", json={"username": name, "password": password, "email": f"{name}@example.com"})
+        assert response.status_code == 200, response.text
+        token = client.post("/api/token", data={"username": name, "password": password}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return make
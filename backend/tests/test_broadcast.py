@@ -0,0 +1,77 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+import broadcast
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def relay(tmp_path):
+    broker = broadcast.SQLiteRelayBroker(
+        os.path.join(tmp_path, "relay.db"), poll_interval=0.01, retention_seconds=3600, log_size=10
+    )
+    # Record which threads touch sqlite3
+    threads = set()
+    conn = broker._conn
+
+    def tracked_conn():
+        threads.add(threading.get_ident())
+        return conn()
+
+    broker._conn = tracked_conn
+    return broker, threads
+
+
+async def test_relay_keeps_sqlite_off_the_event_loop(relay):
+    broker, threads = relay
+    delivered = asyncio.Queue()
+
+    async def deliver(journal_id, payload, seq):
+        await delivered.put((journal_id, seq))
+
+    await broker.start(deliver)
+    await broker.run(broker.publish, 7, {"event": "new_entry", "data": {}})
+    assert await asyncio.wait_for(delivered.get(), 2) == (7, 1)
+    assert await broker.run(broker.latest_seq) == 1
+    missed = await broker.run(broker.events_since, 7, 0)
+    assert [seq for seq, _ in missed] == [1]
+    await broker.stop()
+
+    assert threads and threading.get_ident() not in threads
+
+
+async def test_sync_publish_reaches_the_relay_poller(relay):
+    broker, _ = relay
+    delivered = asyncio.Queue()
+
+    async def deliver(journal_id, payload, seq):
+        await delivered.put(payload)
+
+    await broker.start(deliver)
+    # As a sync endpoint would, from a threadpool thread
+    await asyncio.to_thread(broker.publish, 3, {"event": "delete_entry", "data": {"id": 5}})
+    payload = await asyncio.wait_for(delivered.get(), 2)
+    assert payload.endswith('"seq": 1}')
+    await broker.stop()
+
+
+async def test_brokers_must_implement_the_whole_interface():
+    class Partial(broadcast.Broker):
+        async def start(self, deliver):
+            pass
+
+        def publish(self, journal_id, message):
+            pass
+
+    with pytest.raises(TypeError, match="events_since"):
+        Partial()
+    broadcast.InProcessBroker(log_size=10)
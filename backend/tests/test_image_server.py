@@ -0,0 +1,79 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from image_server import IMMUTABLE, REVALIDATE, ImageFiles
+
+BODY = bytes(range(256)) * 8
+
+
+@pytest.fixture
+def stored(tmp_path):
+    name = f"{hashlib.sha256(BODY).hexdigest()}.png"
+    (tmp_path / name).write_bytes(BODY)
+    return tmp_path, name
+
+
+def client_for(directory, **kwargs):
+    app = FastAPI()
+    app.mount("/images", ImageFiles(str(directory), **kwargs))
+    return TestClient(app)
+
+
+def test_streams_ranges_and_revalidates(stored):
+    directory, name = stored
+    client = client_for(directory)
+
+    response = client.get(f"/images/{name}")
+    assert response.content == BODY
+    assert response.headers["cache-control"] == IMMUTABLE
+
+    partial = client.get(f"/images/{name}", headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == BODY[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(BODY)}"
+
+    etag = response.headers["etag"]
+    assert client.get(f"/images/{name}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/images/{name}", headers={"Range": "bytes=10-19", "If-Range": etag}).status_code == 206
+
+
+def test_manifests_are_revalidated(stored):
+    directory, name = stored
+    manifest = directory / name.replace(".png", ".json")
+    manifest.write_text('{"variants_ready": false}')
+    client = client_for(directory)
+
+    response = client.get(f"/images/{manifest.name}")
+    assert response.headers["cache-control"] == REVALIDATE
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")  # JSON may go out compressed
+    not_modified = client.get(f"/images/{manifest.name}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.headers["etag"] == etag
+
+    manifest.write_text('{"variants_ready": true}')
+    response = client.get(f"/images/{manifest.name}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == {"variants_ready": True}
+
+
+def test_accel_redirect_hands_the_file_to_the_proxy(stored):
+    directory, name = stored
+    client = client_for(directory, accel_redirect="/_images/")
+
+    response = client.get(f"/images/{name}", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 200  # nginx applies the range itself
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == f"/_images/{name}"
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == IMMUTABLE
+
+    assert client.get("/images/missing.png").status_code == 404
+
+    manifest = directory / name.replace(".png", ".json")
+    manifest.write_text("{}")
+    response = client.get(f"/images/{manifest.name}")
+    assert response.headers["x-accel-redirect"] == f"/_images/{manifest.name}"
+    assert response.headers["cache-control"] == REVALIDATE
@@ -0,0 +1,92 @@
+import itertools
+
+import pytest
+from sqlalchemy import text
+
+import auth
+import broadcast
+
+_runs = itertools.count()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+    monkeypatch.setattr(broadcast, "publish", lambda journal_id, event, data: events.append((event, data)))
+    return events
+
+
+@pytest.fixture
+def journal(client, db, register):
+    """A journal owned by `keeper`, with entries by `keeper` and `player` (one private)."""
+    run = next(_runs)
+    keeper, player = register(f"order_keeper{run}"), register(f"order_player{run}")
+    stranger = register(f"order_stranger{run}")
+    journal_id = client.post("/api/journals", json={"title": "Ordered journal"}).json()["id"]
+    keeper_id = db.execute(text(f"SELECT id FROM users WHERE username = 'order_keeper{run}'")).scalar()
+    db.execute(text("UPDATE journals SET created_by = :uid WHERE id = :jid"), {"uid": keeper_id, "jid": journal_id})
+    db.commit()
+
+    def add(who, content, is_private=False):
+        response = client.post(f"/api/journals/{journal_id}/entries", headers=who,
+                               json={"content": content, "is_private": is_private})
+        return response.json()["id"]
+
+    entries = {
+        "keeper": add(keeper, "<p>Keeper</p>"),
+        "player": add(player, "<p>Player</p>"),
+        "player_private": add(player, "<p>Player notes</p>", is_private=True),
+        "player_late": add(player, "<p>Player again</p>"),
+    }
+    return {"id": journal_id, "run": run, "keeper": keeper, "player": player, "stranger": stranger, "entries": entries}
+
+
+def order_of(client, journal):
+    entries = client.get(f"/api/journals/{journal['id']}", headers=journal["player"]).json()["entries"]
+    return [e["id"] for e in entries]
+
+
+def test_only_owners_authors_and_admins_may_reorder(client, db, journal, published):
+    e = journal["entries"]
+    before = order_of(client, journal)
+    url = f"/api/journals/{journal['id']}/order"
+
+    # A stranger moving other people's entries
+    response = client.put(url, headers=journal["stranger"], json={"entry_ids": [e["player"], e["keeper"]]})
+    assert response.status_code == 403
+    # An author moving someone else's entry along with their own
+    response = client.put(url, headers=journal["player"], json={"entry_ids": [e["player"], e["keeper"]]})
+    assert response.status_code == 403
+    assert order_of(client, journal) == before
+    assert published == []
+
+    # An author moving only their own entries
+    response = client.put(url, headers=journal["player"], json={"entry_ids": [e["player_late"], e["player"]]})
+    assert response.status_code == 200
+    # The journal's owner moving anyone's
+    response = client.put(url, headers=journal["keeper"], json={"entry_ids": [e["player"], e["keeper"]]})
+    assert response.status_code == 200
+
+    stranger_id = db.execute(
+        text("UPDATE users SET role = 'admin' WHERE username = :name RETURNING id"),
+        {"name": f"order_stranger{journal['run']}"},
+    ).scalar()
+    db.commit()
+    auth.token_cache.invalidate_user(stranger_id)
+    response = client.put(url, headers=journal["stranger"], json={"entry_ids": [e["keeper"], e["player"]]})
+    assert response.status_code == 200
+
+
+def test_reorder_broadcast_leaves_out_private_entries(client, journal, published):
+    e = journal["entries"]
+    ids = [e["player_late"], e["player_private"], e["player"]]
+    response = client.put(f"/api/journals/{journal['id']}/order", headers=journal["player"], json={"entry_ids": ids})
+    assert response.status_code == 200
+    assert published == [("reorder_entries", {"entry_ids": [e["player_late"], e["player"]]})]
+
+    # Moving nothing but private entries publishes nothing
+    published.clear()
+    response = client.put(f"/api/journals/{journal['id']}/order", headers=journal["player"],
+                          json={"entry_ids": [e["player_private"]]})
+    assert response.status_code == 200
+    assert published == []
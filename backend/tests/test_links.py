@@ -0,0 +1,96 @@
+import itertools
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import links
+
+_runs = itertools.count()
+
+
+def test_extract_finds_internal_links_in_content_and_info():
+    content = (
+        '<p><a href="/Ashfall-Keep">Keep</a> <a class="x" href=\'/dragons/\'>D</a>'
+        ' <a href="/search">route</a> <a href="https://example.com/elsewhere">out</a>'
+        ' <a href="/lore/deep">nested</a> <span href="/not-an-anchor"></span></p>'
+    )
+    info = json.dumps(json.dumps({"Ruler": '<a href="/queen_mab">Mab</a>', "Allies": ['<a href="/elves">E</a>']}))
+    assert links.extract(content, info) == {"ashfall-keep", "dragons", "queen_mab", "elves"}
+    assert links.extract(None, None) == set()
+
+
+def test_outgoing_drops_self_links():
+    page = SimpleNamespace(slug="ashfall", content='<a href="/ashfall">me</a><a href="/Ashfall">me</a>', info=None)
+    assert links.outgoing(page) == set()
+
+
+@pytest.fixture
+def slugs():
+    """Page slugs unique to this test: slugs("keep") -> "keep-<run>"."""
+    run = next(_runs)
+    return lambda name: f"{name}-{run}"
+
+
+def write(client, who, slug, content, title=None, **extra):
+    """Create or replace the page at `slug` (titles map 1:1 onto slugs here)."""
+    title = title or slug.replace("-", " ").title()
+    existing = client.get(f"/api/pages/{slug}", headers=who)
+    if existing.status_code == 404:
+        response = client.post("/api/pages", headers=who, json={"title": title, "content": content, **extra})
+        assert response.json()["slug"] == slug
+    else:
+        response = client.put(f"/api/pages/{slug}", headers=who, json={"title": title, "content": content, **extra})
+    assert response.status_code == 200, response.text
+
+
+def link(*targets):
+    return "<p>" + " ".join(f'<a href="/{t}">{t}</a>' for t in targets) + "</p>"
+
+
+def backlinks(client, slug, who=None):
+    return [r["slug"] for r in client.get(f"/api/pages/{slug}/backlinks", headers=who or {}).json()]
+
+
+def broken(client, slug):
+    report = {r["missing"]: [s["slug"] for s in r["linked_from"]] for r in client.get("/api/links/broken").json()}
+    return report.get(slug)
+
+
+def test_graph_follows_edits_creations_and_retitles(client, register, slugs):
+    owner = register(slugs("graph_owner"))
+    keep, tower, ruins = slugs("keep"), slugs("tower"), slugs("ruins")
+    write(client, owner, tower, "<p>Tall</p>")
+    write(client, owner, keep, link(tower, ruins, keep))  # ruins doesn't exist yet; the last one is a self-link
+
+    assert backlinks(client, tower) == [keep]
+    assert backlinks(client, keep) == []
+    assert broken(client, ruins) == [keep]
+
+    # The missing page is created: the link is no longer broken
+    write(client, owner, ruins, link(tower))
+    assert broken(client, ruins) is None
+    assert backlinks(client, ruins) == [keep]
+    assert sorted(backlinks(client, tower)) == sorted([keep, ruins])
+
+    # Retitling the target keeps its backlinks, which are keyed by slug
+    write(client, owner, tower, "<p>Taller</p>", title="The Leaning Tower")
+    assert sorted(backlinks(client, tower)) == sorted([keep, ruins])
+    assert client.get("/api/pages/titles").json()[tower] == "The Leaning Tower"
+
+    # Removing a link drops just that edge
+    write(client, owner, keep, link(ruins))
+    assert backlinks(client, tower) == [ruins]
+    assert backlinks(client, ruins) == [keep]
+
+
+def test_backlinks_from_private_pages_stay_private(client, register, slugs):
+    owner, other = register(slugs("link_owner")), register(slugs("link_other"))
+    target, secret = slugs("open-target"), slugs("secret-source")
+    write(client, owner, target, "<p>Open</p>")
+    write(client, owner, secret, link(target, slugs("nowhere")), visibility="private")
+
+    assert backlinks(client, target, owner) == [secret]
+    assert backlinks(client, target, other) == []
+    assert backlinks(client, target) == []
+    assert broken(client, slugs("nowhere")) is None  # anonymous report
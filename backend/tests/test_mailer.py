@@ -0,0 +1,235 @@
+"""Dispatcher against a local aiosmtpd server."""
+import asyncio
+import socket
+import time
+from datetime import timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import delete, select
+
+import mailer
+from database import SessionLocal
+from models import EmailOutbox
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class Recorder:
+    """Accepts everything except the recipients it's told to refuse."""
+
+    def __init__(self):
+        self.messages = []  # (peer, recipients, content)
+        self.refuse = {}  # address -> SMTP reply
+        self.delay = 0  # seconds to sit on each message before answering
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return self.refuse[address]
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        self.messages.append((session.peer, list(envelope.rcpt_tos), envelope.content.decode()))
+        return "250 Message accepted"
+
+    @property
+    def connections(self):
+        return len({peer for peer, _, _ in self.messages})
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    handler = Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+@pytest.fixture
+def outbox(schema):
+    def clear():
+        with SessionLocal() as db:
+            db.execute(delete(EmailOutbox))
+            db.commit()
+
+    clear()
+    yield
+    clear()
+
+
+def make_dispatcher(port, **overrides):
+    options = dict(
+        hostname="127.0.0.1", port=port, username=None, password=None, start_tls=False,
+        sender="wiki@example.com", timeout=5, batch_size=10, rate=1000, max_attempts=3,
+        retry_base=30, retry_max=3600, poll_interval=0.05, idle_timeout=60, lease=300,
+    )
+    options.update(overrides)
+    return mailer.Dispatcher(SessionLocal, **options)
+
+
+def enqueue(*recipients):
+    with SessionLocal() as db:
+        for i, recipient in enumerate(recipients):
+            mailer.enqueue(db, recipient, f"Subject {i}", f"Body {i}")
+        db.commit()
+
+
+def rows():
+    with SessionLocal() as db:
+        return {r.recipient: r for r in db.execute(select(EmailOutbox)).scalars()}
+
+
+async def test_claims_in_batches_under_a_lease(outbox, smtp):
+    enqueue(*(f"user{i}@example.com" for i in range(5)))
+    first, second = make_dispatcher(smtp[1], batch_size=2), make_dispatcher(smtp[1], batch_size=2)
+
+    claimed = [first._claim(), second._claim(), first._claim(), second._claim()]
+
+    assert [len(batch) for batch in claimed] == [2, 2, 1, 0]
+    ids = [row.id for batch in claimed for row in batch]
+    assert len(ids) == len(set(ids)) == 5  # nothing claimed twice
+    now = mailer.utcnow()
+    for row in rows().values():
+        assert row.status == "sending"
+        assert row.next_attempt_at > now + timedelta(seconds=290)  # leased, not due
+
+
+async def test_batch_reuses_one_connection(outbox, smtp):
+    handler, port = smtp
+    enqueue(*(f"user{i}@example.com" for i in range(4)))
+    dispatcher = make_dispatcher(port)
+
+    await dispatcher._send_batch(dispatcher._claim())
+    await dispatcher.stop()
+
+    assert len(handler.messages) == 4
+    assert handler.connections == 1
+    assert dispatcher.connections == 1
+    assert {r.status for r in rows().values()} == {"sent"}
+    assert dispatcher.sent == 4
+
+
+async def test_reply_errors_retry_with_backoff_or_fail(outbox, smtp):
+    handler, port = smtp
+    handler.refuse = {
+        "busy@example.com": "451 4.3.0 Try again later",
+        "gone@example.com": "550 5.1.1 No such mailbox",
+    }
+    enqueue("busy@example.com", "gone@example.com", "ok@example.com")
+    dispatcher = make_dispatcher(port, retry_base=30)
+
+    started = mailer.utcnow()
+    await dispatcher._send_batch(dispatcher._claim())
+    outcome = rows()
+
+    busy = outcome["busy@example.com"]
+    assert busy.status == "pending" and busy.attempts == 1
+    assert "451" in busy.last_error
+    # 30 s base, +/-20% jitter
+    assert started + timedelta(seconds=24) <= busy.next_attempt_at <= mailer.utcnow() + timedelta(seconds=36)
+    gone = outcome["gone@example.com"]
+    assert gone.status == "failed" and gone.attempts == 1  # 5xx is permanent
+    assert outcome["ok@example.com"].status == "sent"
+    assert dispatcher.connections == 1  # refusals don't drop the connection
+    assert dispatcher._claim() == []  # the retry isn't due yet
+
+    # Once due, the retry goes through
+    handler.refuse.clear()
+    with SessionLocal() as db:
+        db.get(EmailOutbox, busy.id).next_attempt_at = mailer.utcnow()
+        db.commit()
+    await dispatcher._send_batch(dispatcher._claim())
+    await dispatcher.stop()
+    assert rows()["busy@example.com"].status == "sent"
+    assert [rcpts for _, rcpts, _ in handler.messages] == [["ok@example.com"], ["busy@example.com"]]
+
+
+async def test_transient_failures_stop_at_max_attempts(outbox, smtp):
+    handler, port = smtp
+    handler.refuse = {"busy@example.com": "451 4.3.0 Try again later"}
+    enqueue("busy@example.com")
+    dispatcher = make_dispatcher(port, max_attempts=2, retry_base=0)
+
+    for _ in range(2):
+        await dispatcher._send_batch(dispatcher._claim())
+    await dispatcher.stop()
+
+    row = rows()["busy@example.com"]
+    assert row.status == "failed" and row.attempts == 2
+    assert dispatcher.retried == 1 and dispatcher.failed == 1
+
+
+async def test_expired_lease_is_reclaimed_after_a_crash(outbox, smtp, monkeypatch):
+    handler, port = smtp
+    enqueue("a@example.com", "b@example.com")
+
+    crashed = make_dispatcher(port, lease=60)
+    assert len(crashed._claim()) == 2  # ...and dies before sending or recording
+
+    survivor = make_dispatcher(port, lease=60)
+    assert survivor._claim() == []  # still leased
+
+    later = mailer.utcnow() + timedelta(seconds=61)
+    monkeypatch.setattr(mailer, "utcnow", lambda: later)
+    reclaimed = survivor._claim()
+    assert sorted(r.recipient for r in reclaimed) == ["a@example.com", "b@example.com"]
+
+    await survivor._send_batch(reclaimed)
+    await survivor.stop()
+    assert {r.status for r in rows().values()} == {"sent"}
+    assert len(handler.messages) == 2
+
+
+async def test_slow_server_cannot_push_a_batch_past_its_lease(outbox, smtp):
+    handler, port = smtp
+    handler.delay = 0.4
+    enqueue(*(f"user{i}@example.com" for i in range(6)))
+    dispatcher = make_dispatcher(port, lease=1, timeout=5)  # margin: a tenth of the lease
+
+    started = time.monotonic()
+    await dispatcher._send_batch(dispatcher._claim())
+    elapsed = time.monotonic() - started
+    await dispatcher.stop()
+
+    assert elapsed < 1  # recorded while the lease still held
+    outcome = rows().values()
+    assert {r.status for r in outcome} <= {"sent", "pending"}  # nothing left leased to a finished batch
+    sent = [r for r in outcome if r.status == "sent"]
+    assert 1 <= len(sent) < 6
+    returned = [r for r in outcome if r.status == "pending" and r.attempts == 0]
+    assert returned and all(r.next_attempt_at <= mailer.utcnow() for r in returned)  # due again at once
+    # The send cut off mid-flight may have gone out, so it waits out a backoff
+    assert {r.id for r in dispatcher._claim()} == {r.id for r in returned}
+
+
+async def test_running_dispatcher_sends_on_wake(outbox, smtp):
+    handler, port = smtp
+    dispatcher = make_dispatcher(port, poll_interval=30)
+    await dispatcher.start()
+    try:
+        await asyncio.sleep(0.05)  # first (empty) poll
+        enqueue("a@example.com", "b@example.com")
+        dispatcher.wake()
+        for _ in range(100):
+            if len(handler.messages) == 2:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await dispatcher.stop()
+
+    assert len(handler.messages) == 2
+    assert dispatcher.connections == 1
@@ -0,0 +1,120 @@
+"""Schema migrations: query plans, drift against the models, backfills, concurrent upgrades."""
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event, inspect, text
+
+import links
+import migrations
+import search
+from database import Base, sqlite_pragmas
+from migrations import plan_check
+
+
+def test_hot_queries_use_indexes(schema):
+    failures = plan_check.check(schema)
+    assert not failures, "\n".join(f"{name}: {bad} (plan: {steps})" for name, bad, steps in failures)
+
+
+def test_migrated_schema_matches_models(schema):
+    inspector = inspect(schema)
+    for table in Base.metadata.sorted_tables:
+        assert inspector.has_table(table.name), table.name
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert {c.name for c in table.columns} <= columns, table.name
+        # sqlite_master rather than the inspector, which skips expression indexes
+        with schema.connect() as conn:
+            indexes = set(conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"), {"t": table.name}
+            ).scalars())
+        missing = {ix.name for ix in table.indexes} - indexes
+        assert not missing, f"{table.name}: {missing} declared on the model but never migrated"
+
+
+def test_backfills_match_the_live_extractors(tmp_path):
+    engine = _engine(tmp_path / "backfill.db", timeout=1)
+    migrations.upgrade(engine)
+    info = {"Home": '<a href="/ashfall-keep">Keep</a> &amp; more', "Ruler": '<a href="/Queen-Mab/">Mab</a>'}
+    pages = [
+        ("ashfall", "Ashfall", '<p><a href="/ashfall">self</a> <a href="/search">x</a> <a href="/dragons">D</a></p>',
+         json.dumps(json.dumps(info))),  # double-encoded, as older clients saved it
+        ("dragons", "Dragons", "<p>No links</p>", json.dumps(["<b>scaly</b>", "old"])),
+        ("plain", "Plain", "<p>Caf\u00e9 &lt;3</p>", None),
+    ]
+    with engine.begin() as conn:
+        for slug, title, content, raw in pages:
+            conn.execute(
+                text("INSERT INTO pages (slug, title, content, info) VALUES (:slug, :title, :content, :info)"),
+                {"slug": slug, "title": title, "content": content, "info": raw},
+            )
+        # As if the database predated both tables
+        conn.execute(text("DROP TABLE page_links"))
+        conn.execute(text("DROP TABLE pages_fts"))
+        conn.execute(text("DELETE FROM schema_version WHERE version IN (5, 9)"))
+    assert migrations.upgrade(engine) == [5, 9]
+
+    with engine.connect() as conn:
+        stored = conn.execute(text(
+            "SELECT p.slug, l.target_slug FROM page_links l JOIN pages p ON p.id = l.source_id"
+        )).all()
+        indexed = {r.slug: (r.info, r.content) for r in conn.execute(text("SELECT slug, info, content FROM pages_fts"))}
+    engine.dispose()
+    expected = []
+    for slug, _, content, raw in pages:
+        row = SimpleNamespace(slug=slug, content=content, info=json.loads(raw) if raw else None)
+        expected += [(slug, target) for target in links.outgoing(row)]
+        assert indexed[slug] == (search.flatten_info(row.info), search.strip_html(content)), slug
+    assert sorted(stored) == sorted(expected) == [("ashfall", "ashfall-keep"), ("ashfall", "dragons"), ("ashfall", "queen-mab")]
+
+
+def _engine(path, timeout):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": timeout, "check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def pragmas(dbapi_connection, _):
+        for name, value in sqlite_pragmas().items():
+            if name != "busy_timeout":
+                dbapi_connection.execute(f"PRAGMA {name}={value}")
+
+    return engine
+
+
+def test_concurrent_upgrades_apply_each_version_once(tmp_path, monkeypatch):
+    # A migration that outlasts the busy timeout, so the other workers must wait and retry
+    def slow_upgrade(conn):
+        conn.execute(text("CREATE TABLE IF NOT EXISTS slow_step (id INTEGER PRIMARY KEY)"))
+        time.sleep(0.5)
+
+    real = migrations.scripts()
+    slow = SimpleNamespace(__name__="migrations.v9999_slow", upgrade=slow_upgrade)
+    monkeypatch.setattr(migrations, "scripts", lambda: real + [(9999, slow)])
+
+    path = tmp_path / "concurrent.db"
+    errors, applied = [], []
+
+    def worker():
+        engine = _engine(path, timeout=0.05)
+        try:
+            applied.append(migrations.upgrade(engine))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            engine.dispose()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors, errors
+    versions = sorted(v for run in applied for v in run)
+    assert versions == sorted(v for v, _ in real) + [9999]  # each applied by exactly one worker
+    engine = _engine(path, timeout=1)
+    with engine.connect() as conn:
+        recorded = [row[0] for row in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+    engine.dispose()
+    assert recorded == versions
+
@@ -0,0 +1,88 @@
+import hashlib
+
+import pytest
+from sqlalchemy import text
+
+import images
+from page_cache import page_cache
+
+
+@pytest.fixture
+def rendering_image():
+    """A stored image whose variants haven't been rendered yet."""
+    digest = hashlib.sha256(b"page-cache-test").hexdigest()
+    manifest = {
+        "hash": digest,
+        "url": images.store.url(f"{digest}.png"),
+        "content_type": "image/png",
+        "size": 1,
+        "width": 1600,
+        "height": 900,
+        "variants": [{"width": 640, "url": images.store.url(f"{digest}-640.webp")}],
+        "variants_ready": False,
+    }
+    images.store._write_manifest(manifest)
+    return manifest
+
+
+def test_page_changes_when_image_variants_are_ready(client, register, rendering_image):
+    owner = register("cache_owner")
+    response = client.post("/api/pages", headers=owner, json={
+        "title": "Cached Keep", "content": "<p>Walls</p>", "main_image": rendering_image["url"],
+    })
+    assert response.status_code == 200, response.text
+
+    before = client.get("/api/pages/cached-keep")
+    assert before.json()["main_image_srcset"] is None
+    assert "last-modified" not in before.headers  # only the ETag can tell the versions apart
+    etag = before.headers["etag"]
+    assert client.get("/api/pages/cached-keep", headers={"If-None-Match": etag}).status_code == 304
+
+    images.store._write_manifest({**rendering_image, "variants_ready": True})
+
+    after = client.get("/api/pages/cached-keep", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.json()["main_image_srcset"].startswith(rendering_image["variants"][0]["url"])
+    assert after.headers["etag"] != etag
+    assert "last-modified" in after.headers
+
+
+def edit_within_one_second(client, db, owner, slug, content):
+    """Edit a page, then pin updated_at so every edit looks like the same second."""
+    response = client.put(f"/api/pages/{slug}", headers=owner, json={"title": "Same Second", "content": content})
+    assert response.status_code == 200, response.text
+    db.execute(text("UPDATE pages SET updated_at = '2026-01-01 00:00:00' WHERE slug = :slug"), {"slug": slug})
+    db.commit()
+    page_cache.invalidate(slug)
+
+
+def test_etags_change_on_every_edit_within_one_second(client, db, register):
+    owner = register("second_owner")
+    assert client.post("/api/pages", headers=owner, json={"title": "Same Second", "content": "<p>v0</p>"}).status_code == 200
+    edit_within_one_second(client, db, owner, "same-second", "<p>v1</p>")
+    page_etag = client.get("/api/pages/same-second").headers["etag"]
+    list_etag = client.get("/api/pages/summary", headers=owner).headers["etag"]
+
+    edit_within_one_second(client, db, owner, "same-second", "<p>v2</p>")
+    page = client.get("/api/pages/same-second", headers={"If-None-Match": page_etag})
+    assert page.status_code == 200
+    assert page.json()["content"] == "<p>v2</p>"
+    assert client.get("/api/pages/summary", headers={**owner, "If-None-Match": list_etag}).status_code == 200
+
+
+def test_compressed_and_not_modified_responses_carry_the_same_etag(client, register):
+    owner = register("gzip_owner")
+    content = "<p>" + "The long road to Ashfall. " * 200 + "</p>"
+    assert client.post("/api/pages", headers=owner, json={"title": "Long Road", "content": content}).status_code == 200
+
+    compressed = client.get("/api/pages/long-road", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    plain = client.get("/api/pages/long-road", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    etag = compressed.headers["etag"]
+    assert plain.headers["etag"] == etag
+
+    for encoding in ("gzip", "identity"):
+        revalidated = client.get("/api/pages/long-road", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == etag
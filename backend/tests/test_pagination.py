@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text
+
+import pagination
+from database import SessionLocal
+
+# Stored forms SQLite ends up with: CURRENT_TIMESTAMP (seconds), SQLAlchemy (microseconds), and NULL
+STAMPS = [
+    "2026-03-01 12:00:00", "2026-03-01 12:00:00", "2026-03-01 12:00:00",
+    "2026-03-01 11:59:59.250000", "2026-03-01 11:59:59.250000",
+    "2026-03-01 11:59:59",
+    None, None,
+]
+
+
+@pytest.fixture(scope="module")
+def tied(client, register):
+    """Pages by one author whose updated_at values tie in runs of two and three."""
+    owner = register("keyset_owner")
+    ids = []
+    for i in range(len(STAMPS)):
+        response = client.post("/api/pages", headers=owner, json={"title": f"Keyset {i}", "content": "<p>x</p>"})
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    with SessionLocal() as db:
+        for stamp, page_id in zip(STAMPS, ids):
+            db.execute(text("UPDATE pages SET updated_at = :at WHERE id = :id"), {"at": stamp, "id": page_id})
+        db.commit()
+    # Newest first, then id descending within a tie, NULLs last
+    expected = sorted(zip(STAMPS, ids), key=lambda p: (p[0] is not None, p[0] or "", p[1]), reverse=True)
+    return owner, [page_id for _, page_id in expected]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4])
+def test_keyset_pages_through_ties_without_gaps_or_repeats(client, tied, limit):
+    owner, expected = tied
+    seen, cursor = [], None
+    for _ in range(len(expected) + 1):
+        params = {"fields": "id", "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/user-pages/keyset_owner", headers=owner, params=params)
+        assert response.status_code == 200, response.text
+        seen += [row["id"] for row in response.json()]
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == expected
+
+
+def test_bad_cursor_is_a_400(client, tied):
+    owner, _ = tied
+    response = client.get("/api/user-pages/keyset_owner", headers=owner, params={"limit": 2, "cursor": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,128 @@
+"""
+Every @querycount.budget endpoint, called in QUERY_BUDGET_MODE=raise (see
+conftest): an N+1 or an extra round trip turns into a 500 here.
+"""
+import json
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import auth
+import main
+import querycount
+from database import get_db
+from page_cache import page_cache
+
+
+@pytest.fixture(scope="module")
+def campaign(client, register):
+    owner, reader = register("budget_owner"), register("budget_reader")
+    for i in range(5):
+        response = client.post("/api/pages", headers=owner, json={
+            "title": f"Budget Page {i}",
+            "content": f'<p>Dragon lore {i}, see <a href="/view/budget-page-{i + 1}">next</a></p>',
+            "visibility": "private" if i % 2 else "public",
+            "info": {"Type": "Location"},
+        })
+        assert response.status_code == 200, response.text
+        client.post("/api/pages/budget-page-1/allow/budget_reader", headers=owner)
+    client.put("/api/pages/budget-page-0", headers=owner, json={
+        "title": "Budget Page 0", "content": "<p>Revised dragon lore</p>", "info": json.dumps({"Type": "Keep"}),
+    })
+    journal_id = client.post("/api/journals", json={"title": "Budget journal"}).json()["id"]
+    entries = [
+        client.post(f"/api/journals/{journal_id}/entries", headers=owner,
+                    json={"content": f"<p>Session {i}</p>", "is_private": i == 2}).json()["id"]
+        for i in range(6)
+    ]
+    return {"owner": owner, "reader": reader, "journal": journal_id, "entries": entries}
+
+
+# (method, path, who, json body); one per budgeted route
+CASES = [
+    ("GET", "/api/pages", "reader", None),
+    ("GET", "/api/pages?limit=2&fields=slug,title", None, None),
+    ("GET", "/api/pages/summary", "reader", None),
+    ("GET", "/api/pages/titles", "reader", None),
+    ("GET", "/api/pages/budget-page-1/backlinks", "reader", None),
+    ("GET", "/api/links/broken", "owner", None),
+    ("GET", "/api/search?q=dragon", "reader", None),
+    ("GET", "/api/pages/all", "owner", None),
+    ("GET", "/api/user-pages/budget_owner", "reader", None),
+    ("GET", "/api/pages/budget-page-1", "reader", None),
+    ("GET", "/api/pages/budget-page-0/revisions", "reader", None),
+    ("GET", "/api/pages/budget-page-0/revisions/1", "reader", None),
+    ("GET", "/api/users/search?q=budget", "owner", None),
+    ("GET", "/api/journals/{journal}", "reader", None),
+    ("GET", "/api/journals/{journal}/entries?limit=2", "owner", None),
+    ("POST", "/api/journals/{journal}/entries", "reader", {"content": "<p>More</p>", "is_private": False}),
+    ("PUT", "/api/journal-entries/{entry}", "owner", {"content": "<p>Edited</p>"}),
+    ("DELETE", "/api/journal-entries/{fresh_entry}", "owner", None),
+]
+
+
+def _call(client, campaign, method, path, who, body):
+    headers = campaign[who] if who else {}
+    fresh_entry = None
+    if "{fresh_entry}" in path:
+        fresh_entry = client.post(f"/api/journals/{campaign['journal']}/entries", headers=headers,
+                                  json={"content": "<p>Doomed</p>"}).json()["id"]
+    path = path.format(journal=campaign["journal"], entry=campaign["entries"][0], fresh_entry=fresh_entry)
+    return client.request(method, path, headers=headers, json=body)
+
+
+def _route_key(route):
+    return next(iter(route.methods)), route.path
+
+
+def test_every_budgeted_route_has_a_case(campaign):
+    budgeted = {
+        _route_key(r) for r in main.app.routes
+        if getattr(getattr(r, "endpoint", None), "query_budget", None) is not None
+    }
+    covered = set()
+    for method, path, _, _ in CASES:
+        path = path.split("?")[0]
+        for route in main.app.routes:
+            if getattr(route, "methods", None) and method in route.methods and route.path_regex.match(
+                path.format(journal=1, entry=1, fresh_entry=1)
+            ):
+                covered.add((method, route.path))
+                break
+    assert budgeted <= covered, f"budgeted routes without a case: {sorted(budgeted - covered)}"
+
+
+@pytest.mark.parametrize("method,path,who,body", CASES, ids=[f"{m} {p}" for m, p, _, _ in CASES])
+@pytest.mark.parametrize("caches", ["cold", "warm"])
+def test_endpoint_stays_within_budget(client, campaign, method, path, who, body, caches):
+    if caches == "cold":
+        page_cache.clear()
+        for user_id in range(1, 1000):
+            auth.token_cache.invalidate_user(user_id)
+    elif method == "GET":
+        _call(client, campaign, method, path, who, body)  # prime the page and token caches
+
+    response = _call(client, campaign, method, path, who, body)
+
+    assert response.status_code < 400, f"{response.status_code}: {response.text}"
+    assert querycount.QUERY_COUNT_HEADER.lower() in response.headers
+
+
+def test_raise_mode_fails_requests_over_budget(schema):
+    app = FastAPI()
+    querycount.install(app, mode="raise")
+
+    @app.get("/chatty")
+    @querycount.budget(1)
+    def chatty(db: Session = Depends(get_db)):
+        for _ in range(3):
+            db.execute(text("SELECT 1"))
+        return {"ok": True}
+
+    response = TestClient(app).get("/chatty")
+    assert response.status_code == 500
+    assert "Query budget exceeded: 3 > 1" in response.json()["detail"]
+    assert response.headers[querycount.QUERY_COUNT_HEADER] == "3"
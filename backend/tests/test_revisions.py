@@ -0,0 +1,142 @@
+import itertools
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, text
+
+import models
+import revisions
+from database import SessionLocal
+from models import PageRevision
+
+_pages = itertools.count()
+WORDS = ["the", "dragon", "<b>", "</b>", "keep", "of", "Ashfall", "<p>", "</p>", "  ", "\n", "gold", "<"]
+
+
+def mutate(rng, content):
+    """A random local edit: insert, delete or replace a run of tokens."""
+    tokens = revisions._TOKEN_RE.findall(content) or [""]
+    while True:
+        i = rng.randrange(len(tokens) + 1)
+        j = min(len(tokens), i + rng.randrange(4))
+        new = [rng.choice(WORDS) + rng.choice(["", " "]) for _ in range(rng.randrange(5))]
+        edited = "".join(tokens[:i] + new + tokens[j:])
+        if edited and edited != content:
+            return edited
+
+
+def test_diff_patch_round_trip():
+    rng = random.Random(3)
+    content = "<p>The keep of Ashfall</p>"
+    for _ in range(500):
+        edited = mutate(rng, content)
+        assert revisions.patch(content, revisions.diff(content, edited)) == edited
+        content = edited
+
+
+def test_oversized_diff_falls_back_to_a_keyframe():
+    old = " ".join(f"w{i}" for i in range(3000))
+    new = " ".join(f"v{i}" for i in range(3000))
+    assert revisions.diff(old, new) is None
+    keyframe, chain, _ = revisions._encode({"info": None, "content": new}, {"content": old}, 0)
+    assert (keyframe, chain) == (True, 0)
+
+
+@pytest.fixture
+def page(client, register):
+    n = next(_pages)
+    owner = register(f"history_owner{n}")
+    response = client.post("/api/pages", headers=owner, json={"title": f"History {n}", "content": "<p>v0</p>"})
+    assert response.status_code == 200, response.text
+    return {"slug": f"history-{n}", "id": response.json()["id"], "owner": owner}
+
+
+def edit(client, page, content, title=None):
+    response = client.put(f"/api/pages/{page['slug']}", headers=page["owner"], json={
+        "title": title or f"History {page['id']}", "content": content, "info": json.dumps({"len": len(content)}),
+    })
+    assert response.status_code == 200, response.text
+
+
+def stored(db, page_id):
+    return db.execute(
+        select(PageRevision.number, PageRevision.keyframe, PageRevision.chain)
+        .where(PageRevision.page_id == page_id).order_by(PageRevision.number)
+    ).all()
+
+
+def test_many_revisions_round_trip_across_keyframes(client, db, page):
+    rng = random.Random(7)
+    expected = {1: "<p>v0</p>"}
+    content = expected[1]
+    for number in range(2, 3 * revisions.KEYFRAME_INTERVAL + 5):
+        content = mutate(rng, content)
+        edit(client, page, content)
+        expected[number] = content
+
+    rows = stored(db, page["id"])
+    assert [r.number for r in rows] == list(expected)
+    assert sum(r.keyframe for r in rows) >= 3
+    assert max(r.chain for r in rows) < revisions.KEYFRAME_INTERVAL
+    for number, content in expected.items():
+        doc = revisions.load(db, page["id"], number)
+        assert doc["content"] == content, number
+        if number > 1:
+            assert doc["info"] == json.dumps({"len": len(content)})
+
+
+def test_compaction_keeps_every_survivor_loadable(client, db, page):
+    rng = random.Random(11)
+    expected = {1: "<p>v0</p>"}
+    content = expected[1]
+    for number in range(2, 80):
+        content = mutate(rng, content)
+        edit(client, page, content)
+        expected[number] = content
+
+    # Four revisions a day, every fifth day, from 400 days ago: both daily and weekly buckets
+    now = datetime(2026, 6, 1)
+    for number in expected:
+        created = now - timedelta(days=400 - (number // 4) * 5, hours=number % 4)
+        db.execute(
+            text("UPDATE page_revisions SET created_at = :at WHERE page_id = :pid AND number = :n"),
+            {"at": created, "pid": page["id"], "n": number},
+        )
+    db.commit()
+
+    removed = revisions.compact(db, page["id"], now)
+    db.commit()
+    assert removed > 0
+    rows = stored(db, page["id"])
+    assert len(rows) == len(expected) - removed
+    assert rows[-1].number == max(expected)  # the latest always survives
+    assert rows[0].keyframe
+    # Chains were renumbered after the dropped rows
+    chain = -1
+    for row in rows:
+        chain = 0 if row.keyframe else chain + 1
+        assert row.chain == chain, row.number
+    for row in rows:
+        assert revisions.load(db, page["id"], row.number)["content"] == expected[row.number]
+    assert revisions.compact(db, page["id"], now) == 0
+
+
+def test_concurrent_save_stores_a_keyframe_instead_of_a_stale_delta(client, db, page):
+    edit(client, page, "<p>v1 shared base</p>")
+
+    # A loads the page, then B saves before A records its revision
+    with SessionLocal() as a:
+        stale = a.execute(select(models.Page).where(models.Page.id == page["id"])).scalar_one()
+        before = revisions.snapshot(stale)
+        edit(client, page, "<p>v2 from B</p>")
+        stale.content = "<p>v2 from A</p>"
+        number = revisions.record(a, stale, stale.created_by, before)
+        a.commit()
+
+    rows = stored(db, page["id"])
+    assert [r.number for r in rows] == [1, 2, 3, 4]
+    assert number == 4 and rows[-1].keyframe
+    assert revisions.load(db, page["id"], 3)["content"] == "<p>v2 from B</p>"
+    assert revisions.load(db, page["id"], 4)["content"] == "<p>v2 from A</p>"
@@ -0,0 +1,71 @@
+import itertools
+
+import pytest
+
+_runs = itertools.count()
+
+
+@pytest.fixture
+def word():
+    """A term no other test's pages contain."""
+    return f"quorblax{next(_runs)}zed"
+
+
+def create(client, who, title, content, **extra):
+    response = client.post("/api/pages", headers=who, json={"title": title, "content": content, **extra})
+    assert response.status_code == 200, response.text
+    return response.json()["slug"]
+
+
+def search(client, q, who=None, **params):
+    response = client.get("/api/search", headers=who or {}, params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_ranks_slug_and_title_matches_above_content(client, register, word):
+    owner = register(f"rank_owner_{word}")
+    in_content = create(client, owner, f"Content only {next(_runs)}", f"<p>Somewhere in here is {word}.</p>")
+    in_title = create(client, owner, f"The {word} Gate", "<p>Nothing to see.</p>")
+    in_content_twice = create(client, owner, f"Content only {next(_runs)}", f"<p>{word} and {word} again</p>")
+
+    hits = [r["slug"] for r in search(client, word)["results"]]
+    assert hits[0] == in_title
+    assert set(hits[1:]) == {in_content, in_content_twice}
+    assert hits.index(in_content_twice) < hits.index(in_content)
+
+    # Prefix matching, and paging through the same order
+    first = search(client, word[:-1], limit=2)
+    assert [r["slug"] for r in first["results"]] == hits[:2]
+    rest = search(client, word[:-1], limit=2, offset=first["next_offset"])
+    assert [r["slug"] for r in rest["results"]] == hits[2:]
+    assert rest["next_offset"] is None
+
+
+def test_snippets_are_escaped_before_highlighting(client, register, word):
+    owner = register(f"snippet_owner_{word}")
+    create(client, owner, f"Snippet {word}", f"<p>{word} says &lt;script&gt;alert(1)&lt;/script&gt; &amp; more</p>")
+
+    [hit] = search(client, word)["results"]
+    snippet = hit["snippet"]
+    assert f"<mark>{word}</mark>" in snippet
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in snippet
+    assert "&amp; more" in snippet
+    assert "<script>" not in snippet and "<p>" not in snippet
+
+
+def test_private_pages_only_reach_their_owner_and_allowed_users(client, register, word):
+    owner = register(f"private_owner_{word}")
+    friend, stranger = register(f"private_friend_{word}"), register(f"private_stranger_{word}")
+    public = create(client, owner, f"Open {word}", f"<p>{word} in public</p>")
+    private = create(client, owner, f"Secret {word}", f"<p>{word} in secret</p>", visibility="private")
+    response = client.post(f"/api/pages/{private}/allow/private_friend_{word}", headers=owner)
+    assert response.status_code == 200, response.text
+
+    def hits(who):
+        return {r["slug"] for r in search(client, word, who)["results"]}
+
+    assert hits(None) == {public}
+    assert hits(stranger) == {public}
+    assert hits(owner) == {public, private}
+    assert hits(friend) == {public, private}
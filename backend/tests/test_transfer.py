@@ -0,0 +1,157 @@
+import itertools
+import random
+
+import orjson
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+import auth
+import migrations
+import transfer
+from config import Config
+from database import SessionLocal
+from models import User
+
+_runs = itertools.count()
+
+
+def test_line_splitter_matches_split_at_any_chunking():
+    body = b'{"a": 1}\n\n{"b": "' + b"x" * 5000 + b'"}\n{"c": 3}'
+    rng = random.Random(5)
+    for _ in range(50):
+        splitter, lines, i = transfer.LineSplitter(max_line=10_000), [], 0
+        while i < len(body):
+            step = rng.randrange(1, 700)
+            lines += splitter.feed(body[i:i + step])
+            i += step
+        lines += splitter.close()
+        assert lines == body.split(b"\n")
+
+
+def test_line_splitter_rejects_long_lines_however_they_arrive():
+    with pytest.raises(transfer.LineTooLong):
+        transfer.LineSplitter(max_line=10).feed(b"short\n" + b"y" * 11 + b"\n")
+    splitter = transfer.LineSplitter(max_line=10)
+    splitter.feed(b"y" * 6)
+    with pytest.raises(transfer.LineTooLong):
+        splitter.feed(b"y" * 5)  # no newline yet
+
+
+@pytest.fixture
+def admin(client, register):
+    name = f"transfer_admin{next(_runs)}"
+    headers = register(name)
+    with SessionLocal() as db:
+        user_id = db.execute(
+            text("UPDATE users SET role = 'admin' WHERE username = :name RETURNING id"), {"name": name}
+        ).scalar()
+        db.commit()
+    auth.token_cache.invalidate_user(user_id)
+    return headers, user_id, name
+
+
+def chunked(body, size):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def test_import_endpoint_streams_chunks_and_enforces_limits(client, admin, monkeypatch):
+    headers, _, _ = admin
+    run = next(_runs)
+    records = [
+        {"type": "page", "slug": f"imported-{run}-{i}", "title": f"Imported {i}", "content": "<p>" + "z" * 300 + "</p>"}
+        for i in range(3)
+    ]
+    body = b"\n".join(orjson.dumps(r) for r in records)  # no trailing newline
+    response = client.post("/api/import", headers=headers, content=chunked(body, 7))
+    assert response.status_code == 200, response.text
+    assert response.json()["pages"] == 3
+    assert client.get(f"/api/pages/imported-{run}-2").json()["title"] == "Imported 2"
+
+    monkeypatch.setattr(Config, "IMPORT_MAX_LINE_BYTES", 200)
+    response = client.post("/api/import", headers=headers, content=chunked(body, 7))
+    assert response.status_code == 413
+
+    monkeypatch.setattr(Config, "IMPORT_MAX_BYTES", 100)
+    response = client.post("/api/import", headers=headers, content=body)  # declared length
+    assert response.status_code == 413
+    response = client.post("/api/import", headers=headers, content=chunked(body, 7))  # chunked, no length
+    assert response.status_code == 413
+
+
+def normalized(ndjson, owner=None):
+    """
+    Records from an export, with journal ids replaced by their position
+    and, given `owner`, missing authors by the importing owner.
+    """
+    records = [orjson.loads(line) for line in ndjson.splitlines() if line]
+    for r in records:
+        if owner and "created_by" in r and r["created_by"] is None:
+            r["created_by"] = owner
+    journals = {r["id"]: n for n, r in enumerate(r for r in records if r["type"] == "journal")}
+    for r in records:
+        if r["type"] == "journal":
+            r["id"] = journals[r["id"]]
+        elif r["type"] == "entry":
+            r["journal"] = journals[r["journal"]]
+    return records
+
+
+def test_export_import_round_trip(client, register, admin, tmp_path):
+    headers, admin_id, admin_name = admin
+    run = next(_runs)
+    author, reader = register(f"rt_author{run}"), register(f"rt_reader{run}")
+    for title, extra in [
+        (f"Round Trip {run}", {"info": '{"Ruler": "<a href=\\"/round-trip-private-%d\\">x</a>"}' % run}),
+        (f"Round Trip Private {run}", {"visibility": "private"}),
+    ]:
+        response = client.post("/api/pages", headers=author, json={"title": title, "content": "<p>Body</p>", **extra})
+        assert response.status_code == 200, response.text
+    client.post(f"/api/pages/round-trip-private-{run}/allow/rt_reader{run}", headers=author)
+    journal_id = client.post("/api/journals", json={"title": f"Round trip {run}"}).json()["id"]
+    for content, private in [("<p>One</p>", False), ("<p>Two</p>", True)]:
+        client.post(f"/api/journals/{journal_id}/entries", headers=author, json={"content": content, "is_private": private})
+    client.post(f"/api/journals/{journal_id}/entries", headers=reader, json={"content": "<p>Three</p>"})
+
+    exported = client.get("/api/export", headers=headers)
+    assert exported.status_code == 200
+    assert {"type": "grant", "page": f"round-trip-private-{run}", "user": f"rt_reader{run}"} in normalized(exported.content)
+
+    # A fresh database that knows the same users
+    engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        users = db.execute(select(User.__table__)).mappings().all()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [dict(u) for u in users])
+
+    target = sessionmaker(bind=engine)
+    with target() as db:
+        importer = transfer.Importer(db, admin_id, batch_size=3)
+        splitter, lines = transfer.LineSplitter(Config.IMPORT_MAX_LINE_BYTES), []
+        for chunk in chunked(exported.content, 101):
+            lines += splitter.feed(chunk)
+        transfer.parse_lines(lines + splitter.close(), importer)
+        report = importer.finish()
+    assert report["invalid"] == report["grants_skipped"] == report["entries_skipped"] == 0
+    ownerless = [r for r in normalized(exported.content) if "created_by" in r and r["created_by"] is None]
+    assert report["authors_reassigned"] == len(ownerless)
+
+    reexported = b"".join(transfer.export_stream(target))
+    engine.dispose()
+
+    # Other tests' rows went through too; compare this test's
+    def ours(records):
+        slugs = {f"round-trip-{run}", f"round-trip-private-{run}"}
+        journals = {r["id"] for r in records if r["type"] == "journal" and r["title"] == f"Round trip {run}"}
+        return [
+            r for r in records
+            if r.get("slug") in slugs or r.get("page") in slugs
+            or (r["type"] == "journal" and r["id"] in journals)
+            or (r["type"] == "entry" and r["journal"] in journals)
+        ]
+
+    expected = ours(normalized(exported.content, owner=admin_name))
+    assert [r["type"] for r in expected] == ["page", "page", "grant", "journal", "entry", "entry", "entry"]
+    assert ours(normalized(reexported)) == expected
@@ -0,0 +1,22 @@
+import sys
+
+from queries import _prefix_upper_bound
+
+
+def test_user_search_ignores_case(client, register):
+    headers = register("Bobbin")
+    register("bOBCAT")
+    register("Robert")
+
+    for q in ("bo", "BO", "Bob"):
+        found = [u["username"] for u in client.get("/api/users/search", params={"q": q}, headers=headers).json()]
+        assert found == ["Bobbin", "bOBCAT"], q
+
+
+def test_user_search_takes_any_character(client, register):
+    headers = register("maxchar")
+    top = chr(sys.maxunicode)
+    for q in (top, "a" + top, top * 3):
+        assert client.get("/api/users/search", params={"q": q}, headers=headers).status_code == 200
+    assert _prefix_upper_bound("a" + top) == "b"
+    assert _prefix_upper_bound(top * 2) is None
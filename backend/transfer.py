@@ -0,0 +1,421 @@
+"""
+Streaming NDJSON export / import of pages (with ACLs), journals and entries.
+
+    python -m transfer export [--include pages,journals] [-o wiki.ndjson]
+    python -m transfer import wiki.ndjson --owner alice [--defer-indexes]
+
+One JSON object per line, tagged with "type", in dependency order:
+
+    {"type": "page", "slug": ..., "title": ..., "created_by": "<username>", ...}
+    {"type": "grant", "page": "<slug>", "user": "<username>"}
+    {"type": "journal", "id": <exported id>, "title": ..., ...}
+    {"type": "entry", "journal": <exported journal id>, "order_index": ..., ...}
+
+Users are referenced by username and never exported (no password hashes
+leave the instance). On import, authors missing from the target fall back
+to the importing owner and grants to missing users are skipped; pages
+whose slug already exists are skipped. Export streams with yield_per in
+constant memory; import buffers up to `batch_size` records, then writes
+them with multi-row INSERTs (search and link-graph rows included) and
+commits once per batch.
+"""
+import argparse
+import sys
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import orjson
+from sqlalchemy import bindparam, insert, select, text, update
+from sqlalchemy.orm import Session
+
+import acl
+import links
+import models
+import search
+from models import Journal, JournalEntry, Page, User
+
+BATCH = 5000
+KINDS = ("pages", "journals")
+KINDS_IN_ORDER = ("page", "grant", "journal", "entry")  # later kinds reference earlier ones
+CHUNK_BYTES = 64 * 1024
+
+pages_table = Page.__table__
+journals_table = Journal.__table__
+entries_table = JournalEntry.__table__
+
+
+# --- Export ---
+def export_records(db: Session, include=KINDS):
+    """Every exported record as a dict, streamed from the database in batches."""
+    stream = {"yield_per": BATCH}
+    if "pages" in include:
+        page_rows = (
+            select(
+                Page.slug, Page.title, Page.content, Page.visibility, Page.access_type, Page.main_image,
+                Page.info, User.username.label("created_by"), Page.created_at, Page.updated_at,
+            )
+            .outerjoin(User, User.id == Page.created_by)
+            .order_by(Page.id)
+        )
+        for row in db.execute(page_rows, execution_options=stream):
+            yield {"type": "page", **row._asdict()}
+
+        grants = (
+            select(Page.slug.label("page"), User.username.label("user"))
+            .select_from(acl.perms)
+            .join(Page, Page.id == acl.perms.c.page_id)
+            .join(User, User.id == acl.perms.c.user_id)
+            .order_by(acl.perms.c.page_id)
+        )
+        for row in db.execute(grants, execution_options=stream):
+            yield {"type": "grant", **row._asdict()}
+
+    if "journals" in include:
+        journals = (
+            select(Journal.id, Journal.title, User.username.label("created_by"), Journal.created_at)
+            .outerjoin(User, User.id == Journal.created_by)
+            .order_by(Journal.id)
+        )
+        for row in db.execute(journals, execution_options=stream):
+            yield {"type": "journal", **row._asdict()}
+
+        entries = (
+            select(
+                JournalEntry.journal_id.label("journal"), JournalEntry.content, JournalEntry.order_index,
+                User.username.label("created_by"), JournalEntry.created_at, JournalEntry.updated_at,
+                JournalEntry.is_private,
+            )
+            .outerjoin(User, User.id == JournalEntry.created_by)
+            .order_by(JournalEntry.journal_id, JournalEntry.order_index, JournalEntry.id)
+        )
+        for row in db.execute(entries, execution_options=stream):
+            yield {"type": "entry", **row._asdict()}
+
+
+def ndjson(records):
+    """NDJSON bytes, grouped into ~64 KiB chunks so a stream isn't one write per line."""
+    chunk = bytearray()
+    for record in records:
+        chunk += orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+        if len(chunk) >= CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+def export_stream(session_factory, include=KINDS):
+    """For StreamingResponse: owns its session, since the request's is closed before the body streams."""
+    with session_factory() as db:
+        yield from ndjson(export_records(db, include))
+
+
+# --- Import ---
+def _when(value, default):
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value) if isinstance(value, str) else value
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)  # stored as naive UTC
+    return parsed
+
+
+class Importer:
+    def __init__(self, db: Session, owner_id: int, batch_size: int = BATCH):
+        self.db = db
+        self.owner_id = owner_id
+        self.batch_size = batch_size
+        self.now = datetime.now(timezone.utc).replace(tzinfo=None)
+        self._pending = {kind: [] for kind in KINDS_IN_ORDER}
+        self._user_ids = {}  # username -> id, or None when unknown here
+        self._page_ids = {}  # imported slug -> new page id
+        self._journal_ids = {}  # exported journal id -> new journal id
+        self._next_index = {}  # new journal id -> next free order_index
+        self.report = dict.fromkeys((
+            "pages", "pages_skipped", "grants", "grants_skipped", "journals",
+            "entries", "entries_skipped", "authors_reassigned", "invalid",
+        ), 0)
+
+    def add(self, record):
+        pending = self._pending.get(record.get("type")) if isinstance(record, dict) else None
+        if pending is None:
+            self.report["invalid"] += 1
+            return
+        pending.append(record)
+        if len(pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def flush(self):
+        """Write everything buffered, in dependency order, as one transaction."""
+        writers = {
+            "page": self._write_pages,
+            "grant": self._write_grants,
+            "journal": self._write_journals,
+            "entry": self._write_entries,
+        }
+        for kind in KINDS_IN_ORDER:
+            rows, self._pending[kind] = self._pending[kind], []
+            if rows:
+                writers[kind](rows)
+        self.db.commit()
+
+    def finish(self) -> dict:
+        self.flush()
+        if self._next_index:
+            self.db.execute(
+                update(journals_table)
+                .where(journals_table.c.id == bindparam("jid"))
+                .values(next_entry_index=bindparam("next_index"))
+                .execution_options(synchronize_session=False),
+                [{"jid": jid, "next_index": n} for jid, n in self._next_index.items()],
+            )
+        if self.report["pages"]:
+            search.optimize_index(self.db)
+        self.db.commit()
+        return self.report
+
+    # --- Batches ---
+    def _resolve_users(self, names):
+        missing = {n for n in names if n and n not in self._user_ids}
+        if missing:
+            found = dict(self.db.execute(select(User.username, User.id).where(User.username.in_(missing))).all())
+            for name in missing:
+                self._user_ids[name] = found.get(name)
+
+    def _author(self, name):
+        user_id = self._user_ids.get(name) if name else None
+        if user_id is None:
+            self.report["authors_reassigned"] += 1
+            return self.owner_id
+        return user_id
+
+    def _write_pages(self, records):
+        by_slug = {}
+        for r in records:
+            if isinstance(r.get("slug"), str) and r["slug"] and r.get("title"):
+                by_slug.setdefault(r["slug"], r)
+            else:
+                self.report["invalid"] += 1
+        existing = set(self.db.scalars(select(Page.slug).where(Page.slug.in_(list(by_slug)))))
+        duplicates = sum(1 for r in records if r.get("slug") in by_slug) - len(by_slug)
+        self.report["pages_skipped"] += duplicates + len(existing)
+        self._resolve_users(r.get("created_by") for r in by_slug.values())
+
+        values = [
+            {
+                "slug": slug,
+                "title": r["title"],
+                "content": r.get("content") or "",
+                "visibility": r.get("visibility") or "public",
+                "access_type": r.get("access_type") or "all_users",
+                "main_image": r.get("main_image"),
+                "info": r.get("info"),
+                "created_by": self._author(r.get("created_by")),
+                "created_at": _when(r.get("created_at"), self.now),
+                "updated_at": _when(r.get("updated_at"), self.now),
+            }
+            for slug, r in by_slug.items()
+            if slug not in existing
+        ]
+        if not values:
+            return
+        inserted = self.db.execute(
+            insert(pages_table).returning(pages_table.c.id, pages_table.c.slug, sort_by_parameter_order=True),
+            values,
+        ).all()
+        pages = []
+        for row, v in zip(inserted, values):
+            self._page_ids[row.slug] = row.id
+            pages.append(SimpleNamespace(id=row.id, **v))
+        self.report["pages"] += len(pages)
+
+        # Secondary structures for the new rows, in bulk
+        search.index_new_pages(self.db, pages)
+        link_rows = [{"source_id": p.id, "target_slug": s} for p in pages for s in sorted(links.outgoing(p))]
+        if link_rows:
+            self.db.execute(insert(models.page_links), link_rows)
+
+    def _write_grants(self, records):
+        self._resolve_users(r.get("user") for r in records)
+        pairs = set()
+        for r in records:
+            page_id = self._page_ids.get(r.get("page"))  # only pages this import created
+            user_id = self._user_ids.get(r.get("user"))
+            if page_id is None or user_id is None:
+                self.report["grants_skipped"] += 1
+            else:
+                pairs.add((page_id, user_id))
+        self.report["grants"] += len(acl.grant_many(self.db, pairs))
+
+    def _write_journals(self, records):
+        records = [r for r in records if r.get("id") is not None and r.get("title")]
+        self._resolve_users(r.get("created_by") for r in records)
+        if not records:
+            return
+        values = [
+            {
+                "title": r["title"],
+                "created_by": self._author(r.get("created_by")),
+                "created_at": _when(r.get("created_at"), self.now),
+                "next_entry_index": 0,
+            }
+            for r in records
+        ]
+        inserted = self.db.execute(
+            insert(journals_table).returning(journals_table.c.id, sort_by_parameter_order=True), values
+        ).all()
+        for row, r in zip(inserted, records):
+            self._journal_ids[r["id"]] = row.id
+        self.report["journals"] += len(inserted)
+
+    def _write_entries(self, records):
+        self._resolve_users(r.get("created_by") for r in records)
+        values = []
+        for r in records:
+            journal_id = self._journal_ids.get(r.get("journal"))
+            if journal_id is None or r.get("content") is None:
+                self.report["entries_skipped"] += 1
+                continue
+            order_index = int(r.get("order_index") or 0)
+            self._next_index[journal_id] = max(self._next_index.get(journal_id, 0), order_index + 1)
+            values.append({
+                "journal_id": journal_id,
+                "content": r["content"],
+                "order_index": order_index,
+                "created_by": self._author(r.get("created_by")),
+                "created_at": _when(r.get("created_at"), self.now),
+                "updated_at": _when(r.get("updated_at"), None),
+                "is_private": bool(r.get("is_private")),
+            })
+        if values:
+            self.db.execute(insert(entries_table), values)
+        self.report["entries"] += len(values)
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+class LineSplitter:
+    """
+    Cut a byte stream into lines as chunks arrive. The unfinished line is
+    kept as a list of pieces and joined once, so a line spanning many
+    chunks costs linear time; one over `max_line` bytes raises LineTooLong.
+    """
+
+    def __init__(self, max_line: int):
+        self.max_line = max_line
+        self._pieces = []
+        self._size = 0
+
+    def feed(self, chunk: bytes) -> list:
+        """The lines `chunk` completes."""
+        *complete, rest = chunk.split(b"\n")
+        if complete:
+            self._hold(complete[0])
+            complete[0] = b"".join(self._pieces)
+            self._pieces, self._size = [], 0
+            if any(len(line) > self.max_line for line in complete):
+                raise LineTooLong(f"NDJSON line longer than {self.max_line} bytes")
+        self._hold(rest)
+        return complete
+
+    def close(self) -> list:
+        """The last line, when the stream doesn't end with a newline."""
+        rest = b"".join(self._pieces)
+        self._pieces, self._size = [], 0
+        return [rest] if rest else []
+
+    def _hold(self, piece):
+        self._size += len(piece)
+        if self._size > self.max_line:
+            raise LineTooLong(f"NDJSON line longer than {self.max_line} bytes")
+        if piece:
+            self._pieces.append(piece)
+
+
+def parse_lines(lines, importer: Importer):
+    """Feed NDJSON lines (bytes or str) to `importer`; blank lines are ignored."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            importer.report["invalid"] += 1
+            continue
+        importer.add(record)
+
+
+@contextmanager
+def deferred_indexes(engine):
+    """
+    Drop the secondary (non-unique) indexes the import writes to and rebuild
+    each once afterwards, instead of maintaining them row by row. Meant for
+    offline loads: reads are slow while the indexes are gone.
+    """
+    tables = (pages_table, entries_table, acl.perms, models.page_links)
+    indexes = [ix for table in tables for ix in table.indexes if not ix.unique]
+    with engine.begin() as conn:
+        for ix in indexes:
+            ix.drop(conn, checkfirst=True)
+    try:
+        yield
+    finally:
+        with engine.begin() as conn:
+            for ix in indexes:
+                ix.create(conn, checkfirst=True)
+            if conn.dialect.name == "sqlite":
+                conn.execute(text("ANALYZE"))
+
+
+# --- CLI ---
+def main(argv=None):
+    from database import SessionLocal, engine
+    from migrations import upgrade
+
+    parser = argparse.ArgumentParser(prog="python -m transfer")
+    commands = parser.add_subparsers(dest="command", required=True)
+    exp = commands.add_parser("export", help="write NDJSON to a file or stdout")
+    exp.add_argument("--include", default=",".join(KINDS), help="comma-separated: pages,journals")
+    exp.add_argument("-o", "--output", help="file to write (default: stdout)")
+    imp = commands.add_parser("import", help="load an NDJSON export")
+    imp.add_argument("input", help="NDJSON file, or - for stdin")
+    imp.add_argument("--owner", required=True, help="username that owns records whose author is unknown here")
+    imp.add_argument("--batch-size", type=int, default=BATCH)
+    imp.add_argument("--defer-indexes", action="store_true", help="drop and rebuild secondary indexes around the load")
+    args = parser.parse_args(argv)
+
+    upgrade(engine)
+    if args.command == "export":
+        include = [k for k in args.include.split(",") if k]
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_stream(SessionLocal, include):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+        return
+
+    with SessionLocal() as db:
+        owner_id = db.scalar(select(User.id).where(User.username == args.owner))
+    if owner_id is None:
+        parser.error(f"unknown user {args.owner!r}")
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    started = datetime.now()
+    with deferred_indexes(engine) if args.defer_indexes else nullcontext(), SessionLocal() as db, source:
+        importer = Importer(db, owner_id, args.batch_size)
+        parse_lines(source, importer)
+        report = importer.finish()
+    report["seconds"] = round((datetime.now() - started).total_seconds(), 2)
+    print(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -61,16 +61,14 @@ export default function EditPage() {
 useEffect(() => {
   const token = localStorage.getItem("access_token")
   const headers = token ? { Authorization: `Bearer ${token}` } : {}
-  fetch("/api/pages/all", { headers })
+  fetch("/api/pages/titles", { headers })
     .then(res => {
-      if (!res.ok) throw new Error("Failed to fetch all pages")
+      if (!res.ok) throw new Error("Failed to fetch page titles")
       return res.json()
     })
-    .then(pages => {
-      const map = {}
-      for (const p of pages) map[p.slug] = p.title
+    .then(map => {
       setPageMap(map)
-      setAllSlugs(pages.map(p => p.slug))
+      setAllSlugs(Object.keys(map))
     })
     .catch(console.error)
 }, [])
@@ -294,7 +292,6 @@ useEffect(() => {
                 if (!file) return
                 const formData = new FormData()
                 formData.append("file", file)
-                formData.append("filename", `${slug}${file.name.substring(file.name.lastIndexOf("."))}`)
                 const res = await fetch("/api/upload-image", { method: "POST", body: formData })
                 if (res.ok) {
                   const data = await res.json()
@@ -13,6 +13,8 @@ export default function JournalPage() {
   const [currentUser, setCurrentUser] = useState("")
   const [showOnlyMine, setShowOnlyMine] = useState(false) // 👈 NEW TOGGLE
   const wsRef = useRef(null)
+  const seqRef = useRef(null) // last broadcast seq seen, for resuming the socket
+  const [reloadKey, setReloadKey] = useState(0)
 
   const formatDate = (isoString) => {
     if (!isoString) return ""
@@ -46,40 +48,65 @@ export default function JournalPage() {
       .then(data => {
         setJournal(data.journal)
         setEntries(data.entries)
+        seqRef.current = data.seq ?? null
       })
-  }, [journalId])
+  }, [journalId, reloadKey])
   
 
-  // --- WebSocket setup ---
+  // --- WebSocket setup (reconnects and resumes from the last seq) ---
   useEffect(() => {
     const wsProtocol = window.location.protocol === "https:" ? "wss" : "ws"
-    const ws = new WebSocket(
-      `${wsProtocol}://${window.location.hostname}:8085/ws/journals/${journalId}`
-    )
-    wsRef.current = ws
+    let ws
+    let retryTimer
+    let stopped = false
+
+    const connect = () => {
+      const resume = seqRef.current != null ? `?resume=${seqRef.current}` : ""
+      ws = new WebSocket(
+        `${wsProtocol}://${window.location.hostname}:8085/ws/journals/${journalId}${resume}`
+      )
+      wsRef.current = ws
 
-    ws.onopen = () => console.log("✅ WS connected:", journalId)
-    ws.onclose = () => console.log("❌ WS disconnected:", journalId)
+      ws.onopen = () => console.log("✅ WS connected:", journalId)
+      ws.onclose = () => {
+        console.log("❌ WS disconnected:", journalId)
+        if (!stopped) retryTimer = setTimeout(connect, 2000)
+      }
 
-    ws.onmessage = (event) => {
-      try {
-        const msg = JSON.parse(event.data)
-        if (msg.event === "new_entry") {
-          const entry = msg.data
-          setEntries((prev) => {
-            if (prev.some((e) => e.id === entry.id)) return prev
-            return [...prev, entry]
-          })
-        } else if (msg.event === "delete_entry") {
-          const { id } = msg.data
-          setEntries((prev) => prev.filter((e) => e.id !== id))
+      ws.onmessage = (event) => {
+        try {
+          const msg = JSON.parse(event.data)
+          if (msg.seq != null) seqRef.current = msg.seq
+          if (msg.event === "new_entry") {
+            const entry = msg.data
+            setEntries((prev) => {
+              if (prev.some((e) => e.id === entry.id)) return prev
+              return [...prev, entry]
+            })
+          } else if (msg.event === "update_entry") {
+            const entry = msg.data
+            setEntries((prev) =>
+              prev.map((e) => (e.id === entry.id ? { ...e, content: entry.content } : e))
+            )
+          } else if (msg.event === "delete_entry") {
+            const { id } = msg.data
+            setEntries((prev) => prev.filter((e) => e.id !== id))
+          } else if (msg.event === "resync") {
+            // Too far behind to replay: reload the journal
+            setReloadKey((k) => k + 1)
+          }
+        } catch (err) {
+          console.error("WS parse error:", err)
         }
-      } catch (err) {
-        console.error("WS parse error:", err)
       }
     }
 
-    return () => ws.close()
+    connect()
+    return () => {
+      stopped = true
+      clearTimeout(retryTimer)
+      ws.close()
+    }
   }, [journalId])
 
   const [isPrivate, setIsPrivate] = useState(false)
@@ -14,45 +14,18 @@ export default function SearchPage() {
 
     if (!q) return
 
-    fetch("/api/pages")
+    const token = localStorage.getItem("access_token")
+    const headers = token ? { Authorization: `Bearer ${token}` } : {}
+
+    // Ranking and visibility filtering happen server-side
+    setLoading(true)
+    fetch(`/api/search?q=${encodeURIComponent(q)}`, { headers })
       .then(res => res.json())
       .then(data => {
-        const filtered = data
-          .map(p => {
-            let score = 0
-            const slugMatch = p.slug?.toLowerCase().includes(q)
-            const titleMatch = p.title?.toLowerCase().includes(q)
-            const contentMatch = p.content?.toLowerCase().includes(q)
-
-            // Safely parse info JSON if it exists
-            let infoMatch = false
-            if (p.info) {
-              try {
-                const infoObj = typeof p.info === "string" ? JSON.parse(p.info) : p.info
-                infoMatch = Object.entries(infoObj || {}).some(
-                  ([key, value]) =>
-                    key.toLowerCase().includes(q) ||
-                    String(value).toLowerCase().includes(q)
-                )
-              } catch {
-                infoMatch = false
-              }
-            }
-
-            // Assign scores
-            if (slugMatch) score += 3
-            if (infoMatch) score += 2
-            if (titleMatch) score += 2
-            if (contentMatch) score += 1
-
-            return { ...p, score }
-          })
-          .filter(p => p.score > 0)
-          .sort((a, b) => b.score - a.score)
-
-        setResults(filtered)
+        setResults(data.results || [])
         setLoading(false)
       })
+      .catch(() => setLoading(false))
   }, [location.search])
 
   if (!query)
@@ -87,13 +60,10 @@ export default function SearchPage() {
               >
                 {r.title}
               </Link>
-              <p className="text-sm text-gray-600 dark:text-gray-400 line-clamp-2">
-                {r.content
-                  .replace(/<[^>]+>/g, "")
-                  .slice(0, 150)
-                  .trim()}
-                ...
-              </p>
+              <p
+                className="text-sm text-gray-600 dark:text-gray-400 line-clamp-2"
+                dangerouslySetInnerHTML={{ __html: r.snippet }}
+              />
             </li>
           ))}
         </ul>
@@ -10,8 +10,11 @@ export default function ViewPage() {
   const [zoomImage, setZoomImage] = useState(null)
   const [currentUser, setCurrentUser] = useState(null)
   const [showWhitelistModal, setShowWhitelistModal] = useState(false)
-  const [allUsers, setAllUsers] = useState([])
+  const [userQuery, setUserQuery] = useState("")
+  const [userMatches, setUserMatches] = useState([])
+  const [selectedUsers, setSelectedUsers] = useState([])
   const [allowedUsers, setAllowedUsers] = useState([])
+  const [backlinks, setBacklinks] = useState([])
   const [isLoadingAllowed, setIsLoadingAllowed] = useState(false)
 
   // --- Load page data ---
@@ -48,6 +51,18 @@ export default function ViewPage() {
       })
   }, [slug])
 
+  // --- Load pages linking here ---
+  useEffect(() => {
+    setBacklinks([])
+    const token = localStorage.getItem("access_token")
+    fetch(`/api/pages/${slug}/backlinks`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    })
+      .then(res => (res.ok ? res.json() : []))
+      .then(setBacklinks)
+      .catch(() => setBacklinks([]))
+  }, [slug])
+
   // --- Load current user ---
   useEffect(() => {
     const token = localStorage.getItem("access_token")
@@ -75,34 +90,80 @@ export default function ViewPage() {
       .finally(() => setIsLoadingAllowed(false))
   }, [page, slug])
 
-  // --- Load whitelist modal data ---
+  // --- Refresh allowed users when the whitelist modal opens ---
   useEffect(() => {
     if (!showWhitelistModal) return
     const token = localStorage.getItem("access_token")
     if (!token) return
-    Promise.all([
-      fetch("/api/users", { headers: { Authorization: `Bearer ${token}` } }).then(res => res.json()),
-      fetch(`/api/pages/${slug}/allowed`, { headers: { Authorization: `Bearer ${token}` } }).then(res => res.json()),
-    ])
-      .then(([users, allowed]) => {
-        setAllUsers(users)
-        setAllowedUsers(allowed)
-      })
+    fetch(`/api/pages/${slug}/allowed`, { headers: { Authorization: `Bearer ${token}` } })
+      .then(res => (res.ok ? res.json() : []))
+      .then(setAllowedUsers)
       .catch(console.error)
   }, [showWhitelistModal, slug])
 
-  // --- Allow a user to view page ---
-  const handleAllowUser = async (username) => {
+  // --- Username typeahead (debounced) ---
+  useEffect(() => {
+    const q = userQuery.trim()
+    const token = localStorage.getItem("access_token")
+    if (!showWhitelistModal || !q || !token) {
+      setUserMatches([])
+      return
+    }
+    const controller = new AbortController()
+    const timer = setTimeout(() => {
+      fetch(`/api/users/search?q=${encodeURIComponent(q)}`, {
+        headers: { Authorization: `Bearer ${token}` },
+        signal: controller.signal,
+      })
+        .then(res => (res.ok ? res.json() : []))
+        .then(setUserMatches)
+        .catch(() => {})
+    }, 200)
+    return () => {
+      clearTimeout(timer)
+      controller.abort()
+    }
+  }, [userQuery, showWhitelistModal])
+
+  const toggleSelected = (username) => {
+    setSelectedUsers(prev =>
+      prev.includes(username) ? prev.filter(u => u !== username) : [...prev, username]
+    )
+  }
+
+  // --- Allow the selected users to view the page (one request) ---
+  const handleAllowUsers = async () => {
     const token = localStorage.getItem("access_token")
     if (!token) return alert("You must be logged in.")
     try {
-      const res = await fetch(`/api/pages/${slug}/allow/${username}`, {
+      const res = await fetch(`/api/pages/${slug}/allow`, {
         method: "POST",
-        headers: { Authorization: `Bearer ${token}` },
+        headers: { Authorization: `Bearer ${token}`, "Content-Type": "application/json" },
+        body: JSON.stringify({ usernames: selectedUsers }),
+      })
+      if (!res.ok) throw new Error("Failed to allow users")
+      const result = await res.json()
+      setAllowedUsers(prev => [...prev, ...result.allowed.map(username => ({ username }))])
+      setSelectedUsers([])
+      setUserQuery("")
+      if (result.allowed.length) alert(`Allowed and notified: ${result.allowed.join(", ")}`)
+    } catch (err) {
+      alert(err.message)
+    }
+  }
+
+  // --- Revoke a user's access ---
+  const handleRevokeUser = async (username) => {
+    const token = localStorage.getItem("access_token")
+    if (!token) return alert("You must be logged in.")
+    try {
+      const res = await fetch("/api/acl/revoke", {
+        method: "POST",
+        headers: { Authorization: `Bearer ${token}`, "Content-Type": "application/json" },
+        body: JSON.stringify({ slugs: [slug], usernames: [username] }),
       })
-      if (!res.ok) throw new Error("Failed to allow user")
-      setAllowedUsers(prev => [...prev, { username }])
-      alert(`User ${username} allowed and notified via email.`)
+      if (!res.ok) throw new Error("Failed to remove user")
+      setAllowedUsers(prev => prev.filter(u => u.username !== username))
     } catch (err) {
       alert(err.message)
     }
@@ -250,6 +311,8 @@ export default function ViewPage() {
           {page.main_image && (
             <img
               src={page.main_image}
+              srcSet={page.main_image_srcset || undefined}
+              sizes="(min-width: 768px) 33vw, 100vw"
               alt={page.title}
               className="w-full rounded-md mb-3 object-cover cursor-pointer"
               onClick={() => setZoomImage(page.main_image)}
@@ -297,6 +360,22 @@ export default function ViewPage() {
         />
       </div>
 
+      {/* Backlinks */}
+      {backlinks.length > 0 && (
+        <div className="mt-8 text-sm">
+          <h2 className="font-semibold text-gray-700 dark:text-gray-300 mb-1">Pages linking here</h2>
+          <ul className="flex flex-wrap gap-x-4 gap-y-1">
+            {backlinks.map(b => (
+              <li key={b.slug}>
+                <button onClick={() => navigate(`/${b.slug}`)} className="text-blue-600 hover:underline">
+                  {b.title}
+                </button>
+              </li>
+            ))}
+          </ul>
+        </div>
+      )}
+
       {/* Footer */}
       <div className="mt-8 border-t border-gray-200 dark:border-gray-700 pt-4 text-sm text-gray-600 dark:text-gray-400 text-center">
         <p>
@@ -319,11 +398,17 @@ export default function ViewPage() {
               </button>
             </h2>
 
-            {allUsers.length === 0 ? (
-              <p className="text-gray-600 dark:text-gray-300 text-center">Loading users...</p>
-            ) : (
-              <ul className="divide-y divide-gray-200 dark:divide-gray-700 max-h-80 overflow-y-auto">
-                {allUsers.map(u => {
+            <input
+              type="text"
+              value={userQuery}
+              onChange={e => setUserQuery(e.target.value)}
+              placeholder="Search users..."
+              className="w-full mb-3 px-3 py-2 rounded border border-gray-300 dark:border-gray-600 bg-white dark:bg-gray-800"
+            />
+
+            {userMatches.length > 0 && (
+              <ul className="divide-y divide-gray-200 dark:divide-gray-700 max-h-48 overflow-y-auto mb-3">
+                {userMatches.map(u => {
                   const isOwner = u.username === page.created_by_username
                   const isAllowed = allowedUsers.some(a => a.username === u.username)
                   return (
@@ -336,18 +421,45 @@ export default function ViewPage() {
                       ) : isAllowed ? (
                         <span className="text-sm text-green-600 dark:text-green-400">Allowed</span>
                       ) : (
-                        <button
-                          onClick={() => handleAllowUser(u.username)}
-                          className="text-sm text-blue-600 hover:underline"
-                        >
-                          Allow
-                        </button>
+                        <input
+                          type="checkbox"
+                          checked={selectedUsers.includes(u.username)}
+                          onChange={() => toggleSelected(u.username)}
+                        />
                       )}
                     </li>
                   )
                 })}
               </ul>
             )}
+
+            {selectedUsers.length > 0 && (
+              <button
+                onClick={handleAllowUsers}
+                className="w-full mb-4 px-3 py-2 rounded bg-blue-600 text-white hover:bg-blue-700"
+              >
+                Allow {selectedUsers.join(", ")}
+              </button>
+            )}
+
+            <h3 className="text-sm font-semibold text-gray-600 dark:text-gray-400 mb-1">Allowed</h3>
+            {allowedUsers.length === 0 ? (
+              <p className="text-sm text-gray-500">Nobody yet.</p>
+            ) : (
+              <ul className="divide-y divide-gray-200 dark:divide-gray-700 max-h-48 overflow-y-auto">
+                {allowedUsers.map(u => (
+                  <li key={u.username} className="flex items-center justify-between py-2">
+                    <span>{u.username}</span>
+                    <button
+                      onClick={() => handleRevokeUser(u.username)}
+                      className="text-sm text-red-600 hover:underline"
+                    >
+                      Remove
+                    </button>
+                  </li>
+                ))}
+              </ul>
+            )}
           </div>
         </div>
       )}
@@ -37,15 +37,14 @@ export default function CreatePage() {
   const fieldRefs = useRef([])
   const quillRef = useRef(null)
 
-  // Fetch all slugs
+  // Fetch the slug -> title map (revalidated with its ETag)
   useEffect(() => {
-    fetch("/api/pages")
+    const token = localStorage.getItem("access_token")
+    fetch("/api/pages/titles", { headers: token ? { Authorization: `Bearer ${token}` } : {} })
       .then(res => res.json())
-      .then(pages => {
-        const map = {}
-        for (const p of pages) map[p.slug] = p.title
+      .then(map => {
         setPageMap(map)
-        setAllSlugs(pages.map(p => p.slug))
+        setAllSlugs(Object.keys(map))
       })
       .catch(console.error)
   }, [])
@@ -144,10 +143,8 @@ export default function CreatePage() {
   async function handleImageUpload(e) {
     const file = e.target.files?.[0]
     if (!file || !title) return alert("Enter a title before uploading an image.")
-    const slug = title.toLowerCase().replace(/[^a-z0-9]+/g, "-").replace(/(^-|-$)/g, "")
     const formData = new FormData()
     formData.append("file", file)
-    formData.append("filename", `${slug}${file.name.substring(file.name.lastIndexOf("."))}`)
     const res = await fetch("/api/upload-image", { method: "POST", body: formData })
     if (res.ok) {
       const data = await res.json()